@@ -1,16 +1,77 @@
 # app.py - Application multi-datasets avec interface moderne
 import os
 import json
+import hashlib
 import logging
-import datetime
-from flask import Flask, render_template, request, jsonify, send_file, redirect, url_for
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from flask import Flask, Response, g, render_template, request, jsonify, send_file, redirect, url_for
 
 import ee
 
+from availability import AvailabilityIndex, utc_today
+from cache import (TTLCache, create_cache, make_animation_cache_key, make_image_cache_key, make_stats_cache_key,
+                   make_tile_cache_key)
+from catalog import Catalog, build_legend
+from ee_gateway import EEGateway, EEUnavailableError, ee_call, set_gateway
+from ee_init import EEInitializer
+from health import HealthMonitor
+from metrics import (CACHE_LOOKUPS, HTTP_REQUEST_SECONDS, HTTP_REQUESTS, PIPELINE_ERRORS, REGISTRY,
+                     stage)
+from export import RasterExporter, RasterStore, compute_local_stats, window_for_bounds
+from processor import (DEFAULT_THUMBNAIL, DatasetError, get_animation_defaults, get_composite_name, get_date_window,
+                       get_thumbnail_defaults, get_variable_name, process_animation, process_dataset,
+                       process_tiles, set_catalog, variable_label)
+from render import render_png
+from singleflight import SingleFlight
+from stats import compute_stats, geometry_bounds, parse_climatology, parse_geometry
+from tile_cache import TileCache, TileFetchError, fetch_tile
+from viewport import parse_viewport, quantize_viewport
+from warmup import PRIORITY_PINNED, AccessStats, WarmupLease, WarmupScheduler, every, next_run_at
+
 app = Flask(__name__)
+PROCESS_STARTED_AT = time.time()
 
 # Configuration
 SERVICE_ACCOUNT_KEY_FILE = 'terrasight-459208-fe0b0ae226b9.json'  # Chemin vers votre fichier de clé
+IMAGE_CACHE_MAX_ENTRIES = 1024  # Nombre maximal de résultats d'image en cache
+IMAGE_CACHE_DEFAULT_TTL = 3600  # Durée de vie par défaut (secondes)
+# Backend de cache partagé : memory://, sqlite:///cache/terrasight.db ou redis://hote:6379/0
+CACHE_URL = os.environ.get('TERRASIGHT_CACHE_URL', 'memory://')
+HEALTH_PROBE_INTERVAL = 60  # Intervalle entre deux sondes de connexion à Earth Engine (secondes)
+HEALTH_HISTORY_SIZE = 60  # Nombre de sondes conservées dans l'historique
+MAP_ID_TTL = 3600  # Durée de validité retenue pour un identifiant de carte Earth Engine (secondes)
+TILE_CACHE_DIR = os.environ.get('TERRASIGHT_TILE_CACHE_DIR', 'tile_cache')  # Cache disque des tuiles
+TILE_CACHE_MAX_BYTES = 512 * 1024 * 1024  # Taille maximale du cache de tuiles (octets)
+TILE_FETCH_TIMEOUT = 15  # Délai maximal de téléchargement d'une tuile (secondes)
+STATIC_TILE_MAX_AGE = 365 * 24 * 3600  # Durée de cache HTTP des tuiles de données statiques
+BATCH_MAX_REQUESTS = 100  # Nombre maximal de requêtes par appel à /api/get_images
+BATCH_MAX_PARALLELISM = 8  # Parallélisme maximal (et par défaut) d'un lot
+BATCH_POOL_WORKERS = 32  # Threads partagés par l'ensemble des lots en cours
+AVAILABILITY_INDEX_ENABLED = os.environ.get('TERRASIGHT_AVAILABILITY_INDEX', '1') == '1'
+AVAILABILITY_REFRESH_INTERVAL = 3600  # Rafraîchissement de l'index des dates disponibles (secondes)
+EXPORT_DIR = os.environ.get('TERRASIGHT_EXPORT_DIR', 'exports')  # Stockage local des rasters exportés
+EXPORT_CHUNK_WORKERS = 8  # Blocs d'un export téléchargés en parallèle
+PAGE_CACHE_MAX_ENTRIES = 256  # Pages /static_image rendues conservées en mémoire
+EE_READY_TIMEOUT = float(os.environ.get('TERRASIGHT_EE_READY_TIMEOUT', '10'))  # Attente maximale de Earth Engine par requête (s)
+EE_INIT_MAX_BACKOFF = 300  # Délai maximal entre deux tentatives d'initialisation (secondes)
+EE_NOT_READY_MESSAGE = "Earth Engine n'est pas encore initialisé, réessayez dans quelques instants"
+EE_MAX_QPS = float(os.environ.get('TERRASIGHT_EE_MAX_QPS', '20'))  # Débit maximal d'appels Earth Engine par worker
+EE_BURST = 40  # Appels Earth Engine pouvant partir d'un coup
+EE_MAX_CONCURRENT = 16  # Appels Earth Engine simultanés par worker
+EE_MAX_RETRIES = 3  # Nouvelles tentatives après une erreur transitoire (quota, délai, indisponibilité)
+EE_BREAKER_THRESHOLD = 5  # Échecs transitoires consécutifs avant ouverture du disjoncteur
+EE_BREAKER_RESET = 30  # Durée d'ouverture du disjoncteur avant un appel d'essai (secondes)
+STALE_RESULT_TTL = 24 * 3600  # Conservation des derniers résultats, servis si Earth Engine est indisponible
+REFRESH_WORKERS = 4  # Revalidations simultanées en arrière-plan (stale-while-revalidate)
+WARMUP_ENABLED = os.environ.get('TERRASIGHT_WARMUP', '1') == '1'  # Préchauffage du cache en arrière-plan
+WARMUP_WORKERS = 2  # Tâches de préchauffage exécutées en parallèle
+WARMUP_PER_DATASET = 1  # Tâches de préchauffage simultanées par dataset
+WARMUP_SET_SIZE = 20  # Requêtes les plus fréquentes maintenues en cache (jeu chaud)
+WARMUP_INTERVAL = 15 * 60  # Rafraîchissement du jeu chaud (secondes)
+WARMUP_LEASE_TTL = 180  # Bail du worker de préchauffage élu (secondes), prolongé au moins toutes les 60 s
+WARMUP_DAILY_HOURS = (5,)  # Heures (UTC) de préchauffage quotidien des valeurs par défaut, avant les premiers utilisateurs
 
 # Configuration du logging
 logging.basicConfig(level=logging.INFO, 
@@ -23,19 +84,34 @@ if not os.path.exists(SERVICE_ACCOUNT_KEY_FILE):
     logger.error("Veuillez placer votre fichier de clé de compte de service dans le répertoire courant.")
 
 def initialize_earth_engine():
-    """Initialise Earth Engine avec le compte de service."""
-    try:
-        credentials = ee.ServiceAccountCredentials(None, SERVICE_ACCOUNT_KEY_FILE)
-        ee.Initialize(credentials)
-        logger.info("Earth Engine initialisé avec succès!")
-        return True
-    except Exception as e:
-        logger.error(f"Erreur lors de l'initialisation de Earth Engine: {str(e)}")
-        return False
+    """Initialise Earth Engine avec le compte de service ; lève une exception en cas d'échec."""
+    credentials = ee.ServiceAccountCredentials(None, SERVICE_ACCOUNT_KEY_FILE)
+    ee.Initialize(credentials)
+    logger.info("Earth Engine initialisé avec succès!")
+
+# Initialiser Earth Engine en arrière-plan : le démarrage ne dépend pas de l'authentification
+ee_initializer = EEInitializer(initialize_earth_engine, max_delay=EE_INIT_MAX_BACKOFF)
+ee_initializer.start()
+
+# Passerelle de tous les appels Earth Engine : débit, concurrence, nouvelles tentatives et disjoncteur
+ee_gateway = set_gateway(EEGateway(rate=EE_MAX_QPS, burst=EE_BURST, max_concurrent=EE_MAX_CONCURRENT,
+                                   retries=EE_MAX_RETRIES, failure_threshold=EE_BREAKER_THRESHOLD,
+                                   reset_timeout=EE_BREAKER_RESET))
+
+# Cache des résultats Earth Engine (URL de miniature, paramètres de visualisation, statut)
+image_cache = create_cache(CACHE_URL, max_entries=IMAGE_CACHE_MAX_ENTRIES, default_ttl=IMAGE_CACHE_DEFAULT_TTL)
+logger.info(f"Cache des résultats: backend {image_cache.name}")
 
-# Initialiser Earth Engine au démarrage de l'application
-if not initialize_earth_engine():
-    logger.error("Impossible d'initialiser Earth Engine. L'application risque de ne pas fonctionner correctement.")
+# Regroupement des calculs Earth Engine identiques simultanés
+image_flight = SingleFlight()
+
+# Revalidations en arrière-plan des résultats périmés (clés en cours, par worker)
+refresh_pool = ThreadPoolExecutor(max_workers=REFRESH_WORKERS, thread_name_prefix="refresh")
+refreshing = set()
+refreshing_lock = threading.Lock()
+
+# Pages plein écran (/static_image) déjà rendues, propres au processus
+page_cache = TTLCache(max_entries=PAGE_CACHE_MAX_ENTRIES, default_ttl=IMAGE_CACHE_DEFAULT_TTL)
 
 # Définition des datasets disponibles regroupés par catégorie
 DATASETS = {
@@ -44,6 +120,10 @@ DATASETS = {
             "id": "NASA/ORNL/DAYMET_V4",
             "name": "DAYMET V4 - Données Climatiques Quotidiennes",
             "description": "Données météorologiques quotidiennes à résolution 1km pour l'Amérique du Nord.",
+            "short_name": "DAYMET",
+            "asset_type": "ImageCollection",
+            "temporal_resolution": "daily",
+            "composite": "first",
             "variables": [
                 {"id": "tmax", "name": "Température maximale (°C)", "type": "continuous"},
                 {"id": "tmin", "name": "Température minimale (°C)", "type": "continuous"},
@@ -56,13 +136,24 @@ DATASETS = {
             "default_date": "2020-07-15",
             "date_range": ["1980-01-01", "2021-12-31"],
             "default_region": [-140, 15, -60, 60],  # [ouest, sud, est, nord]
+            "coverage": [-180, 14, -52, 84],  # Amérique du Nord, Hawaï et Porto Rico
             "default_zoom": 3,
-            "default_center": [-100, 40]  # [longitude, latitude]
+            "default_center": [-100, 40],  # [longitude, latitude]
+            "scale": 1000,  # Résolution native (m) : 1 km
+            "cache_ttl": 24 * 3600  # Archive historique : 1 jour
         },
         {
             "id": "NOAA/GFS0P25",
             "name": "NOAA GFS - Prévisions Météorologiques Globales",
             "description": "Système de prévision global (GFS) de la NOAA avec résolution 0.25 degrés.",
+            "short_name": "GFS",
+            "asset_type": "ImageCollection",
+            "temporal_resolution": "6h",  # Prévisions toutes les 6 heures
+            "composite": "first",
+            "ongoing": True,  # Collection encore alimentée
+            "cycles": [0, 6, 12, 18],  # Cycles de prévision (heures UTC)
+            "cycle_delay": 4.5 * 3600,  # Délai de publication d'un cycle (secondes)
+            "series_filter": {"forecast_hours": 0},  # Séries temporelles : analyse seule (≈200 échéances par cycle)
             "variables": [
                 {"id": "temperature_2m_above_ground", "name": "Température à 2m (K)", "type": "continuous"},
                 {"id": "u_component_of_wind_10m_above_ground", "name": "Vent - composante U à 10m (m/s)", "type": "continuous"},
@@ -70,11 +161,14 @@ DATASETS = {
                 {"id": "relative_humidity_2m_above_ground", "name": "Humidité relative à 2m (%)", "type": "continuous"},
                 {"id": "total_precipitation_surface", "name": "Précipitations totales (kg/m²)", "type": "continuous"}
             ],
-            "default_date": datetime.datetime.now().strftime('%Y-%m-%d'),
-            "date_range": ["2015-01-01", datetime.datetime.now().strftime('%Y-%m-%d')],
+            "default_date": utc_today().strftime('%Y-%m-%d'),
+            "date_range": ["2015-01-01", utc_today().strftime('%Y-%m-%d')],
             "default_region": [-180, -90, 180, 90],  # Monde entier
             "default_zoom": 2,
-            "default_center": [0, 0]
+            "default_center": [0, 0],
+            "scale": 27830,  # Résolution native (m) : 0.25°
+            "cache_ttl": 10 * 60,  # Prévisions quasi temps réel : 10 minutes
+            "stale_while_revalidate": 6 * 3600  # Au-delà, résultat servi aussitôt et recalculé en arrière-plan (un cycle)
         }
     ],
     "weather": [
@@ -82,19 +176,32 @@ DATASETS = {
             "id": "UCSB-CHG/CHIRPS/DAILY",
             "name": "CHIRPS - Précipitations Quotidiennes",
             "description": "Ensemble de données de précipitations infrarouge à haute résolution.",
+            "short_name": "CHIRPS",
+            "asset_type": "ImageCollection",
+            "temporal_resolution": "daily",
+            "composite": "first",
+            "ongoing": True,  # Collection encore alimentée
             "variables": [
                 {"id": "precipitation", "name": "Précipitations (mm/jour)", "type": "continuous"}
             ],
             "default_date": "2020-01-15",
-            "date_range": ["1981-01-01", datetime.datetime.now().strftime('%Y-%m-%d')],
+            "date_range": ["1981-01-01", utc_today().strftime('%Y-%m-%d')],
             "default_region": [-30, -35, 60, 35],  # Afrique et Europe
+            "coverage": [-180, -50, 180, 50],  # Quasi global, entre 50°S et 50°N
             "default_zoom": 2,
-            "default_center": [17.93, 7.71]
+            "default_center": [17.93, 7.71],
+            "scale": 5566,  # Résolution native (m) : 0.05°
+            "cache_ttl": 6 * 3600  # Données préliminaires mises à jour : 6 heures
         },
         {
             "id": "NOAA/GOES/16/MCMIPC",
             "name": "NOAA GOES-16 - Imagerie Satellite",
             "description": "Données d'imagerie du satellite GOES-16 (Hémisphère Occidental).",
+            "short_name": "GOES-16",
+            "asset_type": "ImageCollection",
+            "temporal_resolution": "10min",  # Balayages successifs du disque
+            "composite": "first",
+            "ongoing": True,  # Collection encore alimentée
             "variables": [
                 {"id": "CMI_C01", "name": "Canal Bleu", "type": "continuous"},
                 {"id": "CMI_C02", "name": "Canal Rouge", "type": "continuous"},
@@ -102,10 +209,14 @@ DATASETS = {
                 {"id": "CMI_C13", "name": "Canal Infrarouge", "type": "continuous"}
             ],
             "default_date": "2022-01-01",
-            "date_range": ["2017-01-01", datetime.datetime.now().strftime('%Y-%m-%d')],
+            "date_range": ["2017-01-01", utc_today().strftime('%Y-%m-%d')],
             "default_region": [-100, 10, -50, 45],  # Amérique du Nord et Caraïbes
+            "coverage": [-153, 14, -52, 57],  # Secteur CONUS du satellite
             "default_zoom": 3,
-            "default_center": [-75, 37]
+            "default_center": [-75, 37],
+            "scale": 2000,  # Résolution native (m) : 2 km
+            "cache_ttl": 15 * 60,  # Imagerie quasi temps réel : 15 minutes
+            "stale_while_revalidate": 3 * 3600  # Au-delà, résultat servi aussitôt et recalculé en arrière-plan
         }
     ],
     "terrain": [
@@ -113,6 +224,9 @@ DATASETS = {
             "id": "USGS/SRTMGL1_003",
             "name": "SRTM - Modèle Numérique de Terrain 30m",
             "description": "Modèle d'élévation global à haute résolution (30m) de la mission SRTM.",
+            "short_name": "SRTM",
+            "asset_type": "Image",
+            "temporal_resolution": None,
             "variables": [
                 {"id": "elevation", "name": "Élévation (m)", "type": "continuous"}
             ],
@@ -120,12 +234,17 @@ DATASETS = {
             "date_range": None,
             "default_region": [-120, 25, -70, 50],  # Amérique du Nord
             "default_zoom": 4,
-            "default_center": [-95, 38]
+            "default_center": [-95, 38],
+            "scale": 30,  # Résolution native (m) : 30 m
+            "cache_ttl": None  # Données statiques : pas d'expiration
         },
         {
             "id": "USGS/GTOPO30",
             "name": "GTOPO30 - Modèle Numérique de Terrain Global",
             "description": "Modèle d'élévation global (résolution ~1km).",
+            "short_name": "GTOPO30",
+            "asset_type": "Image",
+            "temporal_resolution": None,
             "variables": [
                 {"id": "elevation", "name": "Élévation (m)", "type": "continuous"}
             ],
@@ -133,132 +252,269 @@ DATASETS = {
             "date_range": None,
             "default_region": [-180, -60, 180, 85],  # Monde entier
             "default_zoom": 2,
-            "default_center": [0, 20]
+            "default_center": [0, 20],
+            "scale": 927.67,  # Résolution native (m) : 30 secondes d'arc
+            "cache_ttl": None  # Données statiques : pas d'expiration
         }
     ]
 }
 
-def get_dataset_info(dataset_id):
-    """Récupère les informations sur un dataset à partir de son ID."""
-    for category in DATASETS:
-        for dataset in DATASETS[category]:
-            if dataset["id"] == dataset_id:
-                return dataset
-    return None
-
-def get_vis_params(dataset_id, variable):
-    """Renvoie des paramètres de visualisation adaptés pour un dataset et une variable."""
-    
+# Paramètres de visualisation adaptés à chaque (dataset, variable)
+TEMPERATURE_PALETTE = ['1621A2', 'white', 'cyan', 'green', 'yellow', 'orange', 'red']
+WIND_VIS_PARAMS = {"min": -30.0, "max": 30.0, "palette": ['blue', 'cyan', 'green', 'yellow', 'orange', 'red']}
+GOES_VIS_PARAMS = {
+    "min": 0.0,
+    "max": 0.7,
+    "gamma": 1.3,
+    "palette": ['black', 'blue', 'purple', 'cyan', 'green', 'yellow', 'orange', 'red', 'white']
+}
+VIS_PARAMS = {
     # DAYMET V4
-    if dataset_id == "NASA/ORNL/DAYMET_V4":
-        if variable == "tmax" or variable == "tmin":
-            return {
-                "min": -40.0,
-                "max": 30.0,
-                "palette": ['1621A2', 'white', 'cyan', 'green', 'yellow', 'orange', 'red']
-            }
-        elif variable == "prcp":
-            return {
-                "min": 0.0,
-                "max": 50.0,
-                "palette": ['white', 'blue', 'purple', 'cyan', 'green', 'yellow', 'orange', 'red']
-            }
-        elif variable == "srad":
-            return {
-                "min": 0.0,
-                "max": 400.0,
-                "palette": ['black', 'blue', 'purple', 'cyan', 'green', 'yellow', 'orange', 'red']
-            }
-        elif variable == "vp":
-            return {
-                "min": 0.0,
-                "max": 3000.0,
-                "palette": ['white', 'blue', 'cyan', 'green', 'yellow', 'orange', 'red']
-            }
-        elif variable == "swe":
-            return {
-                "min": 0.0,
-                "max": 1000.0,
-                "palette": ['white', 'lightblue', 'blue', 'purple']
-            }
-        elif variable == "dayl":
-            return {
-                "min": 0.0,
-                "max": 86400.0,
-                "palette": ['black', 'blue', 'cyan', 'yellow', 'orange', 'red']
-            }
+    ("NASA/ORNL/DAYMET_V4", "tmax"): {"min": -40.0, "max": 30.0, "palette": TEMPERATURE_PALETTE},
+    ("NASA/ORNL/DAYMET_V4", "tmin"): {"min": -40.0, "max": 30.0, "palette": TEMPERATURE_PALETTE},
+    ("NASA/ORNL/DAYMET_V4", "prcp"): {
+        "min": 0.0, "max": 50.0,
+        "palette": ['white', 'blue', 'purple', 'cyan', 'green', 'yellow', 'orange', 'red']
+    },
+    ("NASA/ORNL/DAYMET_V4", "srad"): {
+        "min": 0.0, "max": 400.0,
+        "palette": ['black', 'blue', 'purple', 'cyan', 'green', 'yellow', 'orange', 'red']
+    },
+    ("NASA/ORNL/DAYMET_V4", "vp"): {
+        "min": 0.0, "max": 3000.0,
+        "palette": ['white', 'blue', 'cyan', 'green', 'yellow', 'orange', 'red']
+    },
+    ("NASA/ORNL/DAYMET_V4", "swe"): {"min": 0.0, "max": 1000.0, "palette": ['white', 'lightblue', 'blue', 'purple']},
+    ("NASA/ORNL/DAYMET_V4", "dayl"): {
+        "min": 0.0, "max": 86400.0,
+        "palette": ['black', 'blue', 'cyan', 'yellow', 'orange', 'red']
+    },
     
     # NOAA GFS
-    elif dataset_id == "NOAA/GFS0P25":
-        if variable == "temperature_2m_above_ground":
-            return {
-                "min": -40.0,
-                "max": 35.0,
-                "palette": ['blue', 'purple', 'cyan', 'green', 'yellow', 'red']
-            }
-        elif "wind" in variable:
-            return {
-                "min": -30.0,
-                "max": 30.0,
-                "palette": ['blue', 'cyan', 'green', 'yellow', 'orange', 'red']
-            }
-        elif variable == "relative_humidity_2m_above_ground":
-            return {
-                "min": 0.0,
-                "max": 100.0,
-                "palette": ['red', 'orange', 'yellow', 'green', 'cyan', 'blue']
-            }
-        elif variable == "total_precipitation_surface":
-            return {
-                "min": 0.0,
-                "max": 50.0,
-                "palette": ['white', 'blue', 'cyan', 'green', 'yellow', 'orange', 'red']
-            }
+    ("NOAA/GFS0P25", "temperature_2m_above_ground"): {
+        "min": -40.0, "max": 35.0,
+        "palette": ['blue', 'purple', 'cyan', 'green', 'yellow', 'red']
+    },
+    ("NOAA/GFS0P25", "u_component_of_wind_10m_above_ground"): WIND_VIS_PARAMS,
+    ("NOAA/GFS0P25", "v_component_of_wind_10m_above_ground"): WIND_VIS_PARAMS,
+    ("NOAA/GFS0P25", "relative_humidity_2m_above_ground"): {
+        "min": 0.0, "max": 100.0,
+        "palette": ['red', 'orange', 'yellow', 'green', 'cyan', 'blue']
+    },
+    ("NOAA/GFS0P25", "total_precipitation_surface"): {
+        "min": 0.0, "max": 50.0,
+        "palette": ['white', 'blue', 'cyan', 'green', 'yellow', 'orange', 'red']
+    },
     
     # CHIRPS
-    elif dataset_id == "UCSB-CHG/CHIRPS/DAILY":
-        if variable == "precipitation":
-            return {
-                "min": 1.0,
-                "max": 17.0,
-                "palette": ['001137', '0aab1e', 'e7eb05', 'ff4a2d', 'e90000']
-            }
+    ("UCSB-CHG/CHIRPS/DAILY", "precipitation"): {
+        "min": 1.0, "max": 17.0,
+        "palette": ['001137', '0aab1e', 'e7eb05', 'ff4a2d', 'e90000']
+    },
     
     # GOES-16
-    elif dataset_id == "NOAA/GOES/16/MCMIPC":
-        if variable in ["CMI_C01", "CMI_C02", "CMI_C03", "CMI_C13"]:
-            return {
-                "min": 0.0,
-                "max": 0.7,
-                "gamma": 1.3,
-                "palette": ['black', 'blue', 'purple', 'cyan', 'green', 'yellow', 'orange', 'red', 'white']
-            }
+    ("NOAA/GOES/16/MCMIPC", "CMI_C01"): GOES_VIS_PARAMS,
+    ("NOAA/GOES/16/MCMIPC", "CMI_C02"): GOES_VIS_PARAMS,
+    ("NOAA/GOES/16/MCMIPC", "CMI_C03"): GOES_VIS_PARAMS,
+    ("NOAA/GOES/16/MCMIPC", "CMI_C13"): GOES_VIS_PARAMS,
     
     # SRTM
-    elif dataset_id == "USGS/SRTMGL1_003":
-        if variable == "elevation":
-            return {
-                "min": 0.0,
-                "max": 5000.0,
-                "palette": ['006600', '002200', 'fff700', 'ab7634', 'c4d0ff', 'ffffff']
-            }
+    ("USGS/SRTMGL1_003", "elevation"): {
+        "min": 0.0, "max": 5000.0,
+        "palette": ['006600', '002200', 'fff700', 'ab7634', 'c4d0ff', 'ffffff']
+    },
     
     # GTOPO30
-    elif dataset_id == "USGS/GTOPO30":
-        if variable == "elevation":
-            return {
-                "min": -10.0,
-                "max": 8000.0,
-                "gamma": 1.6,
-                "palette": ['0000ff', '00ffff', '00ff00', 'ffff00', 'ff0000', 'ffffff']
-            }
-    
-    # Valeurs par défaut
-    return {
-        "min": 0,
-        "max": 100,
-        "palette": ['blue', 'cyan', 'green', 'yellow', 'orange', 'red']
+    ("USGS/GTOPO30", "elevation"): {
+        "min": -10.0, "max": 8000.0, "gamma": 1.6,
+        "palette": ['0000ff', '00ffff', '00ff00', 'ffff00', 'ff0000', 'ffffff']
     }
+}
+# Valeurs par défaut
+DEFAULT_VIS_PARAMS = {"min": 0, "max": 100, "palette": ['blue', 'cyan', 'green', 'yellow', 'orange', 'red']}
+
+# Catalogue compilé une fois : recherches directes par identifiant et par (dataset, variable)
+catalog = set_catalog(Catalog(DATASETS, VIS_PARAMS, DEFAULT_VIS_PARAMS))
+
+def get_dataset_info(dataset_id):
+    """Récupère les informations sur un dataset à partir de son ID."""
+    return catalog.dataset(dataset_id)
+
+# Pool partagé des requêtes de lot (/api/get_images)
+batch_pool = ThreadPoolExecutor(max_workers=BATCH_POOL_WORKERS, thread_name_prefix="batch")
+
+# Cache disque des tuiles servies par le proxy /tiles
+tile_cache = TileCache(TILE_CACHE_DIR, max_bytes=TILE_CACHE_MAX_BYTES)
+
+# Rasters exportés localement (.npy mappés en mémoire) : servent les statistiques des données statiques
+raster_store = RasterStore(EXPORT_DIR)
+raster_exporter = RasterExporter(raster_store, chunk_workers=EXPORT_CHUNK_WORKERS)
+
+# Index local des dates disponibles des collections datées
+availability_index = AvailabilityIndex(cache=image_cache)
+
+def probe_earth_engine():
+    """Sonde de connexion : un calcul trivial, exécuté par le moniteur de santé.
+
+    Passe par la passerelle comme les autres appels : le disjoncteur compte ses
+    échecs et ses succès (une sonde réussie referme un disjoncteur semi-ouvert),
+    et un disjoncteur ouvert fait échouer la sonde sans appel Earth Engine.
+    """
+    if not ee_call("getInfo", "probe", ee.Image(1).getInfo):
+        raise RuntimeError("Réponse vide de Earth Engine")
+
+# Sonde périodique de Earth Engine, démarrée dès que l'initialisation a réussi
+health_monitor = HealthMonitor(probe_earth_engine, interval=HEALTH_PROBE_INTERVAL, history_size=HEALTH_HISTORY_SIZE)
+ee_initializer.on_ready(health_monitor.start)
+
+if AVAILABILITY_INDEX_ENABLED:
+    ee_initializer.on_ready(lambda: availability_index.start_background(
+        catalog.collections(),
+        AVAILABILITY_REFRESH_INTERVAL
+    ))
+
+def warmup_tasks(datasets, date_str=None, kinds=("image", "tiles")):
+    """Tâches de préchauffage (miniature et tuiles) de la première variable de chaque dataset.
+
+    date_str None : date par défaut du dataset, comme une requête sans paramètre date.
+    """
+    return [(kind, dataset["id"], dataset["variables"][0]["id"], date_str)
+            for dataset in datasets for kind in kinds]
+
+def latest_cycle_tasks(dataset_info):
+    """Tâches d'un nouveau cycle de prévision : jour courant et entrées du jeu chaud du dataset.
+
+    Jour courant en UTC, comme les cycles (next_run_at) et la date par défaut du dataset.
+    """
+    today = utc_today().strftime('%Y-%m-%d')
+    tasks = warmup_tasks([dataset_info], today) + warmup_tasks([dataset_info])
+    return tasks + [task for task, _ in access_stats.top(WARMUP_SET_SIZE) if task[1] == dataset_info["id"]]
+
+def run_warmup_task(task):
+    """Calcule (ou relit depuis le cache) le résultat d'une tâche de préchauffage ; renvoie True en cas de succès.
+
+    Pour une collection encore alimentée, l'index de disponibilité n'est pas
+    consulté : un jour récent peut être publié après son dernier
+    rafraîchissement (une collection vide est détectée par le calcul).
+    """
+    kind, dataset_id, variable, date_str = task
+    args = {"dataset": dataset_id, "variable": variable}
+    if date_str:
+        args["date"] = date_str
+    payload = get_image_payload if kind == "image" else get_tile_url_payload
+    ongoing = (get_dataset_info(dataset_id) or {}).get("ongoing", False)
+    result, status = payload(args, record_access=False, check_index=not ongoing)
+    return status == 200 and "error" not in result
+
+def record_access_stats(kind, dataset_id, variable, args, date_str):
+    """Compte une requête préchauffable (date explicite, ou None pour la date par défaut)."""
+    access_stats.record((kind, dataset_id, variable, date_str if args.get('date') else None))
+
+# Accès récents (jeu chaud) et préchauffage : valeurs par défaut, cycles de prévision, requêtes fréquentes.
+# Un seul worker préchauffe le cache partagé (bail dans ce cache) ; le jeu chaud est celui de ses accès.
+access_stats = AccessStats()
+warmup_lease = WarmupLease(image_cache, ttl=WARMUP_LEASE_TTL)
+warmup_scheduler = WarmupScheduler(run_warmup_task, workers=WARMUP_WORKERS, per_dataset=WARMUP_PER_DATASET,
+                                   leader=warmup_lease.acquire)
+
+def start_warmup():
+    all_datasets = [dataset for category in DATASETS.values() for dataset in category]
+    if warmup_scheduler.is_leader():
+        warmup_scheduler.submit(warmup_tasks(all_datasets), PRIORITY_PINNED)
+    warmup_scheduler.add_schedule("defaults", lambda now: next_run_at(now, WARMUP_DAILY_HOURS),
+                                  lambda: warmup_tasks(all_datasets), PRIORITY_PINNED)
+    warmup_scheduler.add_schedule("warm_set", every(WARMUP_INTERVAL),
+                                  lambda: [task for task, _ in access_stats.top(WARMUP_SET_SIZE)])
+    for dataset in all_datasets:
+        if dataset.get("cycles"):
+            warmup_scheduler.add_schedule(
+                f"cycles:{dataset['short_name']}",
+                lambda now, d=dataset: next_run_at(now, d["cycles"], d.get("cycle_delay", 0)),
+                lambda d=dataset: latest_cycle_tasks(d), PRIORITY_PINNED)
+    warmup_scheduler.start()
+
+if WARMUP_ENABLED:
+    ee_initializer.on_ready(start_warmup)
+
+def collect_cache_metrics(field):
+    """Valeurs d'un compteur des caches (résultats, tuiles) pour la jauge Prometheus correspondante."""
+    def collect():
+        return {("results",): image_cache.stats()[field], ("tiles",): tile_cache.stats()[field]}
+    return collect
+
+# Jauges lues au moment de l'export /metrics (compteurs déjà tenus par les caches et la sonde)
+for field in ("hits", "misses", "evictions"):
+    REGISTRY.gauge(f"terrasight_cache_{field}", f"Cache : {field} (depuis le démarrage du worker)",
+                   ("cache",), collect=collect_cache_metrics(field))
+REGISTRY.gauge("terrasight_cache_hit_ratio", "Taux de succès du cache de résultats", ("cache",),
+               collect=lambda: {("results",): image_cache.stats()["hit_ratio"]})
+REGISTRY.gauge("terrasight_cache_entries", "Entrées du cache de résultats", ("cache",),
+               collect=lambda: {("results",): image_cache.stats()["entries"]})
+REGISTRY.gauge("terrasight_tile_cache_bytes", "Taille du cache disque des tuiles",
+               collect=lambda: {(): tile_cache.stats()["bytes"]})
+REGISTRY.gauge("terrasight_single_flight", "Calculs coalescés : en cours, meneurs, requêtes partagées", ("state",),
+               collect=lambda: {(k,): v for k, v in image_flight.stats().items()})
+REGISTRY.gauge("terrasight_ee_breaker_open", "Disjoncteur Earth Engine ouvert ou semi-ouvert (1) ou fermé (0)",
+               collect=lambda: {(): int(ee_gateway.breaker.state != "closed")})
+REGISTRY.gauge("terrasight_ee_rate_limit", "Débit Earth Engine autorisé (appels par seconde, adaptatif)",
+               collect=lambda: {(): ee_gateway.bucket.rate})
+REGISTRY.gauge("terrasight_ee_ready", "Earth Engine initialisé (1) ou non (0)",
+               collect=lambda: {(): int(ee_initializer.is_ready())})
+REGISTRY.gauge("terrasight_ee_probe_latency_ms", "Latence de la dernière sonde Earth Engine",
+               collect=lambda: {(): latency} if (latency := health_monitor.status().get("latency_ms")) is not None else {})
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """Compte la requête et mesure sa durée, étiquetées par gabarit de route (cardinalité bornée)."""
+    route = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+    HTTP_REQUESTS.inc(route=route, method=request.method, status=response.status_code)
+    started = g.get("request_started")
+    if started is not None:
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, route=route)
+    return response
+
+def resolve_date(dataset_info, date_str, snap=False):
+    """Vérifie la date auprès de l'index local ; renvoie (date, message d'erreur ou None).
+
+    Si snap est vrai, une date sans données est remplacée par la date
+    disponible la plus proche. Une date non indexée, ou trop récente pour que
+    l'index fasse foi (collection encore alimentée), est laissée telle quelle.
+    """
+    if not date_str or dataset_info.get("asset_type") != "ImageCollection":
+        return date_str, None
+    
+    try:
+        available = availability_index.is_available(dataset_info["id"], date_str)
+    except ValueError:
+        return date_str, None  # Format invalide : signalé par le processeur
+    
+    if available is False:
+        nearest = availability_index.nearest(dataset_info["id"], date_str)
+        if snap and nearest:
+            logger.info(f"Date {date_str} sans données, remplacée par {nearest}")
+            return nearest, None
+        label = dataset_info.get("short_name", dataset_info["id"])
+        message = f"Aucune donnée {label} disponible pour cette date: {date_str}."
+        if nearest:
+            message += f" Date disponible la plus proche: {nearest}."
+        return date_str, message
+    
+    return date_str, None
+
+def get_vis_params(dataset_id, variable):
+    """Renvoie des paramètres de visualisation adaptés pour un dataset et une variable."""
+    return catalog.vis_params(dataset_id, variable)
+
+def get_legend(dataset_id, variable, vis_params):
+    """Légende précalculée du couple (dataset, variable), ou construite pour des paramètres inhabituels."""
+    legend = catalog.legend(dataset_id, variable)
+    if legend is None or vis_params != get_vis_params(dataset_id, variable):
+        legend = build_legend(vis_params)
+    return legend
 
 @app.route('/')
 def index():
@@ -279,340 +535,730 @@ def viewer():
     # Passer les informations au template
     return render_template('viewer.html', dataset=dataset_info, datasets=DATASETS)
 
+@app.route('/api/catalog')
+def get_catalog():
+    """Catalogue complet (datasets, paramètres de visualisation, légendes), identifié par son empreinte.
+
+    Avec ?v=<empreinte> correspondant au contenu, la réponse peut être conservée
+    indéfiniment par le client ; sinon elle est revalidée par ETag.
+    """
+    response = Response(catalog.body, mimetype='application/json')
+    response.set_etag(catalog.hash)
+    response.headers['X-Catalog-Hash'] = catalog.hash
+    if request.args.get('v') == catalog.hash:
+        response.headers['Cache-Control'] = f"public, max-age={STATIC_TILE_MAX_AGE}, immutable"
+    else:
+        response.headers['Cache-Control'] = "no-cache"
+    return response.make_conditional(request)
+
+@app.route('/healthz')
+def liveness():
+    """Sonde de vivacité : le processus répond, indépendamment de Earth Engine."""
+    return jsonify({"status": "alive", "uptime": time.time() - PROCESS_STARTED_AT})
+
+@app.route('/readyz')
+def readiness():
+    """Sonde de disponibilité : 200 une fois Earth Engine initialisé, 503 sinon."""
+    status = ee_initializer.status()
+    return jsonify(status), 200 if status["ready"] else 503
+
 @app.route('/api/test_connection')
 def test_connection():
-    """Test simple de la connexion à Earth Engine."""
-    try:
-        # Vérifier si Earth Engine est initialisé
-        if not ee.data._initialized:
-            initialize_earth_engine()
-            if not ee.data._initialized:
-                return jsonify({"status": "error", "message": "Échec de l'initialisation de Earth Engine"})
-        
-        # Test simple d'accès à l'API
-        info = ee.Image(1).getInfo()
-        
-        if info:
-            return jsonify({
-                "status": "success", 
-                "message": "Connexion à Earth Engine réussie!"
-            })
-        else:
-            return jsonify({
-                "status": "error", 
-                "message": "Échec de la connexion à Earth Engine"
-            })
-            
-    except Exception as e:
-        logger.error(f"Exception lors du test de connexion: {str(e)}")
-        return jsonify({"status": "error", "message": str(e)}), 500
+    """État de la connexion à Earth Engine, d'après la dernière sonde périodique (sans appel Earth Engine)."""
+    # Seule la toute première requête d'un worker peut attendre : l'initialisation puis la première sonde
+    if not health_monitor.wait_first(0) and not (ee_initializer.wait(EE_READY_TIMEOUT)
+                                                  and health_monitor.wait_first(EE_READY_TIMEOUT)):
+        return jsonify({"status": "error", "message": EE_NOT_READY_MESSAGE}), 503
+    return jsonify(health_monitor.status())
+
+@app.route('/api/health')
+def health():
+    """État détaillé : initialisation, dernière sonde et historique des sondes."""
+    return jsonify({
+        "initialization": ee_initializer.status(),
+        "current": health_monitor.status(),
+        "stats": health_monitor.stats(),
+        "gateway": ee_gateway.status(),
+        "history": health_monitor.history()
+    })
 
 @app.route('/api/get_image')
 def get_image():
     """Génère une image statique à partir du dataset sélectionné."""
+    result, status = get_image_payload(request.args)
+    return jsonify(result), status
+
+@app.route('/api/get_images', methods=['POST'])
+def get_images():
+    """Traite un lot de requêtes d'image en parallèle et renvoie les résultats en NDJSON, au fil de l'eau.
+
+    Corps attendu : {"requests": [{"dataset": ..., "variable": ..., "date": ...}, ...], "parallelism": 4}
+    Chaque ligne de la réponse : {"index": i, "request": {...}, "status": code, "result": {...}}
+    """
+    body = request.get_json(silent=True)
+    if isinstance(body, list):
+        body = {"requests": body}
+    if not isinstance(body, dict) or not isinstance(body.get("requests"), list):
+        return jsonify({"error": "Corps JSON attendu: {\"requests\": [...]}"}), 400
+    
+    requests_list = body["requests"]
+    if not all(isinstance(item, dict) for item in requests_list):
+        return jsonify({"error": "Chaque requête doit être un objet JSON"}), 400
+    if len(requests_list) > BATCH_MAX_REQUESTS:
+        return jsonify({"error": f"Trop de requêtes dans le lot (maximum {BATCH_MAX_REQUESTS})"}), 400
+    
+    try:
+        parallelism = int(body.get("parallelism", BATCH_MAX_PARALLELISM))
+    except (TypeError, ValueError):
+        return jsonify({"error": "parallelism doit être un entier"}), 400
+    parallelism = max(1, min(parallelism, BATCH_MAX_PARALLELISM))
+    
+    # Les paramètres d'URL servent de valeurs par défaut (ex. dataset commun au lot)
+    defaults = request.args.to_dict()
+    logger.info(f"Lot de {len(requests_list)} requêtes d'image (parallélisme {parallelism})")
+    
+    def generate():
+        pending = {}
+        queue = list(enumerate(requests_list))
+        try:
+            while queue or pending:
+                # Ne jamais dépasser le parallélisme du lot, même si le pool partagé est libre
+                while queue and len(pending) < parallelism:
+                    index, item = queue.pop(0)
+                    # Champ null : absent (valeur par défaut de l'URL ou du dataset), pas la chaîne "None"
+                    args = dict(defaults, **{k: str(v) for k, v in item.items() if v is not None})
+                    pending[batch_pool.submit(get_image_payload, args)] = (index, item)
+                
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, item = pending.pop(future)
+                    result, status = future.result()
+                    yield json.dumps({"index": index, "request": item, "status": status, "result": result}) + "\n"
+        finally:
+            # Client déconnecté : abandonner les requêtes non démarrées
+            for future in pending:
+                future.cancel()
+    
+    return Response(generate(), mimetype='application/x-ndjson')
+
+def get_image_payload(args, record_access=True, check_index=True):
+    """Traite une requête d'image à partir de ses paramètres ; renvoie (données, code HTTP).
+
+    Indépendant du contexte de requête Flask : utilisé aussi par le mode asynchrone (asgi.py).
+    record_access=False pour les requêtes internes (préchauffage), qui ne comptent pas dans le jeu chaud ;
+    check_index=False pour ne pas consulter l'index de disponibilité (préchauffage des collections en cours).
+    """
     try:
         # Récupérer les paramètres
-        dataset_id = request.args.get('dataset', 'NASA/ORNL/DAYMET_V4')
-        variable = request.args.get('variable', 'tmax')
-        date_str = request.args.get('date', None)
+        dataset_id = args.get('dataset', 'NASA/ORNL/DAYMET_V4')
+        variable = args.get('variable', 'tmax')
+        date_str = args.get('date', None)
         
         # Obtenir les informations sur le dataset
         dataset_info = get_dataset_info(dataset_id)
         if not dataset_info:
-            return jsonify({"error": "Dataset non trouvé"}), 404
+            return {"error": "Dataset non trouvé"}, 404
         
         # Si la date n'est pas fournie, utiliser la date par défaut du dataset
         if not date_str and dataset_info["default_date"]:
             date_str = dataset_info["default_date"]
         
+        reducer, window = parse_composite_args(args)
+        
+        # Fenêtre du client (bbox, taille en pixels) : emprise et résolution quantifiées
+        try:
+            viewport = parse_viewport(args, dataset_info)
+            if viewport:
+                viewport = quantize_viewport(dataset_info, *viewport)
+        except DatasetError as e:
+            return {"error": str(e)}, e.status
+        
+        # Rejeter (ou remplacer) immédiatement une date sans données connue de l'index
+        # (une fenêtre de plusieurs jours peut contenir des données même si ce jour n'en a pas)
+        if window == "day" and check_index:
+            date_str, date_error = resolve_date(dataset_info, date_str, snap=args.get('snap') == '1')
+            if date_error:
+                return {"error": date_error}, 200
+        
         # Journal pour le débogage
         logger.info(f"Requête d'image pour dataset: {dataset_id}, variable: {variable}, date: {date_str}")
         
-        # Vérifier si Earth Engine est initialisé
-        if not ee.data._initialized:
-            initialize_earth_engine()
-            if not ee.data._initialized:
-                return jsonify({"error": "Échec de l'initialisation de Earth Engine"})
-        
-        # Processus spécifique pour chaque type de dataset
-        if dataset_id == "NASA/ORNL/DAYMET_V4":
-            return process_daymet(dataset_id, variable, date_str, dataset_info)
-        elif dataset_id == "NOAA/GFS0P25":
-            return process_gfs(dataset_id, variable, date_str, dataset_info)
-        elif dataset_id == "UCSB-CHG/CHIRPS/DAILY":
-            return process_chirps(dataset_id, variable, date_str, dataset_info)
-        elif dataset_id == "NOAA/GOES/16/MCMIPC":
-            return process_goes16(dataset_id, variable, date_str, dataset_info)
-        elif dataset_id in ["USGS/SRTMGL1_003", "USGS/GTOPO30"]:
-            return process_dem(dataset_id, variable, dataset_info)
-        else:
-            return jsonify({"error": f"Traitement non implémenté pour le dataset {dataset_id}"}), 501
+        # Attendre (au plus EE_READY_TIMEOUT) que Earth Engine soit prêt
+        if not ee_initializer.wait(EE_READY_TIMEOUT):
+            return {"error": EE_NOT_READY_MESSAGE}, 503
+        
+        result, status = compute_image(dataset_id, variable, date_str, dataset_info, reducer, window, viewport)
+        if status == 200 and record_access and reducer is None and window == "day" and not viewport:
+            record_access_stats("image", dataset_id, variable, args, date_str)
+        if status == 200 and date_str:
+            result = dict(result, date=date_str)
+        if status == 200 and viewport:
+            # Emprise réellement rendue (alignée sur la grille), pour placer l'image côté client
+            result = dict(result, viewport=viewport)
+        return result, status
         
     except Exception as e:
         logger.error(f"Exception lors de la génération de l'image: {str(e)}")
         import traceback
         logger.error(traceback.format_exc())
-        return jsonify({"error": str(e)}), 500
+        return {"error": str(e)}, 500
 
-def process_daymet(dataset_id, variable, date_str, dataset_info):
-    """Traite les données DAYMET."""
-    try:
-        # Convertir la date
-        date_obj = datetime.datetime.strptime(date_str, '%Y-%m-%d')
-        # On filtre sur un jour pour DAYMET (données quotidiennes)
-        start_date = date_str
-        end_date = (date_obj + datetime.timedelta(days=1)).strftime('%Y-%m-%d')
-        
-        # Accéder au dataset
-        dataset = ee.ImageCollection(dataset_id) \
-                    .filterDate(start_date, end_date)
-        
-        # Vérifier si des images sont disponibles
-        collection_size = dataset.size().getInfo()
-        logger.info(f"Nombre d'images trouvées: {collection_size}")
-        
-        if collection_size == 0:
-            return jsonify({"error": f"Aucune donnée disponible pour cette date: {date_str}."})
-        
-        # Sélectionner la bande (variable)
-        variable_collection = dataset.select(variable)
-        
-        # Prendre la première image
-        image = variable_collection.first()
-        
-        # Paramètres de visualisation
-        vis_params = get_vis_params(dataset_id, variable)
-        
-        # Définir la région à visualiser
-        region = ee.Geometry.Rectangle(dataset_info["default_region"])
-        
-        # Obtenir l'URL de l'image
-        image_url = image.getThumbURL({
-            'dimensions': '1200x800',
-            'format': 'png',
-            'min': vis_params['min'],
-            'max': vis_params['max'],
-            'palette': vis_params['palette'],
-            'region': region.toGeoJSON()
-        })
-        
-        # Renvoyer l'URL de l'image
-        return jsonify({
-            "image_url": image_url,
-            "vis_params": vis_params,
-            "variable_name": next((v["name"] for v in dataset_info["variables"] if v["id"] == variable), variable)
-        })
+def cached_compute(cache_key, dataset_info, compute, ttl, variable=""):
+    """Relit un résultat depuis le cache partagé ou le calcule via compute() ; renvoie (données, code HTTP).
+
+    ttl est la durée de fraîcheur (TTL souple) ; l'entrée est conservée plus
+    longtemps (hard_ttl). Pour les datasets quasi temps réel
+    ("stale_while_revalidate"), une entrée périmée mais encore dans la
+    fenêtre est servie immédiatement et recalculée en arrière-plan.
+    Les requêtes identiques simultanées (même clé) partagent un seul calcul Earth Engine.
+    """
+    # Consulter le cache avant de solliciter Earth Engine
+    with stage("cache_lookup", dataset_info["id"], variable_label(dataset_info, variable)):
+        cached = image_cache.get(cache_key)
+    age = result_age(cached)
+    if cached is not None and is_fresh(age, ttl):
+        CACHE_LOOKUPS.inc(kind=cache_key.split(":", 1)[0], result="hit")
+        logger.info(f"Résultat servi depuis le cache: {cache_key}")
+        return with_age(cached, age), 200
+    
+    if cached is not None and is_servable_stale(cached, age, ttl, dataset_info.get("stale_while_revalidate")):
+        CACHE_LOOKUPS.inc(kind=cache_key.split(":", 1)[0], result="stale")
+        refresh_in_background(cache_key, dataset_info, compute, ttl)
+        return dict(with_age(cached, age), stale=True), 200
+    
+    CACHE_LOOKUPS.inc(kind=cache_key.split(":", 1)[0], result="miss")
+    return image_flight.do(cache_key, lambda: compute_and_store(cache_key, dataset_info, compute, ttl))
+
+def result_age(result):
+    """Âge (secondes) d'un résultat en cache, d'après son heure de calcul ; None si elle est inconnue."""
+    if result is None or result.get("computed_at") is None:
+        return None
+    return max(0.0, time.time() - result["computed_at"])
+
+def with_age(result, age):
+    return result if age is None else dict(result, age=round(age, 1))
+
+def is_fresh(age, ttl):
+    return ttl is None or age is None or age < ttl
+
+def is_servable_stale(result, age, ttl, window):
+    """Entrée périmée mais servable (fenêtre de revalidation, identifiant de carte non expiré)."""
+    if not window or age is None or age >= ttl + window:
+        return False
+    return result.get("expires_at", float("inf")) > time.time()
+
+def hard_ttl(ttl, dataset_info):
+    """Durée de conservation d'un résultat : au-delà de sa fraîcheur, il sert encore pendant la fenêtre
+    de revalidation et, si Earth Engine est indisponible, jusqu'à STALE_RESULT_TTL.
+    """
+    if ttl is None:
+        return None
+    return ttl + max(dataset_info.get("stale_while_revalidate") or 0, STALE_RESULT_TTL)
+
+def refresh_in_background(cache_key, dataset_info, compute, ttl):
+    """Recalcule le résultat en arrière-plan (une seule fois par clé et par worker)."""
+    with refreshing_lock:
+        if cache_key in refreshing:
+            return
+        refreshing.add(cache_key)
+    
+    def refresh():
+        try:
+            image_flight.do(cache_key, lambda: compute_and_store(cache_key, dataset_info, compute, ttl,
+                                                                 refresh=True))
+        finally:
+            with refreshing_lock:
+                refreshing.discard(cache_key)
+    
+    logger.info(f"Résultat périmé servi, revalidation en arrière-plan: {cache_key}")
+    refresh_pool.submit(refresh)
+
+def compute_and_store(cache_key, dataset_info, compute, ttl, refresh=False):
+    """Exécute compute() et enregistre le résultat valide dans le cache ; renvoie (données, code HTTP)."""
+    cached = image_cache.get(cache_key)
+    # Un calcul concurrent a pu se terminer entre la lecture du cache et l'obtention du créneau
+    age = result_age(cached)
+    if cached is not None and not refresh and is_fresh(age, ttl):
+        return with_age(cached, age), 200
     
+    label = dataset_info.get("short_name", dataset_info["id"])
+    try:
+        result = compute()
+    except EEUnavailableError as e:
+        # Earth Engine dégradé : servir le dernier résultat connu plutôt qu'une erreur
+        if cached is not None and cached.get("expires_at", float("inf")) > time.time():
+            logger.info(f"Earth Engine indisponible, résultat périmé servi: {cache_key}")
+            return dict(with_age(cached, age), stale=True), 200
+        PIPELINE_ERRORS.inc(dataset=dataset_info["id"], status=e.status)
+        return {"error": str(e)}, e.status
+    except DatasetError as e:
+        PIPELINE_ERRORS.inc(dataset=dataset_info["id"], status=e.status)
+        return {"error": str(e)}, e.status
     except Exception as e:
-        logger.error(f"Erreur lors du traitement DAYMET: {str(e)}")
+        PIPELINE_ERRORS.inc(dataset=dataset_info["id"], status=500)
+        logger.error(f"Erreur lors du traitement {label}: {str(e)}")
         import traceback
         logger.error(traceback.format_exc())
-        return jsonify({"error": f"Erreur lors du traitement DAYMET: {str(e)}"}), 500
+        return {"error": f"Erreur lors du traitement {label}: {str(e)}"}, 500
+    
+    # Ne mettre en cache que les résultats valides
+    result = dict(result, computed_at=time.time())
+    image_cache.set(cache_key, result, ttl=hard_ttl(ttl, dataset_info))
+    return dict(result, age=0.0), 200
+
+def parse_composite_args(args):
+    """Lit les paramètres de composition temporelle (reducer, window) d'une requête."""
+    return args.get('reducer') or None, args.get('window') or "day"
+
+def composite_cache_key(dataset_info, date_str, reducer, window):
+    """Renvoie (date de la clé, suffixe de composition) pour les clés de cache.
 
-def process_gfs(dataset_id, variable, date_str, dataset_info):
-    """Traite les données GFS."""
+    Les fenêtres étant alignées, toutes les dates d'une même fenêtre partagent
+    une seule entrée : la clé porte le début de la fenêtre, pas la date demandée.
+    Lève DatasetError (400) pour un réducteur ou une fenêtre inconnus.
+    """
+    if dataset_info.get("asset_type") != "ImageCollection" or (reducer is None and window == "day"):
+        return date_str, ""
+    composite_name = get_composite_name(dataset_info, reducer)
+    window_start, _ = get_date_window(date_str, window)
+    return window_start, f"{composite_name}/{window}"
+
+def compute_image(dataset_id, variable, date_str, dataset_info, reducer=None, window="day", viewport=None):
+    """Calcule (ou relit depuis le cache partagé) le résultat d'image ; renvoie (données, code HTTP).
+
+    viewport (voir quantize_viewport) remplace la région et les dimensions par défaut du dataset.
+    """
+    if viewport:
+        region, dimensions = viewport["region"], viewport["dimensions"]
+    else:
+        region, dimensions = dataset_info["default_region"], get_thumbnail_defaults(dataset_info)["dimensions"]
+    
+    # Donnée statique déjà exportée : image rendue localement, sans appel Earth Engine
+    if not dataset_info["date_range"]:
+        export_id = raster_store.find(dataset_id, variable, None, region)
+        if export_id:
+            bbox = ",".join(str(c) for c in region)
+            return {
+                "image_url": f"/render/{export_id}.png?bbox={bbox}&dimensions={dimensions}",
+                "vis_params": get_vis_params(dataset_id, variable),
+                "variable_name": get_variable_name(dataset_info, variable),
+                "source": f"export:{export_id}"
+            }, 200
+    
     try:
-        # Convertir la date
-        date_obj = datetime.datetime.strptime(date_str, '%Y-%m-%d')
-        # GFS a des données toutes les 6 heures, on filtre sur une journée
-        start_date = date_str
-        end_date = (date_obj + datetime.timedelta(days=1)).strftime('%Y-%m-%d')
-        
-        # Accéder au dataset
-        dataset = ee.ImageCollection(dataset_id) \
-                    .filterDate(start_date, end_date) \
-                    .select(variable)
-        
-        # Vérifier si des images sont disponibles
-        collection_size = dataset.size().getInfo()
-        logger.info(f"Nombre d'images GFS trouvées: {collection_size}")
-        
-        if collection_size == 0:
-            return jsonify({"error": f"Aucune donnée GFS disponible pour cette date: {date_str}."})
-        
-        # Utiliser la première image
-        image = dataset.first()
-        
-        # Paramètres de visualisation
-        vis_params = get_vis_params(dataset_id, variable)
-        
-        # Définir la région à visualiser
-        region = ee.Geometry.Rectangle(dataset_info["default_region"])
-        
-        # Obtenir l'URL de l'image
-        image_url = image.getThumbURL({
-            'dimensions': '1200x800',
-            'format': 'png',
-            'min': vis_params['min'],
-            'max': vis_params['max'],
-            'palette': vis_params['palette'],
-            'region': region.toGeoJSON()
-        })
-        
-        # Renvoyer l'URL de l'image
-        return jsonify({
-            "image_url": image_url,
-            "vis_params": vis_params,
-            "variable_name": next((v["name"] for v in dataset_info["variables"] if v["id"] == variable), variable)
-        })
+        key_date, composite = composite_cache_key(dataset_info, date_str, reducer, window)
+    except DatasetError as e:
+        return {"error": str(e)}, e.status
     
-    except Exception as e:
-        logger.error(f"Erreur lors du traitement GFS: {str(e)}")
-        import traceback
-        logger.error(traceback.format_exc())
-        return jsonify({"error": f"Erreur lors du traitement GFS: {str(e)}"}), 500
+    cache_key = make_image_cache_key(dataset_id, variable, key_date, region, dimensions, composite)
+    return cached_compute(
+        cache_key, dataset_info,
+        lambda: process_dataset(dataset_info, variable, date_str, get_vis_params(dataset_id, variable),
+                                region=region, dimensions=dimensions, reducer=reducer, window=window),
+        ttl=dataset_info.get("cache_ttl", IMAGE_CACHE_DEFAULT_TTL), variable=variable
+    )
 
-def process_chirps(dataset_id, variable, date_str, dataset_info):
-    """Traite les données CHIRPS."""
+def compute_tile_url(dataset_id, variable, date_str, dataset_info, vis_params, reducer=None, window="day"):
+    """Crée (ou relit depuis le cache) l'identifiant de carte et son gabarit d'URL de tuiles."""
     try:
-        # Convertir la date
-        date_obj = datetime.datetime.strptime(date_str, '%Y-%m-%d')
-        # CHIRPS a des données quotidiennes
-        start_date = date_str
-        end_date = (date_obj + datetime.timedelta(days=1)).strftime('%Y-%m-%d')
-        
-        # Accéder au dataset
-        dataset = ee.ImageCollection(dataset_id) \
-                    .filterDate(start_date, end_date) \
-                    .select(variable)
-        
-        # Vérifier si des images sont disponibles
-        collection_size = dataset.size().getInfo()
-        logger.info(f"Nombre d'images CHIRPS trouvées: {collection_size}")
-        
-        if collection_size == 0:
-            return jsonify({"error": f"Aucune donnée CHIRPS disponible pour cette date: {date_str}."})
-        
-        # Utiliser la première image
-        image = dataset.first()
-        
-        # Paramètres de visualisation
-        vis_params = get_vis_params(dataset_id, variable)
-        
-        # Définir la région à visualiser
-        region = ee.Geometry.Rectangle(dataset_info["default_region"])
-        
-        # Obtenir l'URL de l'image
-        image_url = image.getThumbURL({
-            'dimensions': '1200x800',
-            'format': 'png',
-            'min': vis_params['min'],
-            'max': vis_params['max'],
-            'palette': vis_params['palette'],
-            'region': region.toGeoJSON()
-        })
-        
-        # Renvoyer l'URL de l'image
-        return jsonify({
-            "image_url": image_url,
-            "vis_params": vis_params,
-            "variable_name": next((v["name"] for v in dataset_info["variables"] if v["id"] == variable), variable)
-        })
+        key_date, composite = composite_cache_key(dataset_info, date_str, reducer, window)
+    except DatasetError as e:
+        return {"error": str(e)}, e.status
+    
+    # Un identifiant de carte expire : ne jamais le conserver au-delà de MAP_ID_TTL
+    ttl = dataset_info.get("cache_ttl", IMAGE_CACHE_DEFAULT_TTL)
+    ttl = MAP_ID_TTL if ttl is None else min(ttl, MAP_ID_TTL)
+    
+    def compute():
+        result = process_tiles(dataset_info, variable, date_str, vis_params, reducer=reducer, window=window)
+        result["expires_at"] = time.time() + ttl
+        return result
+    
+    cache_key = make_tile_cache_key(dataset_id, variable, key_date, vis_params, composite)
+    return cached_compute(cache_key, dataset_info, compute, ttl=ttl, variable=variable)
+
+def compute_animation(dataset_id, variable, start_date, end_date, dataset_info, dimensions, frames_per_second):
+    """Crée (ou relit depuis le cache) l'animation d'un intervalle de dates ; renvoie (données, code HTTP)."""
+    cache_key = make_animation_cache_key(dataset_id, variable, start_date, end_date,
+                                         dataset_info["default_region"], dimensions, frames_per_second)
+    return cached_compute(
+        cache_key, dataset_info,
+        lambda: process_animation(dataset_info, variable, start_date, end_date, get_vis_params(dataset_id, variable),
+                                  dimensions=dimensions, frames_per_second=frames_per_second),
+        ttl=dataset_info.get("cache_ttl", IMAGE_CACHE_DEFAULT_TTL), variable=variable
+    )
+
+@app.route('/api/get_animation')
+def get_animation():
+    """Génère une animation (GIF) d'une variable sur un intervalle de dates, en un seul appel Earth Engine."""
+    result, status = get_animation_payload(request.args)
+    return jsonify(result), status
+
+def get_animation_payload(args):
+    """Traite une requête d'animation à partir de ses paramètres ; renvoie (données, code HTTP)."""
+    try:
+        # Récupérer les paramètres
+        dataset_id = args.get('dataset', 'NASA/ORNL/DAYMET_V4')
+        variable = args.get('variable', 'tmax')
+        start_date = args.get('start')
+        end_date = args.get('end')
+        
+        # Obtenir les informations sur le dataset
+        dataset_info = get_dataset_info(dataset_id)
+        if not dataset_info:
+            return {"error": "Dataset non trouvé"}, 404
+        if not start_date or not end_date:
+            return {"error": "Paramètres start et end requis (AAAA-MM-JJ)"}, 400
+        
+        animation = get_animation_defaults(dataset_info)
+        try:
+            dimensions = int(args.get('dimensions', animation["dimensions"]))
+            frames_per_second = int(args.get('fps', animation["frames_per_second"]))
+        except ValueError:
+            return {"error": "dimensions et fps doivent être des entiers"}, 400
+        if not (64 <= dimensions <= 1200) or not (1 <= frames_per_second <= 30):
+            return {"error": "dimensions doit être entre 64 et 1200, fps entre 1 et 30"}, 400
+        
+        logger.info(f"Requête d'animation pour dataset: {dataset_id}, variable: {variable}, du {start_date} au {end_date}")
+        
+        # Attendre (au plus EE_READY_TIMEOUT) que Earth Engine soit prêt
+        if not ee_initializer.wait(EE_READY_TIMEOUT):
+            return {"error": EE_NOT_READY_MESSAGE}, 503
+        
+        return compute_animation(dataset_id, variable, start_date, end_date, dataset_info,
+                                 dimensions, frames_per_second)
     
     except Exception as e:
-        logger.error(f"Erreur lors du traitement CHIRPS: {str(e)}")
-        return jsonify({"error": f"Erreur lors du traitement CHIRPS: {str(e)}"}), 500
+        logger.error(f"Exception lors de la génération de l'animation: {str(e)}")
+        import traceback
+        logger.error(traceback.format_exc())
+        return {"error": str(e)}, 500
+
+@app.route('/api/stats')
+def get_stats():
+    """Série temporelle et statistiques d'une variable sur un point, une emprise ou un polygone GeoJSON."""
+    result, status = get_stats_payload(request.args)
+    return jsonify(result), status
 
-def process_goes16(dataset_id, variable, date_str, dataset_info):
-    """Traite les données GOES-16."""
+def get_stats_payload(args):
+    """Traite une requête de statistiques à partir de ses paramètres ; renvoie (données, code HTTP)."""
     try:
-        # Les données GOES-16 sont complexes et nécessitent un traitement spécial
-        if date_str is None:
-            # Utiliser une date récente par défaut
-            date_str = "2022-01-01"  # Date arbitraire pour l'exemple
-        
-        # Formater la date pour GOES-16
-        date_obj = datetime.datetime.strptime(date_str, '%Y-%m-%d')
-        start_date = date_str
-        end_date = (date_obj + datetime.timedelta(days=1)).strftime('%Y-%m-%d')
-        
-        # Accéder au dataset
-        dataset = ee.ImageCollection(dataset_id) \
-                    .filterDate(start_date, end_date) \
-                    .select(variable)
-        
-        # Vérifier si des images sont disponibles
-        collection_size = dataset.size().getInfo()
-        logger.info(f"Nombre d'images GOES-16 trouvées: {collection_size}")
-        
-        if collection_size == 0:
-            return jsonify({"error": f"Aucune donnée GOES-16 disponible pour cette date: {date_str}."})
-        
-        # Utiliser la première image
-        image = dataset.first()
-        
-        # Paramètres de visualisation
-        vis_params = get_vis_params(dataset_id, variable)
-        
-        # Définir la région à visualiser
-        region = ee.Geometry.Rectangle(dataset_info["default_region"])
-        
-        # Créer les paramètres pour getThumbURL sans le gamma
-        thumb_params = {
-            'dimensions': '1200x800',
-            'format': 'png',
-            'min': vis_params['min'],
-            'max': vis_params['max'],
-            'palette': vis_params['palette'],
-            'region': region.toGeoJSON()
-        }
+        # Récupérer les paramètres
+        dataset_id = args.get('dataset', 'NASA/ORNL/DAYMET_V4')
+        variable = args.get('variable', 'tmax')
+        
+        # Obtenir les informations sur le dataset
+        dataset_info = get_dataset_info(dataset_id)
+        if not dataset_info:
+            return {"error": "Dataset non trouvé"}, 404
+        
+        # Sans intervalle, la série se réduit à la date demandée (ou à la date par défaut)
+        start_date = args.get('start') or args.get('date') or dataset_info["default_date"]
+        end_date = args.get('end') or start_date
+        
+        try:
+            geometry = parse_geometry(args)
+            climatology = parse_climatology(args.get('climatology'))
+        except DatasetError as e:
+            return {"error": str(e)}, e.status
+        try:
+            scale = float(args['scale']) if args.get('scale') else None
+        except ValueError:
+            return {"error": "scale doit être numérique (mètres)"}, 400
+        
+        logger.info(f"Requête de statistiques pour dataset: {dataset_id}, variable: {variable}, du {start_date} au {end_date}")
         
-        # Obtenir l'URL de l'image
-        image_url = image.getThumbURL(thumb_params)
+        # Données statiques déjà exportées : calcul local, sans appel Earth Engine
+        if not dataset_info["date_range"]:
+            export_id = raster_store.find(dataset_id, variable, None, geometry_bounds(geometry))
+            if export_id:
+                return compute_local_stats(dataset_info, variable, geometry, raster_store, export_id), 200
         
-        # Renvoyer l'URL de l'image
-        return jsonify({
-            "image_url": image_url,
-            "vis_params": vis_params,
-            "variable_name": next((v["name"] for v in dataset_info["variables"] if v["id"] == variable), variable)
-        })
+        # Attendre (au plus EE_READY_TIMEOUT) que Earth Engine soit prêt
+        if not ee_initializer.wait(EE_READY_TIMEOUT):
+            return {"error": EE_NOT_READY_MESSAGE}, 503
+        
+        if not dataset_info["date_range"]:
+            start_date = end_date = None
+        cache_key = make_stats_cache_key(dataset_id, variable, geometry, start_date, end_date, scale, climatology)
+        return cached_compute(
+            cache_key, dataset_info,
+            lambda: compute_stats(dataset_info, variable, geometry, start_date, end_date, scale, climatology),
+            ttl=dataset_info.get("cache_ttl", IMAGE_CACHE_DEFAULT_TTL), variable=variable
+        )
     
     except Exception as e:
-        logger.error(f"Erreur lors du traitement GOES-16: {str(e)}")
-        return jsonify({"error": f"Erreur lors du traitement GOES-16: {str(e)}"}), 500
+        logger.error(f"Exception lors du calcul des statistiques: {str(e)}")
+        import traceback
+        logger.error(traceback.format_exc())
+        return {"error": str(e)}, 500
+
+def parse_vis_params(dataset_id, variable, args):
+    """Paramètres de visualisation du dataset, éventuellement surchargés par min, max et palette."""
+    vis_params = dict(get_vis_params(dataset_id, variable))
+    if args.get('min') is not None:
+        vis_params['min'] = float(args['min'])
+    if args.get('max') is not None:
+        vis_params['max'] = float(args['max'])
+    if args.get('palette'):
+        vis_params['palette'] = [color.strip().lstrip('#') for color in args['palette'].split(',')]
+    return vis_params
 
-def process_dem(dataset_id, variable, dataset_info):
-    """Traite les données d'élévation (MNT)."""
+@app.route('/api/get_tile_url')
+def get_tile_url():
+    """Renvoie un gabarit d'URL de tuiles XYZ pour afficher le dataset sur une carte."""
+    result, status = get_tile_url_payload(request.args)
+    return jsonify(result), status
+
+def get_tile_url_payload(args, record_access=True, check_index=True):
+    """Traite une requête de tuiles à partir de ses paramètres ; renvoie (données, code HTTP).
+
+    record_access et check_index : voir get_image_payload.
+    """
     try:
-        # Les données d'élévation sont statiques, pas besoin de date
+        # Récupérer les paramètres
+        dataset_id = args.get('dataset', 'NASA/ORNL/DAYMET_V4')
+        variable = args.get('variable', 'tmax')
+        date_str = args.get('date', None)
         
-        # Accéder au dataset
-        image = ee.Image(dataset_id).select(variable)
+        # Obtenir les informations sur le dataset
+        dataset_info = get_dataset_info(dataset_id)
+        if not dataset_info:
+            return {"error": "Dataset non trouvé"}, 404
         
-        # Paramètres de visualisation
-        vis_params = get_vis_params(dataset_id, variable)
+        # Si la date n'est pas fournie, utiliser la date par défaut du dataset
+        if not date_str and dataset_info["default_date"]:
+            date_str = dataset_info["default_date"]
         
-        # Définir la région à visualiser
-        region = ee.Geometry.Rectangle(dataset_info["default_region"])
+        try:
+            vis_params = parse_vis_params(dataset_id, variable, args)
+        except ValueError:
+            return {"error": "Paramètres de visualisation invalides (min et max doivent être numériques)"}, 400
         
-        # Créer les paramètres pour getThumbURL sans le gamma si une palette est présente
-        thumb_params = {
-            'dimensions': '1200x800',
-            'format': 'png',
-            'min': vis_params['min'],
-            'max': vis_params['max'],
-            'palette': vis_params['palette'],
-            'region': region.toGeoJSON()
-        }
+        reducer, window = parse_composite_args(args)
         
-        # Ajouter gamma seulement s'il est présent ET qu'il n'y a pas de palette
-        # Mais comme vous avez toujours une palette, cette condition ne s'appliquera pas
-        if 'gamma' in vis_params and 'palette' not in vis_params:
-            thumb_params['gamma'] = vis_params['gamma']
+        # Rejeter (ou remplacer) immédiatement une date sans données connue de l'index
+        # (une fenêtre de plusieurs jours peut contenir des données même si ce jour n'en a pas)
+        if window == "day" and check_index:
+            date_str, date_error = resolve_date(dataset_info, date_str, snap=args.get('snap') == '1')
+            if date_error:
+                return {"error": date_error}, 200
         
-        # Obtenir l'URL de l'image
-        image_url = image.getThumbURL(thumb_params)
+        # Attendre (au plus EE_READY_TIMEOUT) que Earth Engine soit prêt
+        if not ee_initializer.wait(EE_READY_TIMEOUT):
+            return {"error": EE_NOT_READY_MESSAGE}, 503
         
-        # Renvoyer l'URL de l'image
-        return jsonify({
-            "image_url": image_url,
-            "vis_params": vis_params,
-            "variable_name": next((v["name"] for v in dataset_info["variables"] if v["id"] == variable), variable)
-        })
+        result, status = compute_tile_url(dataset_id, variable, date_str, dataset_info, vis_params,
+                                          reducer, window)
+        if status == 200 and record_access and reducer is None and window == "day" \
+                and vis_params == get_vis_params(dataset_id, variable):
+            record_access_stats("tiles", dataset_id, variable, args, date_str)
+        if status == 200 and date_str:
+            result = dict(result, date=date_str)
+        return result, status
     
     except Exception as e:
-        logger.error(f"Erreur lors du traitement DEM: {str(e)}")
-        return jsonify({"error": f"Erreur lors du traitement DEM: {str(e)}"}), 500
+        logger.error(f"Exception lors de la génération des tuiles: {str(e)}")
+        import traceback
+        logger.error(traceback.format_exc())
+        return {"error": str(e)}, 500
+
+@app.route('/tiles/<path:dataset_id>/<variable>/<date_str>/<int:z>/<int:x>/<int:y>.png')
+def tile_proxy(dataset_id, variable, date_str, z, x, y):
+    """Sert une tuile XYZ depuis le cache disque, ou la télécharge depuis Earth Engine."""
+    dataset_info = get_dataset_info(dataset_id)
+    if not dataset_info:
+        return jsonify({"error": "Dataset non trouvé"}), 404
+    
+    if z > 24 or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        return jsonify({"error": "Coordonnées de tuile invalides"}), 400
+    
+    reducer, window = parse_composite_args(request.args)
+    
+    # Les données statiques n'ont pas de date ("static" dans l'URL)
+    if date_str == 'static' or not dataset_info["date_range"]:
+        date_str = None
+    elif window == "day":
+        date_str, date_error = resolve_date(dataset_info, date_str)
+        if date_error:
+            return jsonify({"error": date_error}), 404
+    
+    try:
+        vis_params = parse_vis_params(dataset_id, variable, request.args)
+    except ValueError:
+        return jsonify({"error": "Paramètres de visualisation invalides (min et max doivent être numériques)"}), 400
+    
+    # Fraîcheur : celle du dataset, illimitée pour les données statiques
+    max_age = dataset_info.get("cache_ttl", IMAGE_CACHE_DEFAULT_TTL)
+    try:
+        key_date, composite = composite_cache_key(dataset_info, date_str, reducer, window)
+    except DatasetError as e:
+        return jsonify({"error": str(e)}), e.status
+    key = f"{make_tile_cache_key(dataset_id, variable, key_date, vis_params, composite)}:{z}/{x}/{y}"
+    
+    cached = tile_cache.get(key, max_age=max_age)
+    if cached is not None:
+        data, age = cached
+    else:
+        result, status = compute_tile_url(dataset_id, variable, date_str, dataset_info, vis_params,
+                                          reducer, window)
+        if status != 200 or "error" in result:
+            return jsonify(result), status if status != 200 else 404
+        
+        url = result["tile_url"].replace("{z}", str(z)).replace("{x}", str(x)).replace("{y}", str(y))
+        try:
+            upstream_status, data = fetch_tile(url, timeout=TILE_FETCH_TIMEOUT)
+        except TileFetchError as e:
+            logger.error(f"Échec du téléchargement de la tuile {key}: {str(e)}")
+            return jsonify({"error": f"Tuile indisponible: {str(e)}"}), e.status
+        if upstream_status != 200:
+            logger.error(f"Échec du téléchargement de la tuile {key}: HTTP {upstream_status}")
+            return jsonify({"error": f"Tuile indisponible (HTTP {upstream_status})"}), 502
+        tile_cache.put(key, data)
+        age = 0
+    
+    response = Response(data, mimetype='image/png')
+    response.set_etag(hashlib.sha1(data).hexdigest())
+    if max_age is None:
+        response.headers['Cache-Control'] = f"public, max-age={STATIC_TILE_MAX_AGE}, immutable"
+    else:
+        response.headers['Cache-Control'] = f"public, max-age={max(0, int(max_age - age))}"
+    return response.make_conditional(request)
+
+@app.route('/api/exports', methods=['POST'])
+def create_export():
+    """Lance l'export local d'un raster (dataset, variable, date, emprise, échelle) ; renvoie 202 et son suivi."""
+    params = request.get_json(silent=True) or request.form
+    dataset_id = params.get('dataset', 'USGS/GTOPO30')
+    variable = params.get('variable', 'elevation')
+    
+    dataset_info = get_dataset_info(dataset_id)
+    if not dataset_info:
+        return jsonify({"error": "Dataset non trouvé"}), 404
+    
+    date_str = (params.get('date') or dataset_info["default_date"]) if dataset_info["date_range"] else None
+    try:
+        region = params.get('bbox') or dataset_info["default_region"]
+        if isinstance(region, str):
+            region = [float(v) for v in region.split(',')]
+        region = [float(v) for v in region]
+        scale = float(params.get('scale') or dataset_info.get("scale", 1000))
+        if len(region) != 4 or region[0] >= region[2] or region[1] >= region[3] or scale <= 0:
+            raise ValueError()
+    except (TypeError, ValueError):
+        return jsonify({"error": "Paramètres invalides (bbox: ouest,sud,est,nord ; scale: mètres)"}), 400
+    
+    # Attendre (au plus EE_READY_TIMEOUT) que Earth Engine soit prêt
+    if not ee_initializer.wait(EE_READY_TIMEOUT):
+        return jsonify({"error": EE_NOT_READY_MESSAGE}), 503
+    
+    try:
+        export = raster_exporter.submit(dataset_info, variable, date_str, region, scale,
+                                        fmt=params.get('format', 'npy'))
+    except DatasetError as e:
+        return jsonify({"error": str(e)}), e.status
+    
+    logger.info(f"Export {export['id']}: {dataset_id}/{variable}, {export['width']}x{export['height']} pixels")
+    return jsonify(export), 200 if export["status"] == "complete" else 202
+
+@app.route('/api/exports')
+def list_exports():
+    """Liste les exports locaux et leur état."""
+    return jsonify([dict(meta, id=export_id) for export_id, meta in raster_store.list().items()])
+
+@app.route('/api/exports/<export_id>')
+def get_export(export_id):
+    """État et métadonnées d'un export."""
+    meta = raster_store.get(export_id)
+    if meta is None:
+        return jsonify({"error": "Export non trouvé"}), 404
+    return jsonify(dict(meta, id=export_id))
+
+@app.route('/api/exports/<export_id>/data')
+def download_export(export_id):
+    """Télécharge les données d'un export terminé (format npy ou cog)."""
+    meta = raster_store.get(export_id)
+    fmt = request.args.get('format', 'npy')
+    if meta is None or meta["status"] != "complete" or fmt not in meta["formats"]:
+        return jsonify({"error": "Export non trouvé ou non terminé"}), 404
+    
+    filename = f"{meta['dataset'].replace('/', '_')}_{meta['variable']}_{export_id}"
+    if fmt == "cog":
+        return send_file(raster_store.path(export_id, "cog"), mimetype='image/tiff',
+                         as_attachment=True, download_name=f"{filename}.tif")
+    return send_file(raster_store.path(export_id), mimetype='application/octet-stream',
+                     as_attachment=True, download_name=f"{filename}.npy")
+
+@app.route('/render/<export_id>.png')
+def render_export(export_id):
+    """Rend localement un raster exporté en PNG (min, max, palette, bbox, dimensions), sans appel Earth Engine."""
+    meta = raster_store.get(export_id)
+    if meta is None or meta["status"] != "complete":
+        return jsonify({"error": "Export non trouvé ou non terminé"}), 404
+    
+    try:
+        vis_params = parse_vis_params(meta["dataset"], meta["variable"], request.args)
+        array = raster_store.open_array(export_id)
+        if request.args.get('bbox'):
+            bounds = [float(v) for v in request.args['bbox'].split(',')]
+            row0, row1, col0, col1 = window_for_bounds(meta, bounds)
+            array = array[row0:row1, col0:col1]
+        dimensions = request.args.get('dimensions', DEFAULT_THUMBNAIL["dimensions"])
+        data = render_png(array, vis_params, dimensions)
+    except DatasetError as e:
+        return jsonify({"error": str(e)}), e.status
+    except ValueError:
+        return jsonify({"error": "Paramètres invalides (min, max, bbox et dimensions doivent être numériques)"}), 400
+    
+    response = Response(data, mimetype='image/png')
+    response.set_etag(hashlib.sha1(data).hexdigest())
+    response.headers['Cache-Control'] = f"public, max-age={STATIC_TILE_MAX_AGE}"
+    return response.make_conditional(request)
+
+@app.route('/api/available_dates')
+def available_dates():
+    """Liste les dates disposant d'images pour un dataset, d'après l'index local."""
+    dataset_id = request.args.get('dataset', 'NASA/ORNL/DAYMET_V4')
+    dataset_info = get_dataset_info(dataset_id)
+    if not dataset_info:
+        return jsonify({"error": "Dataset non trouvé"}), 404
+    
+    if dataset_info.get("asset_type") != "ImageCollection":
+        return jsonify({"dataset": dataset_id, "static": True, "dates": []})
+    
+    try:
+        dates = availability_index.available_dates(dataset_id, request.args.get('start'), request.args.get('end'))
+    except ValueError:
+        return jsonify({"error": "Date invalide (format attendu AAAA-MM-JJ)"}), 400
+    
+    return jsonify({
+        "dataset": dataset_id,
+        "static": False,
+        "indexed_range": availability_index.indexed_range(dataset_id),
+        "dates": dates
+    })
+
+@app.route('/api/cache_stats')
+def cache_stats():
+    """Renvoie les compteurs du cache d'images (succès, échecs, évictions)."""
+    return jsonify(dict(image_cache.stats(), tiles=tile_cache.stats(), single_flight=image_flight.stats()))
+
+@app.route('/api/warmup')
+def warmup_status():
+    """État du préchauffage : file, planifications et jeu chaud (requêtes les plus fréquentes)."""
+    return jsonify(dict(warmup_scheduler.status(), warm_set=[
+        {"kind": kind, "dataset": dataset_id, "variable": variable, "date": date_str, "score": round(score, 3)}
+        for (kind, dataset_id, variable, date_str), score in access_stats.top(WARMUP_SET_SIZE)
+    ]))
+
+@app.route('/metrics')
+def metrics():
+    """Métriques du worker au format texte Prometheus (étapes du pipeline, appels Earth Engine, caches, routes)."""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+def static_image_error(message, status, details=None):
+    """Page d'erreur de /static_image (message échappé par le template), avec son statut HTTP."""
+    return render_template('static_image_error.html', message=message, details=details), status
 
 @app.route('/static_image')
 def static_image():
@@ -626,259 +1272,54 @@ def static_image():
         # Obtenir les informations sur le dataset
         dataset_info = get_dataset_info(dataset_id)
         if not dataset_info:
-            return "Dataset non trouvé", 404
+            return static_image_error("Dataset non trouvé", 404)
         
         # Si la date n'est pas fournie, utiliser la date par défaut du dataset
         if not date_str and dataset_info["default_date"]:
             date_str = dataset_info["default_date"]
         
-        # Vérifier si Earth Engine est initialisé
-        if not ee.data._initialized:
-            initialize_earth_engine()
-            if not ee.data._initialized:
-                return "Échec de l'initialisation de Earth Engine", 500
-        
-        # Générer une image selon le type de dataset
-        image_data = None
-        if dataset_id == "NASA/ORNL/DAYMET_V4":
-            # Traiter les données DAYMET
-            response = process_daymet(dataset_id, variable, date_str, dataset_info)
-            if isinstance(response, tuple):
-                return f"Erreur: {response[0].json['error']}", response[1]
-            image_data = response.json
-        elif dataset_id == "NOAA/GFS0P25":
-            # Traiter les données GFS
-            response = process_gfs(dataset_id, variable, date_str, dataset_info)
-            if isinstance(response, tuple):
-                return f"Erreur: {response[0].json['error']}", response[1]
-            image_data = response.json
-        elif dataset_id == "UCSB-CHG/CHIRPS/DAILY":
-            # Traiter les données CHIRPS
-            response = process_chirps(dataset_id, variable, date_str, dataset_info)
-            if isinstance(response, tuple):
-                return f"Erreur: {response[0].json['error']}", response[1]
-            image_data = response.json
-        elif dataset_id == "NOAA/GOES/16/MCMIPC":
-            # Traiter les données GOES-16
-            response = process_goes16(dataset_id, variable, date_str, dataset_info)
-            if isinstance(response, tuple):
-                return f"Erreur: {response[0].json['error']}", response[1]
-            image_data = response.json
-        elif dataset_id in ["USGS/SRTMGL1_003", "USGS/GTOPO30"]:
-            # Traiter les données d'élévation
-            response = process_dem(dataset_id, variable, dataset_info)
-            if isinstance(response, tuple):
-                return f"Erreur: {response[0].json['error']}", response[1]
-            image_data = response.json
-        else:
-            return f"Traitement non implémenté pour le dataset {dataset_id}", 501
-        
-        if not image_data:
-            return "Erreur lors de la génération de l'image", 500
-        
-        # Extraire les paramètres nécessaires
-        image_url = image_data.get("image_url")
-        vis_params = image_data.get("vis_params")
-        variable_name = image_data.get("variable_name")
-        
-        # Générer la légende
-        palette = vis_params.get('palette', [])
-        min_val = vis_params.get('min', 0)
-        max_val = vis_params.get('max', 100)
-        steps = len(palette)
-        range_val = max_val - min_val
-        
-        legend_html = ""
-        for i, color in enumerate(palette):
-            value = min_val + (i * (range_val / (steps - 1)))
-            color_code = color if color.startswith('#') else f"#{color}"
-            legend_html += f"""
-            <div class="legend-item">
-                <div class="color-box" style="background-color: {color_code};"></div>
-                <span>{value:.1f}</span>
-            </div>
-            """
-        
-        # Construire la page HTML
-        dataset_name = dataset_info["name"]
-        date_text = f"Date: {date_str}" if date_str else "Données statiques"
-        
-        return f"""
-        <html>
-            <head>
-                <title>TerraSight - {dataset_name}</title>
-                <style>
-                    body {{
-                        font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-                        padding: 0;
-                        margin: 0;
-                        background-color: #f0f5f0;
-                        color: #333;
-                    }}
-                    .header {{
-                        background-color: #1e8449;
-                        color: white;
-                        padding: 15px;
-                        text-align: center;
-                        box-shadow: 0 2px 5px rgba(0, 0, 0, 0.1);
-                    }}
-                    .container {{
-                        max-width: 1400px;
-                        margin: 0 auto;
-                        padding: 20px;
-                    }}
-                    .image-container {{
-                        margin-top: 20px;
-                        text-align: center;
-                        background-color: white;
-                        padding: 10px;
-                        border-radius: 8px;
-                        box-shadow: 0 2px 15px rgba(0, 0, 0, 0.1);
-                    }}
-                    .image-container img {{
-                        max-width: 100%;
-                        border-radius: 4px;
-                    }}
-                    .controls {{
-                        margin-top: 20px;
-                        display: flex;
-                        justify-content: center;
-                        gap: 10px;
-                    }}
-                    .btn {{
-                        text-decoration: none;
-                        color: white;
-                        background-color: #27ae60;
-                        padding: 10px 20px;
-                        border-radius: 4px;
-                        font-weight: 500;
-                        transition: background-color 0.2s ease;
-                        border: none;
-                        cursor: pointer;
-                    }}
-                    .btn:hover {{
-                        background-color: #219653;
-                    }}
-                    .legend-container {{
-                        margin-top: 20px;
-                        padding: 15px;
-                        background-color: white;
-                        border-radius: 8px;
-                        box-shadow: 0 2px 15px rgba(0, 0, 0, 0.1);
-                    }}
-                    .legend-title {{
-                        text-align: center;
-                        margin-bottom: 15px;
-                        font-weight: 600;
-                    }}
-                    .legend {{
-                        display: flex;
-                        flex-wrap: wrap;
-                        justify-content: center;
-                        gap: 10px;
-                    }}
-                    .legend-item {{
-                        display: flex;
-                        align-items: center;
-                        margin: 0 5px;
-                    }}
-                    .color-box {{
-                        width: 20px;
-                        height: 20px;
-                        margin-right: 5px;
-                        border-radius: 2px;
-                    }}
-                    .info-bar {{
-                        background-color: #f8f9fa;
-                        padding: 10px;
-                        border-radius: 4px;
-                        margin-top: 20px;
-                        display: flex;
-                        justify-content: space-between;
-                        align-items: center;
-                    }}
-                </style>
-            </head>
-            <body>
-                <div class="header">
-                    <h1>TerraSight</h1>
-                    <p>Visualisation de données géospatiales avec Google Earth Engine</p>
-                </div>
-                
-                <div class="container">
-                    <h2>{dataset_name} - {variable_name}</h2>
-                    <div class="info-bar">
-                        <div>{date_text}</div>
-                        <div>Dataset: {dataset_id}</div>
-                    </div>
-                    
-                    <div class="image-container">
-                        <img src="{image_url}" alt="{variable_name}" />
-                    </div>
-                    
-                    <div class="legend-container">
-                        <div class="legend-title">Légende</div>
-                        <div class="legend">
-                            {legend_html}
-                        </div>
-                    </div>
-                    
-                    <div class="controls">
-                        <a href="/viewer?dataset={dataset_id}" class="btn">Retour à la visionneuse</a>
-                        <a href="/" class="btn">Accueil</a>
-                    </div>
-                </div>
-            </body>
-        </html>
-        """
+        reducer, window = parse_composite_args(request.args)
+        
+        # Rejeter (ou remplacer) immédiatement une date sans données connue de l'index
+        if window == "day":
+            date_str, date_error = resolve_date(dataset_info, date_str, snap=request.args.get('snap') == '1')
+            if date_error:
+                return static_image_error(date_error, 404)
+        
+        # Attendre (au plus EE_READY_TIMEOUT) que Earth Engine soit prêt
+        if not ee_initializer.wait(EE_READY_TIMEOUT):
+            return static_image_error(EE_NOT_READY_MESSAGE, 503)
+        
+        # Générer (ou relire depuis le cache) l'image du dataset
+        image_data, status = compute_image(dataset_id, variable, date_str, dataset_info, reducer, window)
+        if "error" in image_data:
+            # Aucune donnée (200 dans l'API JSON) : 404 pour la page, jamais mise en cache ni validée par ETag
+            return static_image_error(image_data["error"], status if status >= 400 else 404)
+        
+        # La page ne dépend que de l'image (son URL) : la relire depuis le cache si elle a déjà été rendue
+        page_key = f"page:{dataset_id}:{variable}:{date_str or ''}:{image_data['image_url']}"
+        page = page_cache.get(page_key)
+        if page is None:
+            page = render_template(
+                'static_image.html',
+                dataset_id=dataset_id,
+                dataset_name=dataset_info["name"],
+                variable_name=image_data.get("variable_name"),
+                date=date_str,
+                image_url=image_data["image_url"],
+                legend=get_legend(dataset_id, variable, image_data["vis_params"])
+            )
+            page_cache.set(page_key, page, ttl=dataset_info.get("cache_ttl", IMAGE_CACHE_DEFAULT_TTL))
+        
+        response = Response(page, mimetype='text/html')
+        response.set_etag(hashlib.sha1(page.encode('utf-8')).hexdigest())
+        response.headers['Cache-Control'] = "no-cache"  # Revalidation systématique (ETag)
+        return response.make_conditional(request)
     except Exception as e:
         import traceback
-        return f"""
-        <html>
-            <head>
-                <title>Erreur</title>
-                <style>
-                    body {{
-                        font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-                        padding: 20px;
-                        background-color: #f8f9fa;
-                    }}
-                    .error {{
-                        color: #721c24;
-                        background-color: #f8d7da;
-                        padding: 20px;
-                        border-radius: 5px;
-                        border: 1px solid #f5c6cb;
-                        margin-bottom: 20px;
-                    }}
-                    pre {{
-                        white-space: pre-wrap;
-                        background-color: #f1f1f1;
-                        padding: 15px;
-                        border-radius: 4px;
-                        overflow-x: auto;
-                    }}
-                    a {{
-                        display: inline-block;
-                        margin-top: 20px;
-                        text-decoration: none;
-                        color: white;
-                        background-color: #27ae60;
-                        padding: 10px 20px;
-                        border-radius: 4px;
-                    }}
-                </style>
-            </head>
-            <body>
-                <div class="error">
-                    <h1>Erreur lors de la génération de l'image</h1>
-                    <p>{str(e)}</p>
-                    <pre>{traceback.format_exc()}</pre>
-                    <a href="/">Retour à l'accueil</a>
-                </div>
-            </body>
-        </html>
-        """
+        logger.error(f"Erreur lors de la génération de la page statique: {str(e)}")
+        logger.error(traceback.format_exc())
+        return static_image_error(str(e), 500, details=traceback.format_exc())
 
 # Servir les fichiers statiques
 @app.route('/static/<path:filename>')
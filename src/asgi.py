@@ -0,0 +1,199 @@
+# asgi.py - Mode de service asynchrone (ASGI) de TerraSight
+#
+# Les routes Earth Engine chaudes sont servies par une boucle asyncio : chaque
+# requête attend son résultat sous forme de coroutine, les appels Earth Engine
+# s'exécutant dans un pool de threads borné (ee_executor.py). Les autres routes
+# sont déléguées à l'application Flask via un adaptateur WSGI minimal.
+#
+# Lancement (depuis src/) : uvicorn asgi:application --workers 4
+import asyncio
+import io
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+from werkzeug.datastructures import MultiDict
+
+import app as terrasight
+from ee_executor import EEExecutor, ExecutorBusyError
+from metrics import HTTP_REQUEST_SECONDS, HTTP_REQUESTS
+from singleflight import AsyncSingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+EE_MAX_WORKERS = int(os.environ.get('TERRASIGHT_EE_WORKERS', '32'))  # Appels Earth Engine simultanés
+EE_MAX_PENDING = int(os.environ.get('TERRASIGHT_EE_MAX_PENDING', '1024'))  # Requêtes en attente avant refus
+REQUEST_TIMEOUT = float(os.environ.get('TERRASIGHT_REQUEST_TIMEOUT', '60'))  # Délai maximal par requête (s)
+WSGI_MAX_WORKERS = 16  # Threads réservés aux routes Flask déléguées
+
+executor = EEExecutor(max_workers=EE_MAX_WORKERS, max_pending=EE_MAX_PENDING, timeout=REQUEST_TIMEOUT)
+wsgi_pool = ThreadPoolExecutor(max_workers=WSGI_MAX_WORKERS, thread_name_prefix="wsgi")
+# Requêtes identiques simultanées : un seul passage par le pool Earth Engine
+request_flight = AsyncSingleFlight()
+
+# Routes servies en mode asynchrone : chemin -> fonction (paramètres) -> (données, code HTTP)
+ASYNC_ROUTES = {
+    '/api/get_image': terrasight.get_image_payload,
+    '/api/get_tile_url': terrasight.get_tile_url_payload,
+    '/api/get_animation': terrasight.get_animation_payload,
+    '/api/stats': terrasight.get_stats_payload
+}
+
+
+async def send_json(send, payload, status):
+    """Envoie une réponse JSON complète."""
+    body = json.dumps(payload, sort_keys=True).encode('utf-8')
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def wait_for_disconnect(receive):
+    """Se termine lorsque le client ferme la connexion."""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def handle_async_route(handler, scope, receive, send):
+    """Exécute une route Earth Engine dans le pool borné, avec délai maximal et annulation."""
+    started = time.perf_counter()
+    pairs = parse_qsl(scope.get("query_string", b"").decode('latin-1'), keep_blank_values=True)
+    args = MultiDict(pairs)
+    # Clé normalisée : l'ordre des paramètres de l'URL est indifférent
+    flight_key = (scope["path"], tuple(sorted(pairs)))
+    task = asyncio.ensure_future(request_flight.do(
+        flight_key, lambda: executor.run(handler, args, timeout=REQUEST_TIMEOUT)
+    ))
+    disconnect = asyncio.ensure_future(wait_for_disconnect(receive))
+
+    done, _ = await asyncio.wait({task, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+    if task not in done:
+        # Le client est parti : inutile de poursuivre (ou de démarrer) le calcul
+        task.cancel()
+        logger.info(f"Client déconnecté, requête annulée: {scope['path']}")
+        return
+    disconnect.cancel()
+
+    try:
+        payload, status = task.result()
+    except asyncio.TimeoutError:
+        payload, status = {"error": f"Délai dépassé ({REQUEST_TIMEOUT:g} s) pour la requête Earth Engine"}, 504
+    except ExecutorBusyError as e:
+        payload, status = {"error": f"Serveur surchargé: {str(e)}"}, 503
+    await send_json(send, payload, status)
+    # Ces routes ne passent pas par Flask : mêmes métriques que record_request_metrics
+    HTTP_REQUESTS.inc(route=scope["path"], method=scope["method"], status=status)
+    HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, route=scope["path"])
+
+
+def build_environ(scope, body):
+    """Construit l'environnement WSGI d'une requête ASGI HTTP."""
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", ""),
+        "PATH_INFO": scope["path"],
+        "QUERY_STRING": scope.get("query_string", b"").decode('latin-1'),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": io.StringIO(),
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False
+    }
+    for name, value in scope.get("headers", []):
+        name = name.decode('latin-1').upper().replace("-", "_")
+        value = value.decode('latin-1')
+        if name == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+        elif name == "CONTENT_LENGTH":
+            environ["CONTENT_LENGTH"] = value
+        else:
+            key = f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+async def handle_wsgi(scope, receive, send):
+    """Délègue la requête à l'application Flask ; les morceaux de réponse sont transmis au fil de l'eau."""
+    body = b""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            break
+
+    response_start = {}
+
+    def start_response(status, headers, exc_info=None):
+        response_start["status"] = int(status.split(" ", 1)[0])
+        response_start["headers"] = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+
+    loop = asyncio.get_running_loop()
+    iterable = await loop.run_in_executor(wsgi_pool, terrasight.app.wsgi_app, build_environ(scope, body), start_response)
+    iterator = iter(iterable)
+    sentinel = object()
+    started = False
+    try:
+        while True:
+            chunk = await loop.run_in_executor(wsgi_pool, next, iterator, sentinel)
+            if not started:
+                await send({"type": "http.response.start", "status": response_start["status"],
+                            "headers": response_start["headers"]})
+                started = True
+            if chunk is sentinel:
+                break
+            if chunk:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        if hasattr(iterable, "close"):
+            iterable.close()
+
+
+async def handle_lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            executor.shutdown()
+            wsgi_pool.shutdown(wait=False)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    """Point d'entrée ASGI."""
+    if scope["type"] == "lifespan":
+        await handle_lifespan(receive, send)
+        return
+
+    if scope["type"] != "http":
+        return
+
+    if scope["path"] == "/api/executor_stats":
+        await send_json(send, dict(executor.stats(), single_flight=request_flight.stats()), 200)
+        return
+
+    handler = ASYNC_ROUTES.get(scope["path"])
+    if handler is not None and scope["method"] == "GET":
+        await handle_async_route(handler, scope, receive, send)
+    else:
+        await handle_wsgi(scope, receive, send)
@@ -0,0 +1,262 @@
+# availability.py - Index local des dates disponibles par collection Earth Engine
+import datetime
+import logging
+import threading
+
+import ee
+
+from ee_gateway import ee_call
+from processor import series_collection
+
+logger = logging.getLogger(__name__)
+
+DAYS_PER_YEAR_BITS = 366  # Un bit par jour de l'année (années bissextiles comprises)
+REFRESH_LOOKBACK_DAYS = 3  # Jours ré-indexés à chaque rafraîchissement (données tardives)
+MAX_SNAP_DAYS = 366  # Distance maximale de recherche de la date disponible la plus proche
+DAILY_RESOLUTIONS = ("daily", None)  # Au plus une image par jour : une requête par année suffit
+
+
+def _parse_date(date_str):
+    return datetime.datetime.strptime(date_str, '%Y-%m-%d').date()
+
+
+def utc_today():
+    """Jour courant en UTC : l'horloge des dates des collections (et des cycles de prévision)."""
+    return datetime.datetime.now(datetime.timezone.utc).date()
+
+
+def _month_chunks(start_date, end_date):
+    """Découpe [start_date, end_date) en intervalles [début, fin) d'au plus un mois calendaire."""
+    start, end = _parse_date(start_date), _parse_date(end_date)
+    while start < end:
+        next_month = (start.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+        chunk_end = min(next_month, end)
+        yield start.strftime('%Y-%m-%d'), chunk_end.strftime('%Y-%m-%d')
+        start = chunk_end
+
+
+def fetch_available_dates(dataset_info, start_date, end_date):
+    """Renvoie les dates (AAAA-MM-JJ) de [start_date, end_date) ayant au moins une image.
+
+    La réduction aux dates distinctes est faite côté serveur, après le filtre
+    de série du dataset (GFS : analyses seules, pas les ≈200 échéances de
+    chaque cycle). Les collections infra-quotidiennes (GOES-16 : une image
+    toutes les 10 minutes) sont agrégées mois par mois pour borner le nombre
+    d'images par requête ; les autres en un seul appel Earth Engine.
+    """
+    collection_id = dataset_info["id"]
+    if dataset_info.get("temporal_resolution") in DAILY_RESOLUTIONS:
+        chunks = [(start_date, end_date)]
+    else:
+        chunks = list(_month_chunks(start_date, end_date))
+
+    dates = []
+    for chunk_start, chunk_end in chunks:
+        collection = series_collection(dataset_info).filterDate(chunk_start, chunk_end)
+        chunk_dates = ee.List(collection.aggregate_array('system:time_start')) \
+                        .map(lambda t: ee.Date(t).format('YYYY-MM-dd')) \
+                        .distinct()
+        dates.extend(ee_call("aggregate_array", collection_id, chunk_dates.getInfo))
+    return dates
+
+
+class AvailabilityIndex:
+    """Index des jours disposant d'images, stocké en bitset (46 octets par collection et par année).
+
+    Chaque collection a un intervalle indexé [début, fin] ; en dehors de cet
+    intervalle la disponibilité est inconnue et il faut interroger Earth Engine.
+    Pour les collections encore alimentées, les REFRESH_LOOKBACK_DAYS derniers
+    jours indexés peuvent recevoir des images avant le prochain rafraîchissement
+    (nouveau cycle, données tardives) : un jour sans image y reste inconnu.
+    """
+
+    def __init__(self, fetch=fetch_available_dates, cache=None, today=utc_today):
+        self._fetch = fetch
+        self._cache = cache  # Cache partagé optionnel (années passées réutilisées par les autres workers)
+        self._today = today
+        self._bitsets = {}  # (collection_id, année) -> bytearray
+        self._indexed = {}  # collection_id -> (date de début, date de fin) indexées
+        self._ongoing = set()  # Collections encore alimentées (fin d'index provisoire)
+        self._datasets = {}  # collection_id -> informations du dataset (filtre de série, résolution)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    # --- Lecture ---------------------------------------------------------
+
+    def _bit(self, collection_id, day):
+        bitset = self._bitsets.get((collection_id, day.year))
+        if bitset is None:
+            return False
+        offset = day.timetuple().tm_yday - 1
+        return bool(bitset[offset >> 3] & (1 << (offset & 7)))
+
+    def is_indexed(self, collection_id, date_str):
+        """Indique si la date est couverte par l'index de la collection."""
+        indexed = self._indexed.get(collection_id)
+        if indexed is None:
+            return False
+        return indexed[0] <= _parse_date(date_str) <= indexed[1]
+
+    def is_settled(self, collection_id, day):
+        """Indique si l'absence d'images ce jour-là est définitive (hors de la fin provisoire de l'index)."""
+        if collection_id not in self._ongoing:
+            return True
+        return day < self._indexed[collection_id][1] - datetime.timedelta(days=REFRESH_LOOKBACK_DAYS)
+
+    def is_available(self, collection_id, date_str):
+        """Renvoie True/False si la date est indexée, None si la disponibilité est inconnue."""
+        if not self.is_indexed(collection_id, date_str):
+            return None
+        day = _parse_date(date_str)
+        if self._bit(collection_id, day):
+            return True
+        # Jour récent d'une collection alimentée : des images ont pu être publiées depuis le rafraîchissement
+        return False if self.is_settled(collection_id, day) else None
+
+    def available_dates(self, collection_id, start_date=None, end_date=None):
+        """Liste les dates disponibles de la collection dans l'intervalle indexé demandé."""
+        indexed = self._indexed.get(collection_id)
+        if indexed is None:
+            return []
+        start = max(indexed[0], _parse_date(start_date)) if start_date else indexed[0]
+        end = min(indexed[1], _parse_date(end_date)) if end_date else indexed[1]
+
+        dates = []
+        day = start
+        one_day = datetime.timedelta(days=1)
+        while day <= end:
+            if self._bit(collection_id, day):
+                dates.append(day.strftime('%Y-%m-%d'))
+            day += one_day
+        return dates
+
+    def nearest(self, collection_id, date_str):
+        """Renvoie la date disponible la plus proche (à date égale, la plus ancienne), ou None."""
+        indexed = self._indexed.get(collection_id)
+        if indexed is None:
+            return None
+        target = _parse_date(date_str)
+        for distance in range(MAX_SNAP_DAYS + 1):
+            for day in (target - datetime.timedelta(days=distance), target + datetime.timedelta(days=distance)):
+                if indexed[0] <= day <= indexed[1] and self._bit(collection_id, day):
+                    return day.strftime('%Y-%m-%d')
+        return None
+
+    def indexed_range(self, collection_id):
+        """Renvoie l'intervalle indexé [début, fin] (chaînes AAAA-MM-JJ) ou None."""
+        indexed = self._indexed.get(collection_id)
+        if indexed is None:
+            return None
+        return [indexed[0].strftime('%Y-%m-%d'), indexed[1].strftime('%Y-%m-%d')]
+
+    # --- Construction ----------------------------------------------------
+
+    def _store_year(self, collection_id, year, dates, start, end):
+        """Remplace les bits de [start, end] de l'année par les dates fournies."""
+        key = (collection_id, year)
+        with self._lock:
+            bitset = self._bitsets.setdefault(key, bytearray((DAYS_PER_YEAR_BITS + 7) // 8))
+            for offset in range(start.timetuple().tm_yday - 1, end.timetuple().tm_yday):
+                bitset[offset >> 3] &= ~(1 << (offset & 7)) & 0xFF
+            for date_str in dates:
+                offset = _parse_date(date_str).timetuple().tm_yday - 1
+                bitset[offset >> 3] |= 1 << (offset & 7)
+
+    def _index_year(self, collection_id, year, start, end):
+        """Indexe [start, end] (même année) ; les années révolues passent par le cache partagé."""
+        complete_year = end < self._today() and start.month == 1 and start.day == 1 \
+            and end.month == 12 and end.day == 31
+        cache_key = f"availability:{collection_id}:{year}"
+
+        if complete_year and self._cache is not None:
+            cached = self._cache.get(cache_key, record_stats=False)
+            if cached is not None:
+                with self._lock:
+                    self._bitsets[(collection_id, year)] = bytearray.fromhex(cached)
+                return
+
+        end_exclusive = (end + datetime.timedelta(days=1)).strftime('%Y-%m-%d')
+        dataset_info = self._datasets.get(collection_id, {"id": collection_id})
+        dates = self._fetch(dataset_info, start.strftime('%Y-%m-%d'), end_exclusive)
+        self._store_year(collection_id, year, dates, start, end)
+
+        if complete_year and self._cache is not None:
+            self._cache.set(cache_key, self._bitsets[(collection_id, year)].hex(), ttl=None)
+
+    def index_range(self, collection_id, start_date, end_date):
+        """Indexe la collection sur [start_date, end_date], une requête Earth Engine par année."""
+        start, end = _parse_date(start_date), _parse_date(end_date)
+        for year in range(start.year, end.year + 1):
+            year_start = max(start, datetime.date(year, 1, 1))
+            year_end = min(end, datetime.date(year, 12, 31))
+            self._index_year(collection_id, year, year_start, year_end)
+
+            # Étendre l'intervalle indexé au fur et à mesure (utilisable pendant la construction)
+            with self._lock:
+                indexed = self._indexed.get(collection_id)
+                if indexed is None:
+                    self._indexed[collection_id] = (year_start, year_end)
+                else:
+                    self._indexed[collection_id] = (min(indexed[0], year_start), max(indexed[1], year_end))
+
+    def build(self, datasets):
+        """Construit l'index complet des collections datées (en masse, au démarrage)."""
+        for dataset_info in datasets:
+            collection_id = dataset_info["id"]
+            self._datasets[collection_id] = dataset_info
+            if dataset_info.get("ongoing"):
+                self._ongoing.add(collection_id)
+            start_date = dataset_info["date_range"][0]
+            end_date = self._today().strftime('%Y-%m-%d')
+            if not dataset_info.get("ongoing"):
+                end_date = min(dataset_info["date_range"][1], end_date)
+            try:
+                logger.info(f"Construction de l'index de disponibilité: {collection_id}")
+                self.index_range(collection_id, start_date, end_date)
+            except Exception as e:
+                logger.error(f"Erreur lors de l'indexation de {collection_id}: {str(e)}")
+
+    def refresh(self, datasets):
+        """Rafraîchit incrémentalement la fin de l'index (nouvelles images, données tardives)."""
+        today = self._today()
+        for dataset_info in datasets:
+            collection_id = dataset_info["id"]
+            indexed = self._indexed.get(collection_id)
+            if indexed is None:
+                continue
+            # Les collections encore alimentées ont une date de fin glissante
+            if dataset_info.get("ongoing"):
+                range_end = today
+            else:
+                range_end = min(_parse_date(dataset_info["date_range"][1]), today)
+                # Collection close déjà indexée jusqu'à sa fin : plus rien à rafraîchir
+                if indexed[1] >= range_end:
+                    continue
+            start = max(indexed[0], indexed[1] - datetime.timedelta(days=REFRESH_LOOKBACK_DAYS))
+            if start > range_end:
+                continue
+            try:
+                self.index_range(collection_id, start.strftime('%Y-%m-%d'), range_end.strftime('%Y-%m-%d'))
+            except Exception as e:
+                logger.error(f"Erreur lors du rafraîchissement de l'index de {collection_id}: {str(e)}")
+
+    def start_background(self, datasets, interval):
+        """Lance la construction puis le rafraîchissement périodique dans un thread d'arrière-plan."""
+        if self._thread is not None:
+            return
+
+        def run():
+            self.build(datasets)
+            while not self._stop.wait(interval):
+                self.refresh(datasets)
+
+        self._thread = threading.Thread(target=run, name="availability-index", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def status(self):
+        """Renvoie l'intervalle indexé de chaque collection."""
+        return {collection_id: self.indexed_range(collection_id) for collection_id in list(self._indexed)}
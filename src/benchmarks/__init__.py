@@ -0,0 +1 @@
+# benchmarks - Mesures de latence de TerraSight contre un Earth Engine simulé
@@ -0,0 +1,97 @@
+# bench_faults.py - Injection de pannes Earth Engine : quotas, panne totale, erreurs de calcul
+#
+# Utilisation (depuis src/) : python -m benchmarks.bench_faults [--requests 40] [--clients 8] [--latency 50]
+#
+# Chaque scénario configure le faux `ee` (proportion et type d'erreurs) et
+# rapporte les codes HTTP, les résultats périmés servis, les allers-retours
+# Earth Engine et l'état de la passerelle (nouvelles tentatives, disjoncteur).
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import fake_ee
+from benchmarks.util import load_app, percentile, reset_gateway
+
+# Délais de nouvelle tentative et d'ouverture du disjoncteur raccourcis pour le benchmark
+FAST_GATEWAY = {"base_delay": 0.02, "max_delay": 0.2, "reset_timeout": 1.0}
+
+URL = "/api/get_image?dataset=NOAA/GFS0P25&variable=temperature_2m_above_ground&date=2024-03-{day:02d}"
+
+
+def run(app, requests, clients):
+    """Envoie `requests` requêtes (dates distinctes) depuis `clients` threads ; renvoie (latences, réponses)."""
+    fake_ee.reset()
+    local = threading.local()
+
+    def one(i):
+        if not hasattr(local, "client"):
+            local.client = app.app.test_client()
+        start = time.perf_counter()
+        response = local.client.get(URL.format(day=i % 28 + 1))
+        return (time.perf_counter() - start) * 1000.0, response.status_code, response.get_json()
+
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        results = list(pool.map(one, range(requests)))
+    return [r[0] for r in results], [(r[1], r[2]) for r in results]
+
+
+def report(name, app, latencies, responses):
+    ok = sum(1 for status, body in responses if status == 200 and "error" not in body)
+    stale = sum(1 for status, body in responses if body.get("stale"))
+    errors = {}
+    for status, body in responses:
+        if status != 200 or "error" in body:
+            errors[status] = errors.get(status, 0) + 1
+    attempts = sum(v for k, v in fake_ee.calls.items() if k != "faults")
+    gateway = app.ee_gateway.status()
+    print(f"{name:<28} ok={ok:3d} (dont périmés={stale:3d})  erreurs={errors}  "
+          f"appels EE={attempts:4d}  pannes={fake_ee.calls.get('faults', 0):4d}  "
+          f"p50={percentile(latencies, 50):7.1f} ms  p95={percentile(latencies, 95):7.1f} ms")
+    print(f"{'':<28} nouvelles tentatives={gateway['retried']}  refusés={gateway['rejected']}  "
+          f"disjoncteur={gateway['breaker']} (ouvert {gateway['breaker_opened']} fois)  débit={gateway['rate']}/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Comportement de la passerelle Earth Engine sous pannes injectées")
+    parser.add_argument("--requests", type=int, default=40, help="Requêtes par scénario")
+    parser.add_argument("--clients", type=int, default=8, help="Clients simultanés")
+    parser.add_argument("--latency", type=float, default=50.0, help="Latence EE moyenne simulée (ms)")
+    args = parser.parse_args()
+
+    app = load_app()
+    fake_ee.config.update(latency_ms=args.latency, jitter_ms=args.latency / 10)
+    app.ee_initializer.wait(10)
+    print(f"{args.requests} requêtes par scénario, {args.clients} clients, "
+          f"Earth Engine simulé à {args.latency:.0f} ms par appel")
+
+    scenarios = [
+        ("sans panne", 0.0, "quota"),
+        ("quotas (30 % d'erreurs)", 0.3, "quota"),
+        ("délais (30 % d'erreurs)", 0.3, "timeout"),
+        ("erreurs de calcul (100 %)", 1.0, "compute"),
+    ]
+    for name, rate, fault in scenarios:
+        app.image_cache.clear()
+        reset_gateway(app, **FAST_GATEWAY)
+        fake_ee.config.update(fault_rate=rate, fault=fault)
+        report(name, app, *run(app, args.requests, args.clients))
+
+    # Panne totale après un premier passage : les derniers résultats connus sont servis
+    app.image_cache.clear()
+    reset_gateway(app, **FAST_GATEWAY)
+    fake_ee.config.update(fault_rate=0.0)
+    run(app, args.requests, args.clients)
+    for value, _ in list(app.image_cache._entries.values()):
+        value["computed_at"] -= 12 * 3600  # Au-delà de la fraîcheur et de la fenêtre de revalidation
+    fake_ee.config.update(fault_rate=1.0, fault="unavailable")
+    report("panne totale (cache périmé)", app, *run(app, args.requests, args.clients))
+
+    # Retour du service : un appel d'essai referme le disjoncteur (périmés servis en attendant)
+    time.sleep(app.ee_gateway.breaker.reset_timeout)
+    fake_ee.config.update(fault_rate=0.0)
+    report("rétablissement", app, *run(app, args.requests, args.clients))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+# bench_image_latency.py - Latence p50/p95 de la génération d'image (avant/après suppression de size().getInfo())
+#
+# Utilisation (depuis src/) : python -m benchmarks.bench_image_latency [--requests 200] [--latency 150]
+import argparse
+import statistics
+import time
+
+from benchmarks import fake_ee
+from benchmarks.util import percentile
+
+ee = fake_ee.install()
+
+import processor  # noqa: E402  (doit être importé après l'installation du faux `ee`)
+
+DATASET_INFO = {
+    "id": "NOAA/GFS0P25",
+    "short_name": "GFS",
+    "asset_type": "ImageCollection",
+    "composite": "first",
+    "variables": [{"id": "temperature_2m_above_ground", "name": "Température à 2m (K)"}],
+    "default_region": [-180, -90, 180, 90]
+}
+VIS_PARAMS = {"min": -40.0, "max": 35.0, "palette": ['blue', 'purple', 'cyan', 'green', 'yellow', 'red']}
+VARIABLE = "temperature_2m_above_ground"
+
+
+def legacy_process(dataset_info, variable, date_str, vis_params):
+    """Ancien chemin : size().getInfo() puis getThumbURL (deux allers-retours)."""
+    start_date, end_date = processor.get_date_window(date_str)
+    collection = ee.ImageCollection(dataset_info["id"]).filterDate(start_date, end_date).select(variable)
+    if collection.size().getInfo() == 0:
+        return {"error": f"Aucune donnée disponible pour cette date: {date_str}."}
+    image = collection.first()
+    return {"image_url": image.getThumbURL(processor.get_thumb_params(dataset_info, vis_params))}
+
+
+def current_process(dataset_info, variable, date_str, vis_params):
+    """Chemin actuel du processeur."""
+    try:
+        return processor.process_dataset(dataset_info, variable, date_str, vis_params)
+    except processor.NoDataError as e:
+        return {"error": str(e)}
+
+
+def run(name, func, requests, empty_ratio):
+    """Exécute `requests` appels séquentiels et renvoie les latences (ms) et appels EE."""
+    fake_ee.reset()
+    latencies = []
+    empty_every = int(1 / empty_ratio) if empty_ratio else 0
+    for i in range(requests):
+        date_str = "2024-02-29" if empty_every and i % empty_every == 0 else "2024-03-01"
+        start = time.perf_counter()
+        func(DATASET_INFO, VARIABLE, date_str, VIS_PARAMS)
+        latencies.append((time.perf_counter() - start) * 1000.0)
+    ee_calls = sum(fake_ee.calls.values())
+    print(f"{name:<28} p50={percentile(latencies, 50):7.1f} ms  p95={percentile(latencies, 95):7.1f} ms  "
+          f"moyenne={statistics.mean(latencies):7.1f} ms  appels EE/requête={ee_calls / requests:.2f}")
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latence de génération d'image contre un Earth Engine simulé")
+    parser.add_argument("--requests", type=int, default=200, help="Nombre de requêtes par scénario")
+    parser.add_argument("--latency", type=float, default=150.0, help="Latence EE moyenne simulée (ms)")
+    parser.add_argument("--jitter", type=float, default=50.0, help="Écart-type de la latence (ms)")
+    parser.add_argument("--empty-ratio", type=float, default=0.05, help="Proportion de dates sans données")
+    args = parser.parse_args()
+
+    fake_ee.config.update(latency_ms=args.latency, jitter_ms=args.jitter, empty_dates={"2024-02-29"})
+    print(f"Earth Engine simulé : {args.latency:.0f} ± {args.jitter:.0f} ms par appel, "
+          f"{args.empty_ratio:.0%} de dates vides, {args.requests} requêtes")
+    run("avant (size + thumbnail)", legacy_process, args.requests, args.empty_ratio)
+    run("après (thumbnail seul)", current_process, args.requests, args.empty_ratio)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+# bench_startup.py - Durée de démarrage d'un worker et latence de la première requête (démarrage à froid)
+#
+# Utilisation (depuis src/) : python -m benchmarks.bench_startup [--runs 5] [--init-latency 2000] [--init-failures 0]
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from benchmarks.util import SRC_DIR, percentile
+
+# Exécuté dans un interpréteur neuf : mesure l'import de l'application, la disponibilité de
+# Earth Engine et la première requête d'image
+WORKER = """
+import json, sys, time
+start = time.perf_counter()
+from benchmarks import fake_ee
+fake_ee.config.update(latency_ms=%(latency)f, jitter_ms=0, init_latency_ms=%(init_latency)f,
+                      init_failures=%(init_failures)d)
+from benchmarks.util import load_app
+app = load_app()
+booted = time.perf_counter()
+client = app.app.test_client()
+response = client.get('/readyz')
+probe = time.perf_counter()
+response = client.get('/api/get_image?dataset=NOAA/GFS0P25&variable=temperature_2m_above_ground&date=2024-03-01')
+first = time.perf_counter()
+app.ee_initializer.wait()
+ready = app.ee_initializer.ready_at - app.ee_initializer.started_at
+print(json.dumps({"boot_ms": (booted - start) * 1000, "probe_ms": (probe - booted) * 1000,
+                  "first_request_ms": (first - probe) * 1000, "first_status": response.status_code,
+                  "ready_ms": ready * 1000, "attempts": app.ee_initializer.attempts}))
+"""
+
+
+def run_worker(args):
+    code = WORKER % {"latency": args.latency, "init_latency": args.init_latency, "init_failures": args.init_failures}
+    env = dict(os.environ, TERRASIGHT_EE_READY_TIMEOUT=str(args.ready_timeout))
+    output = subprocess.run([sys.executable, "-c", code], cwd=SRC_DIR, env=env, capture_output=True,
+                            text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Démarrage à froid d'un worker TerraSight")
+    parser.add_argument("--runs", type=int, default=5, help="Nombre de démarrages mesurés")
+    parser.add_argument("--latency", type=float, default=150.0, help="Latence EE simulée par appel (ms)")
+    parser.add_argument("--init-latency", type=float, default=2000.0, help="Durée simulée de ee.Initialize (ms)")
+    parser.add_argument("--init-failures", type=int, default=0, help="Échecs d'initialisation avant succès")
+    parser.add_argument("--ready-timeout", type=float, default=10.0, help="Attente maximale par requête (s)")
+    args = parser.parse_args()
+
+    print(f"{args.runs} démarrages, ee.Initialize simulé à {args.init_latency:.0f} ms, "
+          f"{args.init_failures} échec(s) initial(aux)")
+    results = [run_worker(args) for _ in range(args.runs)]
+
+    for name, label in (("boot_ms", "démarrage du worker"), ("probe_ms", "sonde /readyz"),
+                        ("first_request_ms", "première requête"), ("ready_ms", "Earth Engine prêt")):
+        values = [r[name] for r in results]
+        print(f"{label:<22} p50={percentile(values, 50):8.1f} ms  max={max(values):8.1f} ms")
+    print(f"codes de la première requête: {sorted(set(r['first_status'] for r in results))}, "
+          f"tentatives: {sorted(set(r['attempts'] for r in results))}")
+    # Avant : l'initialisation synchrone à l'import s'ajoutait au démarrage de chaque worker
+    blocking = [r["boot_ms"] + r["ready_ms"] for r in results]
+    print(f"{'démarrage bloquant':<22} p50={percentile(blocking, 50):8.1f} ms  (import + initialisation)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,295 @@
+# bench_suite.py - Charges scriptées contre l'application Flask et un Earth Engine simulé, résultats en JSON
+#
+# Utilisation (depuis src/) :
+#   python -m benchmarks.bench_suite [--workloads cold,warm,...] [--requests 200] [--concurrency 16]
+#                                    [--latency 150] [--distribution lognormal] [--fault-rate 0.05]
+#                                    [--output resultats.json] [--compare reference.json]
+#
+# Charges : cold (cache vide), warm (cache rempli), bursty (rafales de requêtes identiques),
+# many_dataset (tous les datasets et variables), static_image_cold et static_image_warm
+# (pages /static_image). Pour chacune : débit, latences p50/p95/p99 et appels Earth Engine par
+# requête. --output écrit les résultats en JSON ; --compare signale les régressions par rapport
+# à un fichier de référence (code de sortie 1), mesuré dans les mêmes conditions (simulation,
+# requêtes, concurrence, débit EE, graine) : sinon la comparaison est refusée (code de sortie 2).
+import argparse
+import datetime
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from benchmarks import fake_ee
+from benchmarks.util import SRC_DIR, load_app, percentile, reset_gateway
+
+GFS = ("NOAA/GFS0P25", "temperature_2m_above_ground")
+BURST_PAUSE = 0.05  # Pause entre deux rafales (secondes)
+
+# Indicateurs comparés à la référence : (nom, sens) ; +1 = plus grand est pire
+COMPARED_METRICS = (("p50_ms", 1), ("p95_ms", 1), ("p99_ms", 1), ("ee_calls_per_request", 1),
+                    ("throughput_rps", -1))
+MIN_LATENCY_DELTA_MS = 2.0  # Écart de latence ignoré (bruit de mesure sur des réponses servies du cache)
+# Conditions de mesure qui doivent être identiques à celles de la référence pour comparer les résultats
+COMPARED_META = ("requests", "concurrency", "ee_max_qps", "seed", "simulation")
+
+
+def image_url(dataset_id, variable, date_str=None):
+    params = {"dataset": dataset_id, "variable": variable}
+    if date_str:
+        params["date"] = date_str
+    return "/api/get_image?" + urlencode(params)
+
+
+def static_image_url(dataset_id, variable, date_str=None):
+    return "/static_image?" + image_url(dataset_id, variable, date_str).split("?", 1)[1]
+
+
+def distinct_dates(n, start="2024-01-01"):
+    """n dates consécutives : autant de clés de cache distinctes."""
+    first = datetime.date.fromisoformat(start)
+    return [(first + datetime.timedelta(days=i)).isoformat() for i in range(n)]
+
+
+def all_variables(app):
+    """(dataset, variable, date par défaut) de chaque variable de chaque dataset du catalogue."""
+    return [(dataset["id"], variable["id"], dataset["default_date"])
+            for category in app.DATASETS.values() for dataset in category for variable in dataset["variables"]]
+
+
+def run_requests(app, urls, concurrency):
+    """Exécute les requêtes avec `concurrency` clients ; renvoie [(latence ms, succès)]."""
+    local = threading.local()
+
+    def one(url):
+        if not hasattr(local, "client"):
+            local.client = app.app.test_client()
+        start = time.perf_counter()
+        response = local.client.get(url)
+        latency = (time.perf_counter() - start) * 1000.0
+        ok = response.status_code == 200
+        if ok and response.is_json:
+            ok = "error" not in response.get_json()
+        return latency, ok
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(one, urls))
+
+
+def run_bursts(app, bursts):
+    """Chaque rafale : toutes ses requêtes lancées au même instant, puis une courte pause."""
+    samples = []
+    for urls in bursts:
+        samples.extend(run_requests(app, urls, len(urls)))
+        time.sleep(BURST_PAUSE)
+    return samples
+
+
+# --- Charges ----------------------------------------------------------------
+# Chaque charge renvoie (requêtes d'amorçage, fonction de mesure) ; l'amorçage n'est pas mesuré.
+
+def workload_cold(app, args):
+    urls = [image_url(*GFS, date) for date in distinct_dates(args.requests)]
+    return [], lambda: run_requests(app, urls, args.concurrency)
+
+
+def workload_warm(app, args):
+    keys = distinct_dates(max(1, args.requests // 10))
+    urls = [image_url(*GFS, keys[i % len(keys)]) for i in range(args.requests)]
+    return [image_url(*GFS, date) for date in keys], lambda: run_requests(app, urls, args.concurrency)
+
+
+def workload_bursty(app, args):
+    burst_size = max(2, args.concurrency)
+    dates = distinct_dates(max(1, args.requests // burst_size), start="2023-01-01")
+    bursts = [[image_url(*GFS, date)] * burst_size for date in dates]
+    return [], lambda: run_bursts(app, bursts)
+
+
+def workload_many_dataset(app, args):
+    variables = all_variables(app)
+    urls = [image_url(*variables[i % len(variables)]) for i in range(args.requests)]
+    return [], lambda: run_requests(app, urls, args.concurrency)
+
+
+def workload_static_image_cold(app, args):
+    urls = [static_image_url(*GFS, date) for date in distinct_dates(args.requests, start="2022-01-01")]
+    return [], lambda: run_requests(app, urls, args.concurrency)
+
+
+def workload_static_image_warm(app, args):
+    variables = all_variables(app)
+    urls = [static_image_url(*variables[i % len(variables)]) for i in range(args.requests)]
+    return [static_image_url(*v) for v in variables], lambda: run_requests(app, urls, args.concurrency)
+
+
+WORKLOADS = {
+    "cold": workload_cold,
+    "warm": workload_warm,
+    "bursty": workload_bursty,
+    "many_dataset": workload_many_dataset,
+    "static_image_cold": workload_static_image_cold,
+    "static_image_warm": workload_static_image_warm,
+}
+
+
+def run_workload(app, name, args):
+    """Vide les caches, amorce la charge, puis mesure ; renvoie les indicateurs de la charge."""
+    app.image_cache.clear()
+    app.page_cache.clear()
+    reset_gateway(app, rate=args.ee_max_qps, burst=max(app.EE_BURST, int(args.ee_max_qps)))
+    prime, measure = WORKLOADS[name](app, args)
+    if prime:
+        run_requests(app, prime, args.concurrency)
+
+    fake_ee.reset()
+    start = time.perf_counter()
+    samples = measure()
+    duration = time.perf_counter() - start
+    latencies = [latency for latency, _ in samples]
+    ee_calls = sum(count for kind, count in fake_ee.calls.items() if kind != "faults")
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for _, ok in samples if not ok),
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(len(samples) / duration, 2),
+        "mean_ms": round(statistics.mean(latencies), 2),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "max_ms": round(max(latencies), 2),
+        "ee_calls": ee_calls,
+        "ee_calls_per_request": round(ee_calls / len(samples), 3)
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SRC_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def meta_mismatches(meta, baseline):
+    """Liste les conditions de mesure (COMPARED_META) qui diffèrent de celles de la référence."""
+    reference = baseline.get("meta", {})
+    return [f"{key}: {reference.get(key)} -> {meta.get(key)}"
+            for key in COMPARED_META if reference.get(key) != meta.get(key)]
+
+
+def compare(results, baseline, tolerance):
+    """Liste les régressions (indicateur dégradé de plus de tolerance, en proportion) par rapport à la référence."""
+    regressions = []
+    for name, current in results.items():
+        reference = baseline.get("results", {}).get(name)
+        if reference is None:
+            continue
+        for metric, direction in COMPARED_METRICS:
+            before, after = reference.get(metric), current.get(metric)
+            if before is None or after is None:
+                continue
+            delta = (after - before) * direction
+            if metric.endswith("_ms") and delta < MIN_LATENCY_DELTA_MS:
+                continue
+            if delta > 0 and delta > tolerance * abs(before):
+                regressions.append(f"{name}.{metric}: {before} -> {after}")
+    return regressions
+
+
+def print_table(results):
+    print(f"{'charge':<20}{'req':>6}{'err':>5}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'EE/req':>8}")
+    for name, r in results.items():
+        print(f"{name:<20}{r['requests']:>6}{r['errors']:>5}{r['throughput_rps']:>9.1f}"
+              f"{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}{r['ee_calls_per_request']:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Charges scriptées contre TerraSight et un Earth Engine simulé")
+    parser.add_argument("--workloads", default=",".join(WORKLOADS), help="Charges à exécuter, séparées par des virgules")
+    parser.add_argument("--requests", type=int, default=200, help="Requêtes mesurées par charge")
+    parser.add_argument("--concurrency", type=int, default=16, help="Clients simultanés")
+    parser.add_argument("--latency", type=float, default=150.0, help="Latence EE moyenne simulée (ms)")
+    parser.add_argument("--jitter", type=float, default=None, help="Écart-type de la latence (ms, défaut : latence / 3)")
+    parser.add_argument("--distribution", default="normal", choices=("normal", "lognormal", "exponential", "fixed"),
+                        help="Loi de la latence simulée")
+    parser.add_argument("--fault-rate", type=float, default=0.0, help="Proportion d'appels EE en erreur")
+    parser.add_argument("--fault", default="quota", choices=sorted(fake_ee.FAULTS), help="Type d'erreur injectée")
+    parser.add_argument("--images-per-day", type=int, default=4, help="Taille des collections filtrées sur un jour")
+    parser.add_argument("--ee-max-qps", type=float, default=1000.0,
+                        help="Débit EE autorisé par la passerelle (élevé par défaut : mesure de l'application seule)")
+    parser.add_argument("--seed", type=int, default=0, help="Graine de la simulation (latences, pannes)")
+    parser.add_argument("--output", help="Fichier JSON des résultats")
+    parser.add_argument("--compare", help="Fichier JSON de référence (régressions : code de sortie 1)")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Dégradation tolérée par rapport à la référence")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.workloads.split(",") if name.strip()]
+    unknown = [name for name in names if name not in WORKLOADS]
+    if unknown:
+        parser.error(f"charges inconnues: {', '.join(unknown)} (disponibles: {', '.join(WORKLOADS)})")
+
+    simulation = {
+        "latency_ms": args.latency,
+        "jitter_ms": args.latency / 3 if args.jitter is None else args.jitter,
+        "distribution": args.distribution,
+        "fault_rate": args.fault_rate,
+        "fault": args.fault,
+        "images_per_day": args.images_per_day
+    }
+    meta = {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "ee_max_qps": args.ee_max_qps,
+        "seed": args.seed,
+        "simulation": simulation
+    }
+
+    # Référence mesurée dans d'autres conditions : refusée avant d'exécuter les charges
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        mismatches = meta_mismatches(meta, baseline)
+        if mismatches:
+            print(f"Comparaison impossible : conditions de mesure différentes de {args.compare}:")
+            for mismatch in mismatches:
+                print(f"  {mismatch}")
+            sys.exit(2)
+
+    random.seed(args.seed)
+    app = load_app()
+    app.ee_initializer.wait(10)
+    fake_ee.config.update(simulation)
+
+    results = {}
+    for name in names:
+        results[name] = run_workload(app, name, args)
+    print_table(results)
+
+    report = {
+        "meta": dict(meta, timestamp=datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+                     revision=git_revision(), python=platform.python_version()),
+        "results": results
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"Résultats écrits dans {args.output}")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"Régressions (> {args.tolerance:.0%}) par rapport à {args.compare}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"Aucune régression (> {args.tolerance:.0%}) par rapport à {args.compare}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+# bench_thundering_herd.py - Afflux simultané de requêtes identiques sur /api/get_image
+#
+# Utilisation (depuis src/) : python -m benchmarks.bench_thundering_herd [--clients 50] [--latency 300]
+import argparse
+import threading
+import time
+
+from benchmarks import fake_ee
+from benchmarks.util import load_app, percentile
+
+URL = "/api/get_image?dataset=NOAA/GFS0P25&variable=temperature_2m_above_ground&date=2024-03-01"
+
+
+def herd(app, clients):
+    """Lance `clients` requêtes identiques au même instant ; renvoie latences (ms) et codes HTTP."""
+    app.image_cache.clear()
+    fake_ee.reset()
+    barrier = threading.Barrier(clients)
+    latencies = [0.0] * clients
+    statuses = [None] * clients
+
+    def client(i):
+        test_client = app.app.test_client()
+        barrier.wait()
+        start = time.perf_counter()
+        response = test_client.get(URL)
+        latencies[i] = (time.perf_counter() - start) * 1000.0
+        statuses[i] = response.status_code
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, statuses
+
+
+def report(name, latencies, statuses):
+    ee_calls = sum(fake_ee.calls.values())
+    print(f"{name:<22} appels EE={ee_calls:4d}  p50={percentile(latencies, 50):7.1f} ms  "
+          f"p95={percentile(latencies, 95):7.1f} ms  max={max(latencies):7.1f} ms  "
+          f"erreurs={sum(1 for s in statuses if s != 200)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Afflux de requêtes identiques contre un Earth Engine lent")
+    parser.add_argument("--clients", type=int, default=50, help="Nombre de clients simultanés")
+    parser.add_argument("--latency", type=float, default=300.0, help="Latence EE moyenne simulée (ms)")
+    args = parser.parse_args()
+
+    app = load_app()
+    fake_ee.config.update(latency_ms=args.latency, jitter_ms=args.latency / 10)
+    print(f"{args.clients} clients simultanés, Earth Engine simulé à {args.latency:.0f} ms par appel")
+
+    # Sans regroupement : chaque requête fait son propre calcul
+    flight_do = app.image_flight.do
+    app.image_flight.do = lambda key, fn: fn()
+    report("sans single-flight", *herd(app, args.clients))
+
+    app.image_flight.do = flight_do
+    report("avec single-flight", *herd(app, args.clients))
+    print(f"single-flight: {app.image_flight.stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+# check_animation.py - Vérifie /api/get_animation contre le faux `ee` (images par jour, réduction, cache)
+#
+# Utilisation (depuis src/) : python -m benchmarks.check_animation
+#
+# Datasets quotidien (DAYMET) et infra-quotidien (GFS, une image composée par
+# jour à partir des seules analyses) : nombre d'images de l'animation, filtre
+# de série, jours sans données écartés, mise en cache, intervalle trop long,
+# animation trop volumineuse (nouvel essai à dimensions réduites) et
+# intervalle sans aucune donnée.
+from urllib.parse import urlencode
+
+from benchmarks import fake_ee
+from benchmarks.util import check, load_app
+
+EMPTY_DAY = "2024-01-03"
+
+
+def animation(client, dataset, variable, start, end, **params):
+    query = urlencode(dict(dataset=dataset, variable=variable, start=start, end=end, **params))
+    response = client.get(f"/api/get_animation?{query}")
+    return response.status_code, response.get_json()
+
+
+def main():
+    app = load_app()
+    app.ee_initializer.wait(10)
+    fake_ee.config.update(latency_ms=1.0, jitter_ms=0.0, empty_dates={EMPTY_DAY})
+    client = app.app.test_client()
+
+    for dataset, variable in (("NASA/ORNL/DAYMET_V4", "tmax"), ("NOAA/GFS0P25", "temperature_2m_above_ground")):
+        fake_ee.reset()
+        status, body = animation(client, dataset, variable, "2024-01-01", "2024-01-10")
+        check(f"{dataset} : animation créée", status == 200 and "animation_url" in body, body)
+        check(f"{dataset} : 10 jours demandés", body.get("days") == 10)
+        check(f"{dataset} : 9 images (jour sans données écarté)", fake_ee.videos[-1]["frames"] == 9,
+              fake_ee.videos)
+        expected = [("eq", "forecast_hours", 0)] if dataset == "NOAA/GFS0P25" else []
+        check(f"{dataset} : filtre de série sur chaque image", all(
+            list(filters) == expected for filters in fake_ee.videos[-1]["filters"]), fake_ee.videos[-1]["filters"])
+        check(f"{dataset} : un seul appel Earth Engine", fake_ee.calls.get("getVideoThumbURL") == 1
+              and fake_ee.calls.get("getInfo", 0) == 0, fake_ee.calls)
+
+        fake_ee.reset()
+        status, cached = animation(client, dataset, variable, "2024-01-01", "2024-01-10")
+        check(f"{dataset} : servie du cache", cached.get("animation_url") == body["animation_url"]
+              and not fake_ee.calls.get("getVideoThumbURL"))
+
+    status, body = animation(client, "NASA/ORNL/DAYMET_V4", "tmax", "2024-01-01", "2024-06-01")
+    check("intervalle trop long : 400", status == 400, status)
+    status, body = animation(client, "USGS/GTOPO30", "elevation", "2024-01-01", "2024-01-10")
+    check("dataset statique : 400", status == 400, status)
+
+    # Trop volumineuse en 1200 pixels (9 images), acceptée en 600
+    fake_ee.reset()
+    fake_ee.config["video_max_pixels"] = 9 * 600 * 600
+    status, body = animation(client, "NASA/ORNL/DAYMET_V4", "prcp", "2024-01-01", "2024-01-10", dimensions=1200)
+    check("trop volumineuse : réduite à 600 pixels", status == 200 and body.get("dimensions") == 600, body)
+    check("deux essais, sans vérification de taille", fake_ee.calls.get("getVideoThumbURL") == 2
+          and fake_ee.calls.get("getInfo", 0) == 0, fake_ee.calls)
+
+    # Trop volumineuse même à la taille minimale : erreur, après vérification que la collection n'est pas vide
+    fake_ee.reset()
+    fake_ee.config["video_max_pixels"] = 1000
+    status, body = animation(client, "NASA/ORNL/DAYMET_V4", "srad", "2024-01-01", "2024-01-10", dimensions=256)
+    check("trop volumineuse à 64 pixels : erreur", status == 500 and "error" in body, status)
+    check("essais 256, 128, 64 puis taille vérifiée", fake_ee.calls.get("getVideoThumbURL") == 3
+          and fake_ee.calls.get("getInfo") == 1, fake_ee.calls)
+    fake_ee.config["video_max_pixels"] = 26214400
+
+    # Aucun jour avec des données
+    fake_ee.config["empty_dates"] = {"2024-02-01", "2024-02-02"}
+    for dataset, variable in (("NASA/ORNL/DAYMET_V4", "tmax"), ("NOAA/GFS0P25", "temperature_2m_above_ground")):
+        status, body = animation(client, dataset, variable, "2024-02-01", "2024-02-02")
+        check(f"{dataset} : intervalle sans données signalé", "Aucune donnée" in body.get("error", ""), body)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+# check_batch.py - Vérifie /api/get_images (lot NDJSON) contre le faux `ee`
+#
+# Utilisation (depuis src/) : python -m benchmarks.check_batch
+#
+# Une ligne par requête du lot ; les paramètres d'URL servent de valeurs par
+# défaut ; un champ null est ignoré (valeur par défaut) plutôt que transmis
+# sous la forme de la chaîne "None".
+import json
+
+from benchmarks import fake_ee
+from benchmarks.util import check, load_app
+
+
+def batch(client, requests_list, **params):
+    query = "&".join(f"{k}={v}" for k, v in params.items())
+    response = client.post(f"/api/get_images?{query}", json={"requests": requests_list})
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines() if line]
+    return response.status_code, sorted(lines, key=lambda line: line["index"])
+
+
+def main():
+    app = load_app()
+    app.ee_initializer.wait(10)
+    fake_ee.config.update(latency_ms=1.0, jitter_ms=0.0)
+    client = app.app.test_client()
+
+    status, lines = batch(client, [
+        {"variable": "tmax", "date": "2024-01-10"},
+        {"dataset": None, "variable": "tmin", "date": "2024-01-10", "reducer": None, "window": None},
+        {"dataset": "NOAA/GFS0P25", "variable": "temperature_2m_above_ground", "date": None},
+    ], dataset="NASA/ORNL/DAYMET_V4")
+    check("lot : 200, une ligne par requête", status == 200 and [line["index"] for line in lines] == [0, 1, 2],
+          lines)
+    check("valeur par défaut de l'URL", lines[0]["status"] == 200 and "image_url" in lines[0]["result"], lines[0])
+    check("champs null : valeurs par défaut", lines[1]["status"] == 200 and "image_url" in lines[1]["result"],
+          lines[1])
+    check("date null : date par défaut du dataset",
+          lines[2]["status"] == 200 and "image_url" in lines[2]["result"], lines[2])
+
+
+if __name__ == '__main__':
+    main()
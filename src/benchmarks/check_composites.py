@@ -0,0 +1,45 @@
+# check_composites.py - Vérifie les composites temporels de /api/get_image contre le faux `ee`
+#
+# Utilisation (depuis src/) : python -m benchmarks.check_composites
+#
+# GFS publie ≈200 échéances par cycle, toutes datées de l'heure du cycle : une
+# moyenne (ou tout autre réducteur) sur la fenêtre ne doit porter que sur les
+# analyses (forecast_hours=0), comme les séries de /api/stats. Les datasets
+# sans filtre de série (DAYMET) composent toutes les images de la fenêtre.
+from urllib.parse import urlencode
+
+from benchmarks import fake_ee
+from benchmarks.util import check, load_app
+
+ANALYSIS_FILTER = ("eq", "forecast_hours", 0)
+
+
+def image(client, dataset, variable, date, **params):
+    query = urlencode(dict(dataset=dataset, variable=variable, date=date, **params))
+    response = client.get(f"/api/get_image?{query}")
+    return response.status_code, response.get_json()
+
+
+def main():
+    app = load_app()
+    app.ee_initializer.wait(10)
+    fake_ee.config.update(latency_ms=1.0, jitter_ms=0.0, images_per_day=4 * 209)
+    client = app.app.test_client()
+
+    for reducer, window in ((None, "day"), ("mean", "day"), ("max", "week"), ("median", "month")):
+        params = {"window": window, **({"reducer": reducer} if reducer else {})}
+        fake_ee.reset()
+        status, body = image(client, "NOAA/GFS0P25", "temperature_2m_above_ground", "2024-01-10", **params)
+        check(f"GFS {reducer or 'first'}/{window} : 200", status == 200 and "image_url" in body, body)
+        check(f"GFS {reducer or 'first'}/{window} : analyses seules",
+              fake_ee.thumbs and ANALYSIS_FILTER in fake_ee.thumbs[-1]["filters"], fake_ee.thumbs)
+
+    fake_ee.reset()
+    status, body = image(client, "NASA/ORNL/DAYMET_V4", "tmax", "2024-01-10", reducer="mean", window="week")
+    check("DAYMET mean/week : 200", status == 200 and "image_url" in body, body)
+    check("DAYMET mean/week : aucun filtre de série", fake_ee.thumbs and not fake_ee.thumbs[-1]["filters"],
+          fake_ee.thumbs)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+# check_export.py - Vérifie les exports en blocs : nouvelles tentatives, reprise, COG à partir du raster stocké
+#
+# Utilisation (depuis src/) : python -m benchmarks.check_export
+#
+# Les URL getDownloadURL du faux `ee` pointent vers un serveur HTTP local qui
+# sert des blocs NPY déterministes et peut échouer sur des blocs choisis :
+# erreurs transitoires (export terminé grâce aux nouvelles tentatives), erreur
+# persistante (export échoué, blocs terminés conservés) puis reprise (seuls les
+# blocs manquants sont téléchargés), et COG demandé après coup (aucun
+# téléchargement). Sans rasterio, l'écriture du COG est remplacée par un
+# enregistreur : seul le chemin sans nouveau téléchargement est vérifié.
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from benchmarks import fake_ee
+from benchmarks.util import check, load_app
+
+REGION = "0,0,2,1"  # 223 x 112 pixels à 1 km, soit 8 blocs de 64 pixels
+SCALE = 1000
+CHUNK_SIZE = 64
+
+downloads = []  # (ligne, colonne) du coin haut-gauche de chaque bloc demandé, relatives à l'export
+failures = {}  # (ligne, colonne) -> nombre d'échecs restants (None : toujours)
+lock = threading.Lock()
+
+
+def chunk_origin(query):
+    """Coin haut-gauche du bloc demandé, en pixels depuis le coin haut-gauche de la région exportée."""
+    params = parse_qs(query)
+    pixel, _, west, _, _, north = (float(v) for v in params["crs_transform"][0].strip("[]").split(","))
+    region = [float(v) for v in REGION.split(",")]
+    return int(round((region[3] - north) / pixel)), int(round((west - region[0]) / pixel))
+
+
+class StubDownloadServer(BaseHTTPRequestHandler):
+    def do_GET(self):
+        query = urlparse(self.path).query
+        origin = chunk_origin(query)
+        with lock:
+            downloads.append(origin)
+            remaining = failures.get(origin, 0)
+            if remaining:
+                failures[origin] = None if remaining is None else remaining - 1
+        if remaining or (remaining is None and origin in failures):
+            self.send_error(503)
+            return
+        body = fake_ee.download_npy(query)
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def submit(client, fmt="npy"):
+    response = client.post("/api/exports", json={"dataset": "USGS/GTOPO30", "variable": "elevation",
+                                                 "bbox": REGION, "scale": SCALE, "format": fmt})
+    return response.status_code, response.get_json()
+
+
+def wait_done(client, export_id, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        meta = client.get(f"/api/exports/{export_id}").get_json()
+        if meta["status"] != "running":
+            return meta
+        time.sleep(0.02)
+    raise SystemExit(f"Export {export_id} non terminé après {timeout} s")
+
+
+def matches_grid(app, export_id, meta):
+    """Compare le raster stocké aux valeurs simulées de chaque pixel."""
+    array = app.raster_store.open_array(export_id)
+    row0 = int(round(-meta["region"][3] / meta["pixel_size"]))
+    col0 = int(round(meta["region"][0] / meta["pixel_size"]))
+    return all(array[i, j] == fake_ee.pixel_value(row0 + i, col0 + j)
+               for i in range(meta["height"]) for j in range(meta["width"]))
+
+
+def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubDownloadServer)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    os.environ['TERRASIGHT_EXPORT_DIR'] = tempfile.mkdtemp(prefix="exports-")
+    app = load_app()
+    import export  # Après l'installation du faux `ee`
+    app.ee_initializer.wait(10)
+    fake_ee.config.update(latency_ms=1.0, jitter_ms=0.0, download_server=f"http://127.0.0.1:{server.server_port}")
+    app.raster_exporter.chunk_size = CHUNK_SIZE
+    app.raster_exporter.retry_delay = 0.01
+    client = app.app.test_client()
+
+    # Erreurs transitoires : 2 échecs sur un bloc, 1 sur un autre ; l'export se termine
+    failures.update({(0, 0): 2, (CHUNK_SIZE, 3 * CHUNK_SIZE): 1})
+    status, meta = submit(client)
+    check("export lancé : 202", status == 202, meta)
+    export_id = meta["id"]
+    meta = wait_done(client, export_id)
+    check("erreurs transitoires : export terminé", meta["status"] == "complete", meta)
+    check("8 blocs, 3 nouvelles tentatives", meta["chunks_total"] == 8 and len(downloads) == 11,
+          f"{len(downloads)} téléchargements")
+    check("valeurs de tous les pixels", matches_grid(app, export_id, meta))
+
+    # Erreur persistante sur un bloc : export échoué, les 7 autres blocs sont conservés
+    app.raster_store.delete(export_id)
+    downloads.clear()
+    failing = (CHUNK_SIZE, 2 * CHUNK_SIZE)
+    failures.clear()
+    failures[failing] = None
+    status, meta = submit(client)
+    meta = wait_done(client, meta["id"])
+    check("erreur persistante : export échoué", meta["status"] == "failed" and "error" in meta, meta["status"])
+    check("bloc en échec tenté 1 + 3 fois", downloads.count(failing) == 1 + export.CHUNK_RETRIES,
+          downloads.count(failing))
+    check("7 blocs conservés", len(meta["chunks_completed"]) == 7 and meta["chunks_done"] == 7,
+          meta["chunks_completed"])
+
+    # Reprise : seul le bloc manquant est téléchargé
+    failures.clear()
+    downloads.clear()
+    status, meta = submit(client)
+    check("reprise lancée : 202", status == 202, meta)
+    meta = wait_done(client, meta["id"])
+    check("reprise : export terminé", meta["status"] == "complete", meta)
+    check("reprise : un seul bloc téléchargé", downloads == [failing], downloads)
+    check("reprise : valeurs de tous les pixels", matches_grid(app, export_id, meta))
+
+    # Export terminé redemandé : aucun téléchargement
+    downloads.clear()
+    status, meta = submit(client)
+    check("export terminé : 200 sans téléchargement", status == 200 and not downloads, status)
+
+    # COG demandé après coup : écrit à partir du raster stocké
+    written = []
+    if export.rasterio is None:
+        status, meta = submit(client, fmt="cog")
+        check("COG sans rasterio : 501", status == 501, status)
+        print("       rasterio absent : écriture du COG remplacée par un enregistreur")
+        export.rasterio = object()
+        export.write_cog = lambda path, array, meta: written.append((path, array.shape))
+    status, meta = submit(client, fmt="cog")
+    check("COG lancé : 202", status == 202, meta)
+    meta = wait_done(client, meta["id"])
+    check("COG : export terminé", meta["status"] == "complete" and meta["formats"] == ["npy", "cog"], meta)
+    check("COG : aucun bloc retéléchargé", not downloads, downloads)
+    if written:
+        check("COG : écrit depuis le raster stocké", written == [(app.raster_store.path(export_id, "cog"),
+                                                                   (meta["height"], meta["width"]))], written)
+
+    server.shutdown()
+    server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+# check_redis_cache.py - Vérifie le backend RedisCache contre un serveur Redis simulé en mémoire
+#
+# Utilisation (depuis src/) : python -m benchmarks.check_redis_cache
+#
+# Lecture/écriture, expiration (TTL), éviction par le serveur (allkeys-lru),
+# suppression, vidage, et coût de stats() : aucun parcours de l'espace de clés.
+from benchmarks.util import Clock, check  # Ajoute aussi src/ au chemin d'import
+from benchmarks.fake_redis import FakeRedis
+from cache import RedisCache
+
+
+def main():
+    clock = Clock()
+    server = FakeRedis(clock=clock)
+    cache = RedisCache("redis://fake", client=server, default_ttl=60, clock=clock)
+
+    # Lecture / écriture
+    check("clé absente : None", cache.get("image:a") is None)
+    cache.set("image:a", {"url": "https://example/a"})
+    check("valeur relue (JSON)", cache.get("image:a") == {"url": "https://example/a"})
+    check("clé préfixée sur le serveur", server.get("terrasight:image:a") is not None)
+    stats = cache.stats()
+    check("compteurs succès/échecs", (stats["hits"], stats["misses"]) == (1, 1))
+    check("une entrée", stats["entries"] == 1)
+
+    # Expiration
+    cache.set("image:court", 1, ttl=10)
+    cache.set("image:permanent", 2, ttl=None)
+    check("trois entrées", len(cache) == 3)
+    clock.now += 30
+    check("TTL 10 s expiré après 30 s", cache.get("image:court") is None)
+    check("TTL par défaut (60 s) encore valide", cache.get("image:a") is not None)
+    check("entrées expirées décomptées", len(cache) == 2)
+    clock.now += 3600
+    check("TTL None : jamais expirée", cache.get("image:permanent") == 2)
+    check("seule l'entrée permanente reste", len(cache) == 1)
+    cache.set("image:fraction", 3, ttl=0.2)
+    check("TTL < 1 s arrondi à 1 s", cache.get("image:fraction") == 3)
+
+    # Suppression et vidage
+    cache.delete("image:fraction")
+    check("clé supprimée", cache.get("image:fraction") is None and len(cache) == 1)
+    other = RedisCache("redis://fake", prefix="autre:", client=server, clock=clock)
+    other.set("image:a", "x")
+    cache.clear()
+    check("vidage : cache vide", len(cache) == 0 and cache.get("image:permanent") is None)
+    check("vidage limité au préfixe", other.get("image:a") == "x")
+
+    # Éviction par le serveur (maxmemory allkeys-lru)
+    server = FakeRedis(max_keys=4, clock=clock)
+    cache = RedisCache("redis://fake", client=server, clock=clock)
+    for i in range(3):
+        cache.set(f"image:{i}", i)
+    cache.get("image:0")  # image:0 devient la plus récemment utilisée
+    cache.set("image:3", 3)
+    check("éviction LRU par le serveur", cache.get("image:1") is None)
+    check("entrée récemment lue conservée", cache.get("image:0") == 0)
+    check("nombre d'entrées approché après éviction (jusqu'à expiration)", len(cache) == 4)
+
+    # stats() ne parcourt pas l'espace de clés
+    server = FakeRedis(clock=clock)
+    cache = RedisCache("redis://fake", client=server, clock=clock)
+    for i in range(1000):
+        cache.set(f"image:{i}", i)
+    server.commands.clear()
+    for _ in range(10):
+        cache.stats()
+    check("stats() sans SCAN", "scan" not in server.commands)
+    check("stats() : 2 commandes par appel", sum(server.commands.values()) == 20)
+    check("1000 entrées", cache.stats()["entries"] == 1000)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+# check_stats.py - Vérifie /api/stats contre les tables getRegion simulées du faux `ee`
+#
+# Utilisation (depuis src/) : python -m benchmarks.check_stats
+#
+# Les valeurs attendues sont recalculées ici, en Python pur, à partir des
+# tables simulées (fake_ee._region_table) : série d'un point et d'une emprise
+# (moyenne des pixels valides), résumé, anomalies par rapport à la moyenne de
+# la série ou à la climatologie, échelle choisie d'après la taille de la
+# collection, filtre d'analyse GFS, intervalle sans données et géométries
+# GeoJSON mal formées (400 sans appel Earth Engine).
+import datetime
+import json
+import statistics
+from urllib.parse import urlencode
+
+from benchmarks import fake_ee
+from benchmarks.util import check, load_app
+
+EMPTY_DAY = "2024-01-03"
+START, END = "2024-01-01", "2024-01-10"
+CLIMATOLOGY_MEAN = 12.5  # Valeur renvoyée par reduceRegion simulé
+TOLERANCE = 1e-9
+
+
+def close(a, b):
+    if a is None or b is None:
+        return a is None and b is None
+    return abs(a - b) <= TOLERANCE * max(1.0, abs(b))
+
+
+def all_close(a, b):
+    return len(a) == len(b) and all(close(x, y) for x, y in zip(a, b))
+
+
+def expected_series(band, start, end, baseline=None):
+    """Série attendue d'après la table simulée : temps, moyenne des pixels valides, pixels, anomalies, z-scores."""
+    epoch = datetime.datetime(1970, 1, 1)
+    days = [day for day in fake_ee._days(start, end) if day not in fake_ee.config["empty_dates"]]
+    times = [int((datetime.datetime.strptime(day, '%Y-%m-%d') - epoch).total_seconds() * 1000) for day in days]
+    table = fake_ee._region_table(band, times)
+
+    by_time = {}
+    for row in table[1:]:
+        by_time.setdefault(row[3], []).append(row[4])
+    values, pixels = [], []
+    for time_ms in times:
+        valid = [v for v in by_time[time_ms] if v is not None]
+        values.append(sum(valid) / len(valid) if valid else None)
+        pixels.append(len(valid))
+
+    valid = [v for v in values if v is not None]
+    mean = statistics.fmean(valid)
+    std = statistics.pstdev(valid)
+    baseline = mean if baseline is None else baseline
+    anomalies = [None if v is None else v - baseline for v in values]
+    return {
+        "time": [f"{day}T00:00:00Z" for day in days],
+        "value": values,
+        "pixels": pixels,
+        "anomaly": anomalies,
+        "zscore": [None if a is None else a / std for a in anomalies],
+        "summary": {"count": len(valid), "mean": mean, "std": std, "min": min(valid), "max": max(valid)}
+    }
+
+
+def check_series(name, body, expected):
+    series = body.get("series", {})
+    check(f"{name} : dates", series.get("time") == expected["time"], series.get("time"))
+    check(f"{name} : moyennes des pixels valides", all_close(series.get("value", []), expected["value"]),
+          series.get("value"))
+    check(f"{name} : pixels valides par image", series.get("pixels") == expected["pixels"], series.get("pixels"))
+    check(f"{name} : anomalies", all_close(series.get("anomaly", []), expected["anomaly"]))
+    check(f"{name} : z-scores", all_close(series.get("zscore", []), expected["zscore"]))
+    summary = body.get("summary", {})
+    check(f"{name} : résumé", all(close(summary.get(k), v) for k, v in expected["summary"].items()), summary)
+
+
+def stats(client, **params):
+    response = client.get(f"/api/stats?{urlencode(params)}")
+    return response.status_code, response.get_json()
+
+
+def main():
+    app = load_app()
+    from stats import MAX_REGION_VALUES, geometry_area_m2  # Après l'installation du faux `ee`
+    app.ee_initializer.wait(10)
+    fake_ee.config.update(latency_ms=1.0, jitter_ms=0.0, empty_dates={EMPTY_DAY}, images_per_day=1)
+    client = app.app.test_client()
+
+    # Point : un pixel par image
+    fake_ee.config["region_pixels"] = 1
+    fake_ee.reset()
+    status, body = stats(client, dataset="NASA/ORNL/DAYMET_V4", variable="tmax", point="-100,40",
+                         start=START, end=END)
+    check("point : 200", status == 200, body)
+    check_series("point", body, expected_series("tmax", START, "2024-01-11"))
+    check("point : moyenne de la série comme référence", body["baseline"]["source"] == "series_mean")
+    check("point : taille puis getRegion", fake_ee.calls.get("getInfo") == 1 and fake_ee.calls.get("getRegion") == 1,
+          fake_ee.calls)
+
+    # Emprise : quatre pixels par image, moyenne des pixels valides
+    fake_ee.config["region_pixels"] = 4
+    fake_ee.reset()
+    status, body = stats(client, dataset="NASA/ORNL/DAYMET_V4", variable="prcp", bbox="-100,40,-99.9,40.1",
+                         start=START, end=END)
+    check("emprise : 200", status == 200, body)
+    check_series("emprise", body, expected_series("prcp", START, "2024-01-11"))
+    check("emprise : échelle native", body["scale"] == 1000.0, body["scale"])
+
+    # Climatologie : anomalies par rapport à la moyenne de référence
+    fake_ee.reset()
+    status, body = stats(client, dataset="NASA/ORNL/DAYMET_V4", variable="tmin", bbox="-100,40,-99.9,40.1",
+                         start=START, end=END, climatology="1991-2020")
+    check("climatologie : 200", status == 200, body)
+    check("climatologie : référence", body["baseline"] == {"source": "climatology 1991-2020",
+                                                           "value": CLIMATOLOGY_MEAN}, body["baseline"])
+    check_series("climatologie", body, expected_series("tmin", START, "2024-01-11", baseline=CLIMATOLOGY_MEAN))
+    check("climatologie : un appel reduceRegion de plus", fake_ee.calls.get("getInfo") == 2, fake_ee.calls)
+
+    # Échelle : d'après le nombre d'images de la collection, pas d'une table par résolution
+    bbox = [-120.0, 30.0, -70.0, 50.0]
+    geometry = {"type": "Polygon", "coordinates": [[[bbox[0], bbox[1]], [bbox[2], bbox[1]], [bbox[2], bbox[3]],
+                                                    [bbox[0], bbox[3]], [bbox[0], bbox[1]]]]}
+    area = geometry_area_m2(geometry)
+    for images_per_day in (1, 144):
+        fake_ee.config["images_per_day"] = images_per_day
+        fake_ee.reset()
+        app.image_cache.clear()
+        status, body = stats(client, dataset="NOAA/GOES/16/MCMIPC", variable="CMI_C13",
+                             bbox=",".join(str(v) for v in bbox), start=START, end=END)
+        images = 9 * images_per_day
+        values = area / body["scale"] ** 2 * images
+        check(f"GOES-16, {images} images : valeurs sous la limite de getRegion",
+              status == 200 and values <= MAX_REGION_VALUES * (1 + 1e-6), body)
+        check(f"GOES-16, {images} images : échelle au plus juste", values >= MAX_REGION_VALUES * 0.99, values)
+
+    # GFS : ≈200 échéances par cycle ; seule l'analyse (forecast_hours=0) est échantillonnée
+    fake_ee.config["images_per_day"] = 4 * 209
+    fake_ee.reset()
+    status, body = stats(client, dataset="NOAA/GFS0P25", variable="temperature_2m_above_ground",
+                         bbox=",".join(str(v) for v in bbox), start=START, end=END)
+    check("GFS : 200", status == 200, body)
+    check("GFS : filtre d'analyse", ("eq", "forecast_hours", 0) in fake_ee.regions[-1]["filters"],
+          fake_ee.regions[-1])
+    check("GFS : échelle native (9 analyses)", body["scale"] == 27830.0, body["scale"])
+    check_series("GFS", body, expected_series("temperature_2m_above_ground", START, "2024-01-11"))
+    fake_ee.config["images_per_day"] = 1
+
+    # Intervalle sans données : signalé sans appel getRegion
+    fake_ee.config["empty_dates"] = {"2024-02-01", "2024-02-02"}
+    fake_ee.reset()
+    status, body = stats(client, dataset="NASA/ORNL/DAYMET_V4", variable="tmax", point="-100,40",
+                         start="2024-02-01", end="2024-02-02")
+    check("sans données : signalé", "Aucune donnée" in body.get("error", ""), body)
+    check("sans données : pas de getRegion", not fake_ee.calls.get("getRegion"), fake_ee.calls)
+
+    # Géométries mal formées : 400 « Géométrie invalide », sans appel Earth Engine
+    malformed = {
+        "coordonnées absentes": {"type": "Polygon"},
+        "position trop courte": {"type": "Point", "coordinates": [1]},
+        "coordonnées vides": {"type": "Polygon", "coordinates": []},
+        "anneau vide": {"type": "Polygon", "coordinates": [[]]},
+        "hors limites": {"type": "Point", "coordinates": [200, 40]},
+    }
+    for name, geometry in malformed.items():
+        fake_ee.reset()
+        status, body = stats(client, dataset="NASA/ORNL/DAYMET_V4", variable="tmax", geometry=json.dumps(geometry),
+                             start=START, end=END)
+        check(f"géométrie invalide ({name}) : 400", status == 400 and "Géométrie invalide" in body.get("error", "")
+              and not any(fake_ee.calls.values()), (status, body))
+    status, body = stats(client, dataset="NASA/ORNL/DAYMET_V4", variable="tmax", point="-100,40", scale="abc")
+    check("échelle non numérique : 400", status == 400 and "scale" in body.get("error", ""), (status, body))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+# check_tile_proxy.py - Vérifie le proxy /tiles contre un serveur de tuiles local simulé
+#
+# Utilisation (depuis src/) : python -m benchmarks.check_tile_proxy
+#
+# Le faux `ee` renvoie des identifiants de carte pointant vers un serveur HTTP
+# local dont la réponse dépend de la colonne x de la tuile : 0 = tuile PNG,
+# 1 = 404, 2 = réponse plus lente que le délai de téléchargement, 3 = connexion
+# fermée sans réponse. Vérifie succès, absence, erreurs amont et cache disque.
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks import fake_ee
+from benchmarks.util import check, load_app
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+FETCH_TIMEOUT = 0.3  # Délai de téléchargement imposé au proxy (secondes)
+TILE = "/tiles/NOAA/GFS0P25/temperature_2m_above_ground/2024-01-15/3/{x}/2.png"
+
+upstream_requests = []
+
+
+class StubTileServer(BaseHTTPRequestHandler):
+    def do_GET(self):
+        upstream_requests.append(self.path)
+        x = int(self.path.rstrip("/").split("/")[-2])
+        if x == 0:
+            self.send_response(200)
+            self.send_header("Content-Type", "image/png")
+            self.send_header("Content-Length", str(len(PNG)))
+            self.end_headers()
+            self.wfile.write(PNG)
+        elif x == 1:
+            self.send_error(404)
+        elif x == 2:
+            time.sleep(FETCH_TIMEOUT * 5)
+            self.send_error(500)
+        else:
+            self.close_connection = True  # Aucune réponse : connexion interrompue
+
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubTileServer)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    os.environ['TERRASIGHT_TILE_CACHE_DIR'] = tempfile.mkdtemp(prefix="tiles-")
+    app = load_app()
+    app.ee_initializer.wait(10)
+    app.TILE_FETCH_TIMEOUT = FETCH_TIMEOUT
+    fake_ee.config.update(latency_ms=1.0, jitter_ms=0.0, tile_server=f"http://127.0.0.1:{server.server_port}")
+    client = app.app.test_client()
+
+    try:
+        response = client.get(TILE.format(x=0))
+        check("absente du cache : téléchargée", response.status_code == 200 and response.data == PNG,
+              response.status_code)
+        check("un appel au serveur amont", len(upstream_requests) == 1)
+        check("défaut de cache compté", app.tile_cache.stats()["misses"] == 1)
+
+        response = client.get(TILE.format(x=0))
+        check("présente dans le cache : servie du disque", response.status_code == 200 and response.data == PNG)
+        check("aucun nouvel appel amont", len(upstream_requests) == 1)
+        check("succès de cache compté", app.tile_cache.stats()["hits"] == 1)
+        etag = response.headers.get("ETag")
+        response = client.get(TILE.format(x=0), headers={"If-None-Match": etag})
+        check("revalidation : 304", response.status_code == 304)
+
+        response = client.get(TILE.format(x=1))
+        check("404 amont : 502", response.status_code == 502, response.status_code)
+        check("404 amont non mise en cache", client.get(TILE.format(x=1)).status_code == 502
+              and len(upstream_requests) == 3)
+
+        start = time.perf_counter()
+        response = client.get(TILE.format(x=2))
+        elapsed = time.perf_counter() - start
+        check("délai amont dépassé : 504", response.status_code == 504, response.status_code)
+        check("délai respecté", elapsed < FETCH_TIMEOUT * 3, f"{elapsed:.2f} s")
+        check("réponse JSON", "error" in response.get_json())
+
+        response = client.get(TILE.format(x=3))
+        check("connexion interrompue : 502", response.status_code == 502, response.status_code)
+
+        server.shutdown()
+        server.server_close()
+        response = client.get(TILE.format(x=4))
+        check("serveur injoignable : 502", response.status_code == 502, response.status_code)
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
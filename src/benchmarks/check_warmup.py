@@ -0,0 +1,101 @@
+# check_warmup.py - Vérifie l'élection du worker de préchauffage et le préchauffage des collections en cours
+#
+# Utilisation (depuis src/) : python -m benchmarks.check_warmup
+#
+# Bail dans le cache partagé (SQLite, Redis simulé) : un seul élu, bail
+# prolongé par son détenteur et repris à son expiration ; cache en mémoire :
+# chaque processus est son propre élu. Deux planificateurs partageant un cache
+# SQLite : un seul soumet des tâches. Un jour qu'un index périmé dit vide est
+# refusé aux utilisateurs mais préchauffé pour une collection en cours.
+import datetime
+import os
+import tempfile
+import time
+
+from benchmarks import fake_ee
+from benchmarks.fake_redis import FakeRedis
+from benchmarks.util import Clock, check, load_app
+
+GFS = ("NOAA/GFS0P25", "temperature_2m_above_ground")
+DAYMET = ("NASA/ORNL/DAYMET_V4", "tmax")
+STALE_DAY = "2024-01-10"  # Jour indexé sans images (index non rafraîchi depuis)
+
+
+def check_lease(label, cache_a, cache_b, clock):
+    from warmup import WarmupLease
+    a, b = WarmupLease(cache_a, ttl=60), WarmupLease(cache_b, ttl=60)
+    check(f"{label} : premier worker élu", a.acquire())
+    check(f"{label} : second worker non élu", not b.acquire())
+    clock.now += 45
+    check(f"{label} : bail prolongé par son détenteur", a.acquire() and not b.acquire())
+    clock.now += 45  # 90 s après l'élection, 45 s après la prolongation
+    check(f"{label} : bail prolongé toujours valide", not b.acquire())
+    clock.now += 61  # Détenteur arrêté : bail expiré
+    check(f"{label} : bail repris après expiration", b.acquire() and not a.acquire())
+
+
+def main():
+    app = load_app()
+    import cache
+    import warmup
+    from availability import utc_today
+
+    # Bail : cache disque partagé, serveur Redis partagé, cache en mémoire propre à chaque processus
+    clock = Clock()
+    path = os.path.join(tempfile.mkdtemp(prefix="warmup-"), "cache.db")
+    check_lease("SQLite", cache.SQLiteCache(path, clock=clock), cache.SQLiteCache(path, clock=clock), clock)
+    server = FakeRedis(clock=clock)
+    check_lease("Redis", cache.RedisCache("redis://fake", client=server, clock=clock),
+                cache.RedisCache("redis://fake", client=server, clock=clock), clock)
+    check("mémoire : chaque processus est élu",
+          warmup.WarmupLease(cache.TTLCache()).acquire() and warmup.WarmupLease(cache.TTLCache()).acquire())
+
+    # Deux planificateurs sur le même cache : un seul soumet ses tâches
+    path = os.path.join(tempfile.mkdtemp(prefix="warmup-"), "cache.db")
+    runs = {"a": 0, "b": 0}
+    schedulers = {}
+    for name in runs:
+        lease = warmup.WarmupLease(cache.SQLiteCache(path))
+        scheduler = warmup.WarmupScheduler(lambda task, n=name: runs.__setitem__(n, runs[n] + 1) or True,
+                                           leader=lease.acquire)
+        scheduler.add_schedule("test", warmup.every(0.05), lambda n=name: [("image", n, "v", str(time.time()))])
+        schedulers[name] = scheduler
+        scheduler.start()
+    time.sleep(1.0)
+    for scheduler in schedulers.values():
+        scheduler.stop()
+    leaders = [name for name, scheduler in schedulers.items() if scheduler.status()["leader"]]
+    check("un seul planificateur élu", len(leaders) == 1, leaders)
+    check("seul l'élu préchauffe", runs[leaders[0]] > 0 and sum(runs.values()) == runs[leaders[0]], runs)
+
+    # Index périmé : jour indexé sans images pour une collection en cours et une collection close
+    app.ee_initializer.wait(10)
+    fake_ee.config.update(latency_ms=1.0, jitter_ms=0.0)
+    index = app.availability_index
+    for dataset_id in (GFS[0], DAYMET[0]):
+        index._indexed[dataset_id] = (datetime.date(2024, 1, 1), datetime.date(2024, 1, 31))
+    index._ongoing.add(GFS[0])
+    client = app.app.test_client()
+    for dataset_id, variable in (GFS, DAYMET):
+        body = client.get(f"/api/get_image?dataset={dataset_id}&variable={variable}&date={STALE_DAY}").get_json()
+        check(f"{dataset_id} : jour refusé aux utilisateurs d'après l'index",
+              "Aucune donnée" in body.get("error", ""), body)
+
+    fake_ee.reset()
+    check("collection en cours : jour préchauffé malgré l'index",
+          app.run_warmup_task(("image", GFS[0], GFS[1], STALE_DAY)) and fake_ee.calls.get("getThumbURL") == 1,
+          fake_ee.calls)
+    fake_ee.reset()
+    check("collection close : l'index fait foi", not app.run_warmup_task(("image", DAYMET[0], DAYMET[1], STALE_DAY))
+          and not fake_ee.calls.get("getThumbURL"), fake_ee.calls)
+
+    # Une seule horloge (UTC) : date par défaut, fin de la plage, jour des cycles et fin de l'index
+    gfs = app.get_dataset_info(GFS[0])
+    today = utc_today().strftime('%Y-%m-%d')
+    check("date par défaut, fin de plage et cycle en UTC",
+          gfs["default_date"] == gfs["date_range"][1] == app.latest_cycle_tasks(gfs)[0][3] == today,
+          (gfs["default_date"], app.latest_cycle_tasks(gfs)[0][3], today))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,418 @@
+# fake_ee.py - Module `ee` simulé, avec injection de latence et de pannes, pour les benchmarks
+import base64
+import datetime
+import io
+import itertools
+import json
+import math
+import random
+import sys
+import threading
+import time
+import types
+from urllib.parse import parse_qs, urlencode
+
+# Configuration de la simulation (modifiable par les benchmarks)
+config = {
+    "latency_ms": 150.0,     # Latence moyenne d'un aller-retour Earth Engine
+    "jitter_ms": 50.0,       # Écart-type de la latence
+    "distribution": "normal",  # Loi de la latence : normal (tronquée), lognormal, exponential ou fixed
+    "method_latency_ms": {},  # Latence moyenne par méthode (ex. {"getRegion": 800}), sinon latency_ms
+    "empty_dates": set(),    # Dates (AAAA-MM-JJ) sans aucune image
+    "images_per_day": 4,     # Taille d'une collection filtrée sur une journée
+    "region_pixels": 4,      # Pixels par image renvoyés par getRegion (table simulée)
+    "init_latency_ms": 0.0,  # Durée de ee.Initialize (authentification)
+    "init_failures": 0,      # Nombre de tentatives d'initialisation qui échouent d'abord
+    "fault_rate": 0.0,       # Proportion des appels en erreur (injection de pannes)
+    "fault": "quota",        # Type d'erreur injectée (voir FAULTS)
+    "tile_server": "https://earthengine.googleapis.com",  # Serveur des tuiles des cartes (getMapId)
+    "video_max_pixels": 26214400,  # Taille maximale d'une animation (pixels par image × images)
+    "download_server": None  # Serveur des blocs getDownloadURL (sinon URL data: en mémoire)
+}
+
+# Messages d'erreur d'Earth Engine simulés par type de panne
+FAULTS = {
+    "quota": "Too many concurrent aggregations.",
+    "timeout": "Computation timed out.",
+    "unavailable": "Service Unavailable (503)",
+    "compute": "Image.select: Pattern 'missing_band' did not match any bands."
+}
+
+# Compteurs d'appels Earth Engine (allers-retours simulés)
+calls = {"getInfo": 0, "getThumbURL": 0, "getRegion": 0}
+_calls_lock = threading.Lock()
+_thumb_ids = itertools.count()
+videos = []  # Animations demandées : {"frames", "dimensions", "framesPerSecond", "filters" (par image)}
+regions = []  # Requêtes getRegion sur une collection : {"scale", "filters"}
+thumbs = []  # Miniatures demandées : {"band", "filters"} (filtres de la collection composée)
+
+
+class EEException(Exception):
+    """Équivalent de ee.EEException."""
+
+
+class _Data:
+    _initialized = False
+
+
+data = _Data()
+
+
+def sample_latency(kind):
+    """Tire la latence (ms) d'un appel selon la loi configurée ; la moyenne peut dépendre de la méthode."""
+    mean = config["method_latency_ms"].get(kind, config["latency_ms"])
+    jitter = config["jitter_ms"] * mean / config["latency_ms"] if config["latency_ms"] else config["jitter_ms"]
+    distribution = config["distribution"]
+    if distribution == "fixed" or mean <= 0:
+        return max(0.0, mean)
+    if distribution == "exponential":
+        return random.expovariate(1.0 / mean)
+    if distribution == "lognormal":
+        # Paramètres choisis pour conserver la moyenne et l'écart-type demandés (queue de distribution longue)
+        sigma2 = math.log(1 + (jitter / mean) ** 2)
+        return random.lognormvariate(math.log(mean) - sigma2 / 2, math.sqrt(sigma2))
+    return max(0.0, random.gauss(mean, jitter))
+
+
+def _round_trip(kind):
+    """Simule un aller-retour réseau vers Earth Engine."""
+    with _calls_lock:
+        calls[kind] = calls.get(kind, 0) + 1
+    time.sleep(sample_latency(kind) / 1000.0)
+    if config["fault_rate"] and random.random() < config["fault_rate"]:
+        with _calls_lock:
+            calls["faults"] = calls.get("faults", 0) + 1
+        raise EEException(FAULTS[config["fault"]])
+
+
+def reset():
+    """Remet les compteurs d'appels à zéro."""
+    with _calls_lock:
+        for kind in calls:
+            calls[kind] = 0
+        videos.clear()
+        regions.clear()
+        thumbs.clear()
+
+
+def _days(start, end):
+    """Jours (AAAA-MM-JJ) de l'intervalle [start, end) ; un seul jour si end est absent."""
+    first = datetime.datetime.strptime(start[:10], '%Y-%m-%d')
+    last = datetime.datetime.strptime(end[:10], '%Y-%m-%d') if end else first + datetime.timedelta(days=1)
+    days = []
+    while first < last:
+        days.append(first.strftime('%Y-%m-%d'))
+        first += datetime.timedelta(days=1)
+    return days
+
+
+def ServiceAccountCredentials(email, key_file):
+    return None
+
+
+def Initialize(credentials=None, **kwargs):
+    time.sleep(config["init_latency_ms"] / 1000.0)
+    with _calls_lock:
+        if config["init_failures"] > 0:
+            config["init_failures"] -= 1
+            raise EEException("Simulated authentication failure")
+    data._initialized = True
+
+
+class ComputedObject:
+    """Objet calculé paresseux : les méthodes inconnues renvoient un objet dérivé."""
+
+    def __init__(self, empty=False, value=None):
+        self._empty = empty
+        self._value = value
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        def method(*args, **kwargs):
+            return self._derive()
+        return method
+
+    def _derive(self):
+        return self.__class__(empty=self._empty, value=self._value)
+
+    def getInfo(self):
+        _round_trip("getInfo")
+        return self._value if self._value is not None else {"type": "Image", "bands": []}
+
+
+def _region_table(band, times):
+    """Table getRegion simulée : en-tête puis une ligne par pixel et par image (valeurs déterministes)."""
+    table = [["id", "longitude", "latitude", "time", band]]
+    for i, time_ms in enumerate(times):
+        for pixel in range(config["region_pixels"]):
+            value = None if pixel == 0 and i % 5 == 0 else float(10 + (i % 7) + pixel)  # Quelques pixels masqués
+            table.append([f"img{i}", -100.0 + pixel * 0.01, 40.0, time_ms, value])
+    return table
+
+
+def pixel_value(row, col):
+    """Valeur simulée du pixel (ligne, colonne) de la grille globale du bloc téléchargé."""
+    return float((row % 1000) * 1000 + col % 1000)
+
+
+def download_npy(query):
+    """Contenu NPY (tableau structuré, une bande) d'un bloc getDownloadURL décrit par sa requête."""
+    import numpy as np
+    params = parse_qs(query)
+    band = params["band"][0]
+    width, height = (int(v) for v in params["dimensions"][0].split("x"))
+    pixel, _, west, _, _, north = json.loads(params["crs_transform"][0])
+    row0, col0 = int(round(-north / pixel)), int(round(west / pixel))
+    values = np.fromfunction(lambda i, j: ((row0 + i) % 1000) * 1000 + (col0 + j) % 1000, (height, width))
+    structured = np.zeros((height, width), dtype=[(band, '<f4')])
+    structured[band] = values
+    buffer = io.BytesIO()
+    np.save(buffer, structured, allow_pickle=False)
+    return buffer.getvalue()
+
+
+class Image(ComputedObject):
+    def __init__(self, asset_id=None, empty=False, value=None, band="b1", filters=()):
+        super().__init__(empty=empty, value=value)
+        self._band = band
+        self._filters = filters  # Filtres de la collection dont l'image est composée
+
+    def _derive(self):
+        return Image(empty=self._empty, value=self._value, band=self._band, filters=self._filters)
+
+    def select(self, band, *args):
+        return Image(empty=self._empty, band=band, filters=self._filters)
+
+    def getRegion(self, geometry, scale=None, *args, **kwargs):
+        return _RegionTable(lambda: _region_table(self._band, [None]))
+
+    def reduceRegion(self, *args, **kwargs):
+        return ComputedObject(value={self._band: 12.5})
+
+    def getThumbURL(self, params=None):
+        _round_trip("getThumbURL")
+        with _calls_lock:
+            thumbs.append({"band": self._band, "filters": self._filters})
+        if self._empty:
+            # Une collection vide produit une image nulle, rejetée par Earth Engine
+            raise EEException("Image.select: Parameter 'input' is required.")
+        return f"https://earthengine.googleapis.com/v1/thumbnails/fake-{next(_thumb_ids)}:getPixels"
+
+    def set(self, *args):
+        return self
+
+    def getDownloadURL(self, params=None):
+        _round_trip("getDownloadURL")
+        query = urlencode({"band": self._band, "dimensions": params["dimensions"],
+                           "crs_transform": json.dumps(params["crs_transform"])})
+        if config["download_server"]:
+            return f"{config['download_server']}/download?{query}"
+        return "data:application/octet-stream;base64," + base64.b64encode(download_npy(query)).decode('ascii')
+
+    def getMapId(self, params=None):
+        _round_trip("getMapId")
+        if self._empty:
+            raise EEException("Image.select: Parameter 'input' is required.")
+        url_format = f"{config['tile_server']}/v1/maps/fake-{next(_thumb_ids)}/tiles/{{z}}/{{x}}/{{y}}"
+        return {"mapid": url_format, "tile_fetcher": types.SimpleNamespace(url_format=url_format)}
+
+
+class _RegionTable(ComputedObject):
+    """Résultat différé d'un getRegion : la table n'est construite qu'au getInfo()."""
+
+    def __init__(self, build):
+        super().__init__()
+        self._build = build
+
+    def getInfo(self):
+        _round_trip("getRegion")
+        return self._build()
+
+
+class ImageCollection(ComputedObject):
+    """Collection simulée : un intervalle de dates, ou une liste d'images (fromImages)."""
+
+    def __init__(self, collection_id=None, empty=False, value=None, start=None, end=None, band="b1", frames=None,
+                 filters=()):
+        super().__init__(empty=empty, value=value)
+        self._start = start
+        self._end = end
+        self._band = band
+        self._frames = frames  # Images explicites (ImageCollection.fromImages), sinon None
+        self._filters = filters  # Filtres appliqués (ee.Filter.*), conservés pour les vérifications
+
+    def _copy(self, **changes):
+        params = dict(empty=self._empty, start=self._start, end=self._end, band=self._band, frames=self._frames,
+                      filters=self._filters)
+        params.update(changes)
+        return ImageCollection(**params)
+
+    _derive = _copy
+
+    @staticmethod
+    def fromImages(images):
+        frames = list(images._items)
+        return ImageCollection(empty=not frames, band=frames[0]._band if frames else "b1", frames=frames)
+
+    def filterDate(self, start, end=None):
+        start_str, end_str = str(start), None if end is None else str(end)
+        days = _days(start_str, end_str)
+        return self._copy(empty=all(day in config["empty_dates"] for day in days), start=start_str, end=end_str)
+
+    def select(self, band, *args):
+        return self._copy(band=band)
+
+    def filter(self, condition=None):
+        # Seul filtre simulé : les images vides (jours sans données) sont écartées ; les autres sont notés
+        if self._frames is None:
+            return self._copy(filters=self._filters + (condition,))
+        frames = [image for image in self._frames if not image._empty]
+        return self._copy(empty=not frames, frames=frames)
+
+    def map(self, fn):
+        if self._frames is None:
+            fn(self._image())  # Construit le graphe d'une image, comme le ferait Earth Engine
+            return self._copy()
+        return self._copy(frames=[fn(image) for image in self._frames])
+
+    def _frame_count(self):
+        """Nombre d'images : une par jour non vide pour un intervalle (collection quotidienne)."""
+        if self._frames is not None:
+            return len(self._frames)
+        if not self._start:
+            return 0
+        return sum(1 for day in _days(self._start, self._end) if day not in config["empty_dates"])
+
+    def size(self):
+        """Taille : images_per_day images par jour non vide, une seule après un filtre d'égalité (ex. analyse GFS)."""
+        if self._frames is not None:
+            return ComputedObject(value=len(self._frames))
+        per_day = 1 if any(f and f[0] == "eq" for f in self._filters) else config["images_per_day"]
+        return ComputedObject(value=self._frame_count() * per_day)
+
+    def getVideoThumbURL(self, params=None):
+        _round_trip("getVideoThumbURL")
+        params = params or {}
+        frames = self._frame_count()
+        if frames == 0:
+            raise EEException("ImageCollection.getVideoThumbURL: No frames found in collection.")
+        dimensions = int(str(params.get("dimensions", 256)).split("x")[0])
+        pixels = dimensions * dimensions * frames
+        if pixels > config["video_max_pixels"]:
+            raise EEException(f"Total request size ({pixels} pixels) must be less than or equal to "
+                              f"{config['video_max_pixels']} pixels.")
+        with _calls_lock:
+            videos.append({"frames": frames, "dimensions": dimensions,
+                           "framesPerSecond": params.get("framesPerSecond"),
+                           "filters": [image._filters for image in self._frames or []] or [self._filters]})
+        return f"https://earthengine.googleapis.com/v1/videoThumbnails/fake-{next(_thumb_ids)}:getPixels"
+
+    def getRegion(self, geometry, scale=None, *args, **kwargs):
+        """Table simulée : une image par jour non vide de l'intervalle."""
+        def build():
+            with _calls_lock:
+                regions.append({"scale": scale, "filters": self._filters})
+            if self._empty or not self._start:
+                return _region_table(self._band, [])
+            epoch = datetime.datetime(1970, 1, 1)
+            times = [int((datetime.datetime.strptime(day, '%Y-%m-%d') - epoch).total_seconds() * 1000)
+                     for day in _days(self._start, self._end) if day not in config["empty_dates"]]
+            return _region_table(self._band, times)
+        return _RegionTable(build)
+
+    def _image(self):
+        return Image(empty=self._empty, band=self._band, filters=self._filters)
+
+    first = mosaic = mean = median = max = min = sum = _image
+
+
+class Date:
+    """ee.Date simulée (jours entiers, UTC)."""
+
+    def __init__(self, value):
+        if isinstance(value, Date):
+            value = value._date
+        elif isinstance(value, str):
+            value = datetime.datetime.strptime(value[:10], '%Y-%m-%d')
+        elif isinstance(value, (int, float)):
+            value = datetime.datetime(1970, 1, 1) + datetime.timedelta(milliseconds=value)
+        self._date = value
+
+    def advance(self, delta, unit):
+        if unit != 'day':
+            raise EEException(f"Unité non simulée: {unit}")
+        return Date(self._date + datetime.timedelta(days=delta))
+
+    def millis(self):
+        return ComputedObject(value=int((self._date - datetime.datetime(1970, 1, 1)).total_seconds() * 1000))
+
+    def format(self, *args):
+        return ComputedObject(value=str(self))
+
+    def __str__(self):
+        return self._date.strftime('%Y-%m-%d')
+
+
+class List(ComputedObject):
+    """ee.List simulée : les éléments sont connus localement, map() applique la fonction à chacun."""
+
+    def __init__(self, items=None):
+        super().__init__()
+        self._items = list(items) if isinstance(items, (list, tuple, range)) else []
+
+    def _derive(self):
+        return List(self._items)
+
+    @staticmethod
+    def sequence(start, end, step=1):
+        return List(range(start, end + 1, step))
+
+    def map(self, fn):
+        return List([fn(item) for item in self._items])
+
+    def distinct(self):
+        return List(list(dict.fromkeys(self._items)))
+
+    def getInfo(self):
+        _round_trip("getInfo")
+        return list(self._items)
+
+
+class Geometry:
+    def __new__(cls, geojson, *args, **kwargs):
+        return _Geometry(geojson)
+
+    @staticmethod
+    def Rectangle(coords, *args, **kwargs):
+        return _Geometry({"type": "Polygon", "coordinates": [coords]})
+
+
+class _Filter:
+    """ee.Filter simulé : un filtre est décrit par (nom, arguments), sans effet sur les données simulées."""
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: (name,) + args
+
+
+Filter = _Filter()
+Reducer = _Filter()
+
+
+class _Geometry:
+    def __init__(self, geojson):
+        self._geojson = geojson
+
+    def toGeoJSON(self):
+        return self._geojson
+
+
+def install():
+    """Installe ce module à la place du paquet `ee` et le renvoie."""
+    module = sys.modules[__name__]
+    sys.modules["ee"] = module
+    data._initialized = True
+    return module
@@ -0,0 +1,153 @@
+# fake_redis.py - Serveur Redis simulé en mémoire (sous-ensemble des commandes utilisées par RedisCache)
+import fnmatch
+import threading
+import time
+from collections import OrderedDict
+
+
+class FakeRedis:
+    """Client redis.Redis simulé : chaînes avec expiration, ensembles triés, SCAN et pipelines.
+
+    max_keys imite une politique maxmemory allkeys-lru : au-delà, la clé la
+    moins récemment utilisée est évincée. L'horloge est injectable pour
+    tester l'expiration sans attendre.
+    """
+
+    def __init__(self, max_keys=None, clock=time.time):
+        self.max_keys = max_keys
+        self._clock = clock
+        self._data = OrderedDict()  # clé -> (valeur, expiration ou None), ordre LRU
+        self._lock = threading.RLock()
+        self.commands = {}  # Nombre d'appels par commande
+        self.evicted = 0
+
+    def _count(self, command):
+        self.commands[command] = self.commands.get(command, 0) + 1
+
+    def _live(self, key):
+        """Renvoie l'entrée de la clé si elle existe et n'a pas expiré (expiration paresseuse, comme Redis)."""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= self._clock():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return entry
+
+    def _store(self, key, value, expires_at=None):
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while self.max_keys is not None and len(self._data) > self.max_keys:
+            self._data.popitem(last=False)
+            self.evicted += 1
+
+    @staticmethod
+    def _encode(key):
+        return key.encode('utf-8') if isinstance(key, str) else key
+
+    # --- Chaînes ---------------------------------------------------------
+
+    def get(self, key):
+        with self._lock:
+            self._count("get")
+            entry = self._live(self._encode(key))
+            return None if entry is None else entry[0]
+
+    def set(self, key, value, ex=None, nx=False):
+        with self._lock:
+            self._count("set")
+            if ex is not None and ex <= 0:
+                raise ValueError("invalid expire time in 'set' command")
+            if nx and self._live(self._encode(key)) is not None:
+                return None
+            value = value.encode('utf-8') if isinstance(value, str) else value
+            self._store(self._encode(key), value, None if ex is None else self._clock() + ex)
+            return True
+
+    def delete(self, *keys):
+        with self._lock:
+            self._count("delete")
+            return sum(1 for key in keys if self._data.pop(self._encode(key), None) is not None)
+
+    def scan_iter(self, match="*"):
+        with self._lock:
+            self._count("scan")
+            keys = [key for key in list(self._data) if self._live(key) is not None]
+        pattern = match.encode('utf-8') if isinstance(match, str) else match
+        return iter([key for key in keys if fnmatch.fnmatchcase(key.decode('utf-8'), pattern.decode('utf-8'))])
+
+    def dbsize(self):
+        with self._lock:
+            self._count("dbsize")
+            return sum(1 for key in list(self._data) if self._live(key) is not None)
+
+    # --- Ensembles triés -------------------------------------------------
+
+    def _zset(self, key, create=False):
+        entry = self._live(self._encode(key))
+        if entry is None:
+            if not create:
+                return {}
+            zset = {}
+            self._store(self._encode(key), zset)
+            return zset
+        return entry[0]
+
+    def zadd(self, key, mapping):
+        with self._lock:
+            self._count("zadd")
+            zset = self._zset(key, create=True)
+            added = sum(1 for member in mapping if self._encode(member) not in zset)
+            zset.update({self._encode(member): float(score) for member, score in mapping.items()})
+            return added
+
+    def zrem(self, key, *members):
+        with self._lock:
+            self._count("zrem")
+            zset = self._zset(key)
+            return sum(1 for member in members if zset.pop(self._encode(member), None) is not None)
+
+    def zremrangebyscore(self, key, low, high):
+        with self._lock:
+            self._count("zremrangebyscore")
+            zset = self._zset(key)
+            low, high = float(low), float(high)
+            removed = [member for member, score in zset.items() if low <= score <= high]
+            for member in removed:
+                del zset[member]
+            return len(removed)
+
+    def zcard(self, key):
+        with self._lock:
+            self._count("zcard")
+            return len(self._zset(key))
+
+    # --- Pipelines -------------------------------------------------------
+
+    def pipeline(self, transaction=True):
+        return _Pipeline(self)
+
+
+class _Pipeline:
+    """Pipeline simulé : les commandes sont mises en file puis exécutées d'un bloc par execute()."""
+
+    def __init__(self, client):
+        self._client = client
+        self._queue = []
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        command = getattr(self._client, name)
+
+        def queue(*args, **kwargs):
+            self._queue.append((command, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        with self._client._lock:
+            results = [command(*args, **kwargs) for command, args, kwargs in self._queue]
+        self._queue = []
+        return results
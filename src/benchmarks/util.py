@@ -0,0 +1,55 @@
+# util.py - Outils communs des benchmarks
+import importlib
+import os
+import sys
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+
+def percentile(values, pct):
+    """Percentile par rang le plus proche."""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def check(name, condition, detail=""):
+    """Affiche le résultat d'une vérification ; arrête le script (code 1) au premier échec."""
+    print(f"{'ok' if condition else 'ÉCHEC':<6} {name}{f' ({detail})' if detail and not condition else ''}")
+    if not condition:
+        raise SystemExit(1)
+
+
+class Clock:
+    """Horloge murale simulée, à partager entre caches et serveurs simulés."""
+
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def load_app():
+    """Installe le faux `ee` puis importe l'application Flask (sans index de disponibilité ni préchauffage)."""
+    from benchmarks import fake_ee
+    fake_ee.install()
+    os.environ.setdefault('TERRASIGHT_AVAILABILITY_INDEX', '0')
+    os.environ.setdefault('TERRASIGHT_WARMUP', '0')
+    os.environ.setdefault('TERRASIGHT_CACHE_URL', 'memory://')
+    return importlib.import_module('app')
+
+
+def reset_gateway(app, **overrides):
+    """Remplace la passerelle Earth Engine de l'application (disjoncteur fermé, débit maximal).
+
+    Les paramètres non fournis reprennent la configuration de l'application.
+    """
+    params = dict(rate=app.EE_MAX_QPS, burst=app.EE_BURST, max_concurrent=app.EE_MAX_CONCURRENT,
+                  retries=app.EE_MAX_RETRIES, failure_threshold=app.EE_BREAKER_THRESHOLD,
+                  reset_timeout=app.EE_BREAKER_RESET)
+    params.update(overrides)
+    app.ee_gateway = app.set_gateway(app.EEGateway(**params))
+    return app.ee_gateway
@@ -0,0 +1,402 @@
+# cache.py - Cache des résultats Earth Engine (TTL + LRU) avec backends interchangeables
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+try:
+    import redis
+except ImportError:  # Dépendance optionnelle, requise uniquement pour le backend Redis
+    redis = None
+
+# Valeur sentinelle : utiliser le TTL par défaut du cache
+DEFAULT_TTL = object()
+
+
+class CacheBackend:
+    """Interface commune des backends de cache.
+
+    Les sous-classes implémentent _get, _set, _add, delete, clear et __len__ ;
+    la classe de base tient les compteurs de succès/échecs du processus.
+    Les valeurs doivent être sérialisables en JSON pour les backends partagés.
+    """
+
+    name = "base"
+
+    def __init__(self, default_ttl=3600):
+        self.default_ttl = default_ttl
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, record_stats=True):
+        """Renvoie la valeur associée à la clé, ou None si absente ou expirée.
+
+        record_stats=False : lecture interne (index de disponibilité...) non
+        comptée dans les succès/échecs, qui mesurent les requêtes servies.
+        """
+        value = self._get(key)
+        if not record_stats:
+            return value
+        with self._stats_lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value, ttl=DEFAULT_TTL):
+        """Enregistre une valeur ; ttl en secondes, None pour ne jamais expirer."""
+        if ttl is DEFAULT_TTL:
+            ttl = self.default_ttl
+        self._set(key, value, ttl)
+
+    def add(self, key, value, ttl=DEFAULT_TTL):
+        """Enregistre une valeur seulement si la clé est absente (ou expirée) ; renvoie True si elle l'a été.
+
+        Opération atomique pour tous les processus partageant le cache
+        (verrous, élection d'un seul worker).
+        """
+        if ttl is DEFAULT_TTL:
+            ttl = self.default_ttl
+        return self._add(key, value, ttl)
+
+    def _get(self, key):
+        raise NotImplementedError
+
+    def _set(self, key, value, ttl):
+        raise NotImplementedError
+
+    def _add(self, key, value, ttl):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def stats(self):
+        """Renvoie les compteurs du cache."""
+        with self._stats_lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": self.name,
+                "entries": len(self),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0
+            }
+
+
+class TTLCache(CacheBackend):
+    """Cache en mémoire borné, avec expiration par entrée (TTL) et éviction LRU.
+
+    Un TTL à None signifie que l'entrée n'expire jamais (données statiques
+    comme les MNT) ; elle peut toutefois être évincée si le cache est plein.
+    """
+
+    name = "memory"
+
+    def __init__(self, max_entries=512, default_ttl=3600, clock=time.monotonic):
+        super().__init__(default_ttl)
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries = OrderedDict()  # clé -> (valeur, expiration ou None)
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= self._clock():
+                del self._entries[key]
+                self.expirations += 1
+                return None
+
+            # Marquer l'entrée comme la plus récemment utilisée
+            self._entries.move_to_end(key)
+            return value
+
+    def _set(self, key, value, ttl):
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def _add(self, key, value, ttl):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[1] is None or entry[1] > self._clock()):
+                return False
+            self._store(key, value, ttl)
+            return True
+
+    def _store(self, key, value, ttl):
+        """Enregistre une entrée et évince au-delà de max_entries (appelé sous verrou)."""
+        self._entries[key] = (value, None if ttl is None else self._clock() + ttl)
+        self._entries.move_to_end(key)
+        # Évincer les entrées les moins récemment utilisées
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key):
+        """Supprime une entrée du cache si elle existe."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Vide le cache (les compteurs sont conservés)."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        stats = super().stats()
+        stats["max_entries"] = self.max_entries
+        return stats
+
+
+class SQLiteCache(CacheBackend):
+    """Cache persistant sur disque (SQLite), partagé par les workers d'une même machine.
+
+    L'expiration utilise l'horloge murale pour être cohérente entre processus ;
+    l'éviction LRU se fait sur la date de dernier accès.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path, max_entries=10000, default_ttl=3600, clock=time.time):
+        super().__init__(default_ttl)
+        self.path = path
+        self.max_entries = max_entries
+        self._clock = clock
+        self._local = threading.local()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " expires_at REAL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed_at)")
+
+    def _connection(self):
+        """Renvoie la connexion SQLite propre au thread courant."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _get(self, key):
+        conn = self._connection()
+        now = self._clock()
+        row = conn.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+
+        value, expires_at = row
+        with conn:
+            if expires_at is not None and expires_at <= now:
+                conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self.expirations += 1
+                return None
+            conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(value)
+
+    def _set(self, key, value, ttl):
+        conn = self._connection()
+        now = self._clock()
+        expires_at = None if ttl is None else now + ttl
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), expires_at, now)
+            )
+            # Évincer les entrées les moins récemment utilisées au-delà de la limite
+            excess = conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0] - self.max_entries
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM cache WHERE key IN"
+                    " (SELECT key FROM cache ORDER BY accessed_at ASC LIMIT ?)",
+                    (excess,)
+                )
+                self.evictions += excess
+
+    def _add(self, key, value, ttl):
+        conn = self._connection()
+        now = self._clock()
+        expires_at = None if ttl is None else now + ttl
+        with conn:
+            # Une entrée expirée est remplacée ; une entrée valide est conservée (INSERT OR IGNORE)
+            conn.execute("DELETE FROM cache WHERE key = ? AND expires_at <= ?", (key, now))
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), expires_at, now)
+            )
+        return cursor.rowcount == 1
+
+    def delete(self, key):
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self):
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM cache")
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def stats(self):
+        stats = super().stats()
+        stats["max_entries"] = self.max_entries
+        stats["path"] = self.path
+        return stats
+
+
+class RedisCache(CacheBackend):
+    """Cache partagé via un serveur parlant le protocole Redis (Redis, Valkey, KeyDB...).
+
+    L'expiration est déléguée au serveur (SET ... EX) ; l'éviction LRU dépend
+    de sa politique maxmemory (allkeys-lru recommandé).
+
+    Le nombre d'entrées est tenu dans un ensemble trié (clé -> expiration),
+    mis à jour à chaque écriture : __len__ et stats() ne parcourent pas
+    l'espace de clés du serveur. Les clés évincées par le serveur (maxmemory)
+    y restent comptées jusqu'à leur expiration.
+    """
+
+    name = "redis"
+    INDEX_KEY = "__index__"
+
+    def __init__(self, url, prefix="terrasight:", default_ttl=3600, client=None, clock=time.time):
+        super().__init__(default_ttl)
+        if client is None:
+            if redis is None:
+                raise RuntimeError("Le paquet 'redis' est requis pour le backend de cache Redis")
+            client = redis.Redis.from_url(url)
+        self.url = url
+        self.prefix = prefix
+        self._client = client
+        self._clock = clock
+        self._index = prefix + self.INDEX_KEY
+
+    def _get(self, key):
+        raw = self._client.get(self.prefix + key)
+        if raw is None:
+            return None
+        return json.loads(raw)
+
+    def _set(self, key, value, ttl):
+        # Redis n'accepte que des durées entières strictement positives
+        ex = None if ttl is None else max(1, int(ttl))
+        expires_at = float("inf") if ex is None else self._clock() + ex
+        pipe = self._client.pipeline(transaction=False)
+        pipe.set(self.prefix + key, json.dumps(value), ex=ex)
+        pipe.zadd(self._index, {key: expires_at})
+        pipe.execute()
+
+    def _add(self, key, value, ttl):
+        ex = None if ttl is None else max(1, int(ttl))
+        if not self._client.set(self.prefix + key, json.dumps(value), ex=ex, nx=True):
+            return False
+        self._client.zadd(self._index, {key: float("inf") if ex is None else self._clock() + ex})
+        return True
+
+    def delete(self, key):
+        pipe = self._client.pipeline(transaction=False)
+        pipe.delete(self.prefix + key)
+        pipe.zrem(self._index, key)
+        pipe.execute()
+
+    def clear(self):
+        keys = list(self._client.scan_iter(match=self.prefix + "*"))
+        if keys:
+            self._client.delete(*keys)
+
+    def __len__(self):
+        # Retirer de l'index les entrées expirées, puis compter celles qui restent
+        pipe = self._client.pipeline(transaction=False)
+        pipe.zremrangebyscore(self._index, "-inf", self._clock())
+        pipe.zcard(self._index)
+        return pipe.execute()[1]
+
+    def stats(self):
+        stats = super().stats()
+        stats["prefix"] = self.prefix
+        return stats
+
+
+def create_cache(url, max_entries=1024, default_ttl=3600):
+    """Crée un backend de cache à partir d'une URL.
+
+    - memory://                     cache en mémoire du processus
+    - sqlite:///chemin/cache.db     cache disque partagé entre workers
+    - redis://hote:6379/0           serveur compatible Redis
+    """
+    scheme = urlparse(url).scheme
+    if scheme in ("", "memory"):
+        return TTLCache(max_entries=max_entries, default_ttl=default_ttl)
+    if scheme == "sqlite":
+        # sqlite:///relatif.db ou sqlite:////chemin/absolu.db
+        path = url[len("sqlite:///"):]
+        return SQLiteCache(path, max_entries=max_entries, default_ttl=default_ttl)
+    if scheme in ("redis", "rediss", "unix"):
+        return RedisCache(url, default_ttl=default_ttl)
+    raise ValueError(f"Backend de cache inconnu: {url}")
+
+
+def make_image_cache_key(dataset_id, variable, date_str, region, dimensions, composite=""):
+    """Construit la clé de cache d'une image (dataset, variable, date, région, dimensions, composition).
+
+    Pour une composition, date_str est le début de la fenêtre alignée et
+    composite vaut "réducteur/fenêtre" (ex. "mean/week").
+    """
+    region_str = ",".join(str(c) for c in region) if region else ""
+    key = f"image:{dataset_id}:{variable}:{date_str or ''}:{region_str}:{dimensions}"
+    return f"{key}:{composite}" if composite else key
+
+
+def make_animation_cache_key(dataset_id, variable, start_date, end_date, region, dimensions, frames_per_second):
+    """Construit la clé de cache d'une animation (dataset, variable, intervalle, région, dimensions, cadence)."""
+    region_str = ",".join(str(c) for c in region) if region else ""
+    return f"animation:{dataset_id}:{variable}:{start_date}:{end_date}:{region_str}:{dimensions}:{frames_per_second}"
+
+
+def make_tile_cache_key(dataset_id, variable, date_str, vis_params, composite=""):
+    """Construit la clé de cache d'un identifiant de carte (dataset, variable, date, paramètres de visualisation)."""
+    vis_hash = hashlib.sha1(json.dumps(vis_params, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+    key = f"tile:{dataset_id}:{variable}:{date_str or ''}:{vis_hash}"
+    return f"{key}:{composite}" if composite else key
+
+
+def make_stats_cache_key(dataset_id, variable, geometry, start_date, end_date, scale, climatology):
+    """Construit la clé de cache d'une série statistique (dataset, variable, géométrie, intervalle, échelle)."""
+    geometry_hash = hashlib.sha1(json.dumps(geometry, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+    climatology_str = f"{climatology[0]}-{climatology[1]}" if climatology else ""
+    return f"stats:{dataset_id}:{variable}:{start_date or ''}:{end_date or ''}:{geometry_hash}:{scale or ''}:{climatology_str}"
@@ -0,0 +1,86 @@
+# catalog.py - Catalogue des datasets compilé au démarrage (index, paramètres de visualisation, légendes)
+import hashlib
+import json
+
+from render import parse_color
+
+
+def build_legend(vis_params):
+    """Construit la légende [(couleur CSS, libellé de la valeur)] d'une palette.
+
+    Les couleurs sont normalisées en #rrggbb : les noms (white, cyan...) sont
+    acceptés par Earth Engine mais "#white" ne l'est pas par CSS.
+    """
+    palette = vis_params.get('palette', [])
+    min_val = vis_params.get('min', 0)
+    max_val = vis_params.get('max', 100)
+    steps = max(len(palette) - 1, 1)
+    return [
+        ("#%02x%02x%02x" % parse_color(color), f"{min_val + i * (max_val - min_val) / steps:.1f}")
+        for i, color in enumerate(palette)
+    ]
+
+
+class Catalog:
+    """Catalogue indexé : dataset par identifiant, paramètres de visualisation, noms de variables et légendes.
+
+    Compilé une fois à partir des définitions (datasets par catégorie et table
+    des paramètres de visualisation) ; les recherches sont ensuite des accès
+    directs à des dictionnaires. Le contenu publié (/api/catalog) est
+    sérialisé une fois et identifié par son empreinte.
+    """
+
+    def __init__(self, datasets, vis_params, default_vis_params):
+        self.datasets = datasets
+        self.default_vis_params = default_vis_params
+        self._by_id = {}
+        self._vis_params = {}
+        self._variable_names = {}
+        self._legends = {}
+
+        for category in datasets.values():
+            for dataset in category:
+                self._by_id[dataset["id"]] = dataset
+                for variable in dataset["variables"]:
+                    key = (dataset["id"], variable["id"])
+                    params = vis_params.get(key, default_vis_params)
+                    self._vis_params[key] = params
+                    self._variable_names[key] = variable["name"]
+                    self._legends[key] = build_legend(params)
+
+        self.payload = {
+            "datasets": datasets,
+            "vis_params": self._nested(self._vis_params),
+            "legends": self._nested(self._legends)
+        }
+        self.body = json.dumps(self.payload, sort_keys=True, ensure_ascii=False).encode('utf-8')
+        self.hash = hashlib.sha256(self.body).hexdigest()[:16]
+
+    @staticmethod
+    def _nested(table):
+        """{(dataset, variable): valeur} -> {dataset: {variable: valeur}}, pour la sérialisation JSON."""
+        nested = {}
+        for (dataset_id, variable), value in table.items():
+            nested.setdefault(dataset_id, {})[variable] = value
+        return nested
+
+    def dataset(self, dataset_id):
+        return self._by_id.get(dataset_id)
+
+    def vis_params(self, dataset_id, variable):
+        """Paramètres de visualisation (copie modifiable) du couple (dataset, variable)."""
+        return dict(self._vis_params.get((dataset_id, variable), self.default_vis_params))
+
+    def variable_name(self, dataset_id, variable):
+        return self._variable_names.get((dataset_id, variable), variable)
+
+    def has_variable(self, dataset_id, variable):
+        return (dataset_id, variable) in self._variable_names
+
+    def legend(self, dataset_id, variable):
+        return self._legends.get((dataset_id, variable))
+
+    def collections(self):
+        """Datasets datés (collections d'images), pour l'index des dates disponibles."""
+        return [dataset for dataset in self._by_id.values()
+                if dataset.get("asset_type") == "ImageCollection" and dataset["date_range"]]
@@ -0,0 +1,73 @@
+# ee_executor.py - Exécution des appels Earth Engine bloquants hors de la boucle asyncio
+import asyncio
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutorBusyError(Exception):
+    """Trop de requêtes Earth Engine en attente : la requête est refusée (HTTP 503)."""
+
+
+class EEExecutor:
+    """Pool de threads borné pour le client Earth Engine (synchrone), utilisable depuis asyncio.
+
+    Seuls max_workers appels s'exécutent en même temps ; les autres attendent
+    sous forme de coroutines, sans thread dédié. Une requête annulée (délai
+    dépassé, client déconnecté) avant d'avoir démarré est retirée de la file ;
+    un appel déjà en cours se termine mais son résultat est ignoré.
+    """
+
+    def __init__(self, max_workers=32, max_pending=1024, timeout=60):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ee")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.completed = 0
+        self.timeouts = 0
+        self.cancelled = 0
+        self.rejected = 0
+
+    async def run(self, fn, *args, timeout=None, **kwargs):
+        """Exécute fn(*args, **kwargs) dans le pool et attend son résultat, avec délai maximal."""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise ExecutorBusyError(f"{self._pending} requêtes Earth Engine déjà en attente")
+            self._pending += 1
+
+        try:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self._pool, functools.partial(fn, *args, **kwargs))
+            result = await asyncio.wait_for(future, timeout or self.timeout)
+            self.completed += 1
+            return result
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "in_flight": self._pending,
+                "completed": self.completed,
+                "timeouts": self.timeouts,
+                "cancelled": self.cancelled,
+                "rejected": self.rejected
+            }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,258 @@
+# ee_gateway.py - Passage obligé des appels Earth Engine : limite de débit, nouvelles tentatives, disjoncteur
+import logging
+import random
+import threading
+import time
+
+from metrics import EE_CALL_SECONDS, EE_CALLS, EE_ERRORS, EE_RETRIES, EE_REJECTED
+
+logger = logging.getLogger(__name__)
+
+# Erreurs transitoires d'Earth Engine (messages en minuscules) : une nouvelle tentative peut réussir
+RETRYABLE_MESSAGES = (
+    "too many concurrent", "quota", "rate limit", "capacity exceeded", "too many requests",
+    "timed out", "timeout", "deadline exceeded", "service unavailable", "backend error",
+    "internal error", "connection reset", "429", "503"
+)
+# Sous-ensemble signalant un dépassement de quota : le débit autorisé est réduit
+QUOTA_MESSAGES = ("too many concurrent", "quota", "rate limit", "capacity exceeded", "too many requests", "429")
+
+
+class EEUnavailableError(Exception):
+    """Earth Engine indisponible (quota, panne, disjoncteur ouvert) : HTTP 503, éventuellement résultat périmé."""
+
+    status = 503
+
+
+def is_retryable(error):
+    """Indique si l'erreur est transitoire (quota, délai, indisponibilité) plutôt qu'une erreur de calcul."""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    status = getattr(getattr(error, "resp", None), "status", None)  # HttpError du client d'API
+    if status in (429, 500, 502, 503, 504):
+        return True
+    message = str(error).lower()
+    return any(pattern in message for pattern in RETRYABLE_MESSAGES)
+
+
+def is_quota_error(error):
+    status = getattr(getattr(error, "resp", None), "status", None)
+    return status == 429 or any(pattern in str(error).lower() for pattern in QUOTA_MESSAGES)
+
+
+class TokenBucket:
+    """Seau à jetons adaptatif : débit (appels par seconde) réduit de moitié sur une erreur de quota,
+    puis ré-augmenté progressivement à chaque succès jusqu'à max_rate (AIMD).
+    """
+
+    def __init__(self, rate, burst, min_rate=1.0, clock=time.monotonic):
+        self.max_rate = float(rate)
+        self.min_rate = min(float(min_rate), self.max_rate)
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self._clock = clock
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, timeout):
+        """Prend un jeton, en attendant au plus timeout secondes ; renvoie False si le délai expire."""
+        deadline = self._clock() + timeout
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._refill(now)
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return True
+                wait = (1.0 - self._tokens) / self.rate
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def decrease(self):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def increase(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 100)
+
+
+class CircuitBreaker:
+    """Disjoncteur : ouvert après failure_threshold échecs transitoires consécutifs.
+
+    Ouvert, il refuse les appels pendant reset_timeout secondes ; il laisse
+    ensuite passer un seul appel d'essai (semi-ouvert), qui le referme s'il
+    réussit ou le rouvre s'il échoue.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = None
+        self.opened = 0
+        self._trial = False
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and self._clock() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._trial = False
+            if self.state == "half_open" and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != "closed":
+                logger.info("Disjoncteur Earth Engine refermé")
+            self.state = "closed"
+            self.failures = 0
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+                if self.state == "closed":
+                    logger.error(f"Disjoncteur Earth Engine ouvert après {self.failures} échecs consécutifs")
+                self.state = "open"
+                self.opened_at = self._clock()
+                self.opened += 1
+                self._trial = False
+
+    def abandon(self):
+        """L'appel autorisé n'a pas eu lieu (limite de débit) : l'essai semi-ouvert reste disponible."""
+        with self._lock:
+            self._trial = False
+
+    def retry_in(self):
+        with self._lock:
+            if self.state != "open":
+                return 0.0
+            return max(0.0, self.reset_timeout - (self._clock() - self.opened_at))
+
+
+class EEGateway:
+    """Point de passage unique des appels Earth Engine.
+
+    Chaque appel prend un jeton (débit), une place parmi max_concurrent
+    (concurrence) et passe par le disjoncteur. Les erreurs transitoires sont
+    retentées (au plus retries fois, délai exponentiel avec gigue complète) ;
+    une fois les tentatives épuisées, ou le disjoncteur ouvert, l'appel lève
+    EEUnavailableError. Les erreurs de calcul sont relancées telles quelles.
+    """
+
+    def __init__(self, rate=20.0, burst=40, max_concurrent=16, max_wait=10.0, retries=3,
+                 base_delay=0.5, max_delay=8.0, failure_threshold=5, reset_timeout=30.0):
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.max_concurrent = max_concurrent
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self.max_wait = max_wait
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.calls = 0
+        self.retried = 0
+        self.rejected = 0
+
+    def _reject(self, method, dataset, message):
+        self.rejected += 1
+        EE_REJECTED.inc(method=method, dataset=dataset)
+        raise EEUnavailableError(message)
+
+    def _attempt(self, method, dataset, fn):
+        """Un appel, sous limite de débit et de concurrence ; compté et chronométré."""
+        if not self.bucket.acquire(self.max_wait):
+            self._reject(method, dataset, "Limite de débit Earth Engine atteinte, réessayez dans quelques instants")
+        if not self._slots.acquire(timeout=self.max_wait):
+            self._reject(method, dataset, "Trop d'appels Earth Engine en cours, réessayez dans quelques instants")
+        self.calls += 1
+        EE_CALLS.inc(method=method, dataset=dataset)
+        start = time.perf_counter()
+        try:
+            return fn()
+        except Exception:
+            EE_ERRORS.inc(method=method, dataset=dataset)
+            raise
+        finally:
+            EE_CALL_SECONDS.observe(time.perf_counter() - start, method=method, dataset=dataset)
+            self._slots.release()
+
+    def call(self, method, dataset, fn):
+        """Exécute fn() (un aller-retour Earth Engine) ; renvoie son résultat."""
+        delay = self.base_delay
+        for attempt in range(self.retries + 1):
+            if not self.breaker.allow():
+                self._reject(method, dataset, f"Earth Engine temporairement indisponible "
+                                              f"(nouvel essai dans {self.breaker.retry_in():.0f} s)")
+            try:
+                result = self._attempt(method, dataset, fn)
+            except EEUnavailableError:
+                self.breaker.abandon()
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    # Erreur de calcul : Earth Engine a répondu, le service fonctionne
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                if is_quota_error(e):
+                    self.bucket.decrease()
+                if attempt == self.retries:
+                    logger.error(f"Échec de {method} ({dataset}) après {attempt + 1} tentative(s): {str(e)}")
+                    raise EEUnavailableError(f"Earth Engine indisponible: {str(e)}") from e
+                self.retried += 1
+                EE_RETRIES.inc(method=method, dataset=dataset)
+                wait = random.uniform(0, delay)
+                logger.info(f"Erreur transitoire de {method} ({dataset}): {str(e)} ; "
+                            f"nouvelle tentative dans {wait:.2f} s")
+                time.sleep(wait)
+                delay = min(delay * 2, self.max_delay)
+                continue
+
+            self.breaker.record_success()
+            self.bucket.increase()
+            return result
+
+    def status(self):
+        return {
+            "breaker": self.breaker.state,
+            "breaker_retry_in": self.breaker.retry_in(),
+            "breaker_opened": self.breaker.opened,
+            "consecutive_failures": self.breaker.failures,
+            "rate": round(self.bucket.rate, 2),
+            "max_rate": self.bucket.max_rate,
+            "max_concurrent": self.max_concurrent,
+            "calls": self.calls,
+            "retried": self.retried,
+            "rejected": self.rejected
+        }
+
+
+# Passerelle partagée par tous les modules (remplacée au démarrage par la configuration de l'application)
+gateway = EEGateway()
+
+
+def set_gateway(new_gateway):
+    global gateway
+    gateway = new_gateway
+    return new_gateway
+
+
+def ee_call(method, dataset, fn):
+    """Exécute un appel Earth Engine via la passerelle partagée ; renvoie son résultat."""
+    return gateway.call(method, dataset, fn)
@@ -0,0 +1,100 @@
+# ee_init.py - Initialisation d'Earth Engine en arrière-plan, avec nouvelles tentatives
+import logging
+import random
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+logger = logging.getLogger(__name__)
+
+
+class EEInitializer:
+    """Initialise Earth Engine dans un thread dédié, sans bloquer le démarrage du processus.
+
+    Les échecs (réseau, authentification) sont retentés avec un délai
+    exponentiel plafonné et une gigue aléatoire. Les requêtes attendent la
+    disponibilité via un futur partagé (wait), jamais en réinitialisant elles-mêmes.
+    """
+
+    def __init__(self, initialize, base_delay=1.0, max_delay=300.0, clock=time.time):
+        self._initialize = initialize  # Fonction d'initialisation : lève une exception en cas d'échec
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._clock = clock
+        self.ready = Future()
+        self._stop = threading.Event()
+        self._thread = None
+        self.state = "pending"
+        self.attempts = 0
+        self.last_error = None
+        self.started_at = None
+        self.ready_at = None
+        self.next_attempt_at = None
+
+    def start(self):
+        """Démarre l'initialisation en arrière-plan (sans effet si elle est déjà lancée)."""
+        if self._thread is not None:
+            return
+        self.started_at = self._clock()
+        self._thread = threading.Thread(target=self._run, name="ee-init", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        delay = self.base_delay
+        while not self._stop.is_set():
+            self.state = "initializing"
+            self.attempts += 1
+            try:
+                self._initialize()
+            except Exception as e:
+                self.last_error = str(e)
+                # Gigue : les workers redémarrés ensemble ne réessaient pas au même instant
+                wait = delay * random.uniform(0.5, 1.0)
+                self.state = "retrying"
+                self.next_attempt_at = self._clock() + wait
+                logger.error(f"Échec de l'initialisation de Earth Engine (tentative {self.attempts}): {str(e)} ; "
+                             f"nouvelle tentative dans {wait:.1f} s")
+                delay = min(delay * 2, self.max_delay)
+                if self._stop.wait(wait):
+                    return
+                continue
+
+            self.state = "ready"
+            self.ready_at = self._clock()
+            self.last_error = None
+            self.next_attempt_at = None
+            logger.info(f"Earth Engine prêt en {self.ready_at - self.started_at:.2f} s "
+                        f"({self.attempts} tentative(s))")
+            self.ready.set_result(True)
+            return
+
+    def is_ready(self):
+        return self.ready.done()
+
+    def wait(self, timeout=None):
+        """Attend que Earth Engine soit prêt ; renvoie False si le délai expire avant."""
+        try:
+            return self.ready.result(timeout=timeout)
+        except FutureTimeoutError:
+            return False
+
+    def on_ready(self, callback):
+        """Exécute callback() dès que Earth Engine est prêt (immédiatement s'il l'est déjà)."""
+        self.ready.add_done_callback(lambda _: callback())
+
+    def stop(self):
+        self._stop.set()
+
+    def status(self):
+        now = self._clock()
+        status = {
+            "state": self.state,
+            "ready": self.is_ready(),
+            "attempts": self.attempts,
+            "last_error": self.last_error
+        }
+        if self.ready_at is not None:
+            status["init_seconds"] = self.ready_at - self.started_at
+        if self.next_attempt_at is not None and not self.is_ready():
+            status["next_attempt_in"] = max(0.0, self.next_attempt_at - now)
+        return status
@@ -0,0 +1,416 @@
+# export.py - Export de rasters en blocs parallèles vers un stockage local (.npy mappé en mémoire, COG)
+import hashlib
+import http.client
+import io
+import json
+import logging
+import math
+import os
+import random
+import shutil
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, wait
+
+try:
+    import numpy as np
+except ImportError:  # Dépendance optionnelle, requise uniquement pour les exports
+    np = None
+
+try:
+    import rasterio
+    from rasterio.transform import from_origin
+except ImportError:  # Dépendance optionnelle, requise uniquement pour le format COG
+    rasterio = None
+
+from ee_gateway import EEUnavailableError, ee_call
+from processor import DatasetError, build_image, get_variable_name
+from stats import geometry_bounds, summarize
+
+logger = logging.getLogger(__name__)
+
+METERS_PER_DEGREE = 111320.0
+CHUNK_SIZE = 1024  # Côté (pixels) d'un bloc téléchargé ; getDownloadURL est limité à ~48 Mo par requête
+MAX_EXPORT_PIXELS = 256 * 1024 * 1024  # 1 Go en float32
+DOWNLOAD_TIMEOUT = 300
+FORMATS = ("npy", "cog")
+CHUNK_RETRIES = 3  # Nouvelles tentatives d'un bloc après une erreur transitoire
+CHUNK_RETRY_DELAY = 2.0  # Délai maximal (s) avant la première nouvelle tentative, doublé ensuite
+# Erreurs transitoires d'un bloc : réseau (URLError, délai, connexion interrompue) ou Earth Engine indisponible
+RETRYABLE_CHUNK_ERRORS = (OSError, http.client.HTTPException, EEUnavailableError)
+
+
+def grid_for_region(region, scale):
+    """Grille régulière en EPSG:4326 couvrant la région : (largeur, hauteur, taille du pixel en degrés)."""
+    west, south, east, north = region
+    pixel = scale / METERS_PER_DEGREE
+    width = max(1, int(math.ceil((east - west) / pixel)))
+    height = max(1, int(math.ceil((north - south) / pixel)))
+    return width, height, pixel
+
+
+def make_export_id(dataset_id, variable, date_str, region, scale):
+    """Identifiant stable d'un export : mêmes paramètres, même répertoire."""
+    payload = json.dumps([dataset_id, variable, date_str, list(region), scale])
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def download_chunk(image, dataset_id, variable, west, north, pixel, width, height, timeout=DOWNLOAD_TIMEOUT):
+    """Télécharge un bloc de l'image au format NPY sur la grille donnée ; renvoie un tableau float32."""
+    url = ee_call("getDownloadURL", dataset_id, lambda: image.getDownloadURL({
+        "format": "NPY",
+        "crs": "EPSG:4326",
+        "crs_transform": [pixel, 0, west, 0, -pixel, north],
+        "dimensions": f"{width}x{height}"
+    }))
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        structured = np.load(io.BytesIO(response.read()), allow_pickle=False)
+    # Tableau structuré (une composante par bande) ; les pixels masqués sont marqués par un tableau masqué
+    values = structured[variable] if structured.dtype.names else structured
+    if isinstance(values, np.ma.MaskedArray):
+        values = values.filled(np.nan)
+    return np.asarray(values, dtype=np.float32)
+
+
+class RasterStore:
+    """Stockage local des exports : un répertoire par export (data.npy + meta.json).
+
+    Les lectures se font par np.load(mmap_mode='r') : aucune copie, seules les
+    pages effectivement lues sont chargées. Un export n'est visible qu'une fois
+    meta.json écrit, avec "status": "complete".
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()  # meta.json réécrit par les threads de téléchargement
+        self._index = None  # identifiant -> métadonnées, chargé au premier besoin
+
+    def _dir(self, export_id):
+        return os.path.join(self.root, export_id)
+
+    def _load_index(self):
+        if self._index is None:
+            index = {}
+            if os.path.isdir(self.root):
+                for export_id in os.listdir(self.root):
+                    meta = self._read_meta(export_id)
+                    if meta is not None:
+                        index[export_id] = meta
+            self._index = index
+        return self._index
+
+    def _read_meta(self, export_id):
+        try:
+            with open(os.path.join(self._dir(export_id), "meta.json")) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def write_meta(self, export_id, meta):
+        """Écrit (atomiquement) les métadonnées d'un export et met à jour l'index."""
+        directory = self._dir(export_id)
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = os.path.join(directory, "meta.json.tmp")
+        with self._write_lock:
+            with open(tmp_path, 'w') as f:
+                json.dump(meta, f)
+            os.replace(tmp_path, os.path.join(directory, "meta.json"))
+        with self._lock:
+            self._load_index()[export_id] = dict(meta)
+
+    def get(self, export_id):
+        with self._lock:
+            return self._load_index().get(export_id)
+
+    def list(self):
+        with self._lock:
+            return dict(self._load_index())
+
+    def delete(self, export_id):
+        with self._lock:
+            self._load_index().pop(export_id, None)
+        shutil.rmtree(self._dir(export_id), ignore_errors=True)
+
+    def create_array(self, export_id, height, width):
+        """Crée le fichier .npy de l'export (rempli de NaN), ouvert en écriture mappée."""
+        directory = self._dir(export_id)
+        os.makedirs(directory, exist_ok=True)
+        array = np.lib.format.open_memmap(os.path.join(directory, "data.npy"), mode='w+',
+                                          dtype=np.float32, shape=(height, width))
+        array[:] = np.nan
+        return array
+
+    def open_array(self, export_id, writable=False):
+        """Ouvre les données d'un export sans copie (np.memmap), en lecture seule ou en écriture (reprise)."""
+        return np.load(os.path.join(self._dir(export_id), "data.npy"), mmap_mode='r+' if writable else 'r')
+
+    def has_array(self, export_id):
+        return os.path.exists(os.path.join(self._dir(export_id), "data.npy"))
+
+    def path(self, export_id, fmt="npy"):
+        return os.path.join(self._dir(export_id), "data.tif" if fmt == "cog" else "data.npy")
+
+    def find(self, dataset_id, variable, date_str, bounds):
+        """Renvoie l'identifiant d'un export terminé couvrant l'emprise (ouest, sud, est, nord), ou None.
+
+        Parmi les exports qui conviennent, le plus fin (plus petite échelle) est retenu.
+        """
+        west, south, east, north = bounds
+        best = None
+        for export_id, meta in self.list().items():
+            if meta.get("status") != "complete":
+                continue
+            if (meta["dataset"], meta["variable"], meta["date"]) != (dataset_id, variable, date_str):
+                continue
+            r_west, r_south, r_east, r_north = meta["region"]
+            if r_west <= west and r_south <= south and r_east >= east and r_north >= north:
+                if best is None or meta["scale"] < best[1]:
+                    best = (export_id, meta["scale"])
+        return best[0] if best else None
+
+
+class RasterExporter:
+    """Exporte un dataset (variable, date, région, échelle) vers le RasterStore, en blocs téléchargés en parallèle.
+
+    Les exports s'exécutent en arrière-plan (un à la fois par défaut) ; chaque
+    export répartit ses blocs sur chunk_workers threads. Un bloc en erreur
+    transitoire est retenté (au plus retries fois, délai exponentiel avec
+    gigue) ; les blocs terminés sont notés dans meta.json ("chunks_completed"),
+    si bien qu'un export échoué ou interrompu redemandé ne télécharge que les
+    blocs manquants, et qu'un COG demandé après coup est écrit à partir du
+    raster déjà stocké.
+    """
+
+    def __init__(self, store, max_jobs=1, chunk_workers=8, chunk_size=CHUNK_SIZE, retries=CHUNK_RETRIES,
+                 retry_delay=CHUNK_RETRY_DELAY):
+        self.store = store
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self._jobs = ThreadPoolExecutor(max_workers=max_jobs, thread_name_prefix="export")
+        self._chunks = ThreadPoolExecutor(max_workers=chunk_workers, thread_name_prefix="export-chunk")
+        self._lock = threading.Lock()
+        self._running = set()
+
+    def submit(self, dataset_info, variable, date_str, region, scale, fmt="npy"):
+        """Lance l'export en arrière-plan (ou renvoie l'export existant) ; renvoie ses métadonnées."""
+        if np is None:
+            raise DatasetError("Le paquet 'numpy' est requis pour les exports", status=501)
+        if fmt not in FORMATS:
+            raise DatasetError(f"Format d'export inconnu: {fmt} (valeurs possibles: {', '.join(FORMATS)})", status=400)
+        if fmt == "cog" and rasterio is None:
+            raise DatasetError("Le paquet 'rasterio' est requis pour le format COG", status=501)
+        if "asset_type" not in dataset_info:
+            raise DatasetError(f"Traitement non implémenté pour le dataset {dataset_info['id']}", status=501)
+
+        width, height, pixel = grid_for_region(region, scale)
+        if width * height > MAX_EXPORT_PIXELS:
+            raise DatasetError(f"Export trop volumineux: {width}x{height} pixels (maximum {MAX_EXPORT_PIXELS})",
+                               status=400)
+
+        export_id = make_export_id(dataset_info["id"], variable, date_str, region, scale)
+        with self._lock:
+            existing = self.store.get(export_id)
+            if export_id in self._running or (existing and existing["status"] == "complete"
+                                              and fmt in existing["formats"]):
+                return dict(existing, id=export_id)
+
+            if existing and self.store.has_array(export_id) and existing.get("chunk_size") == self.chunk_size:
+                # Reprise (export échoué ou interrompu) ou nouveau format : les blocs stockés sont conservés
+                meta = dict(existing, status="running", resumed_at=time.time())
+                meta.pop("error", None)
+                if fmt not in meta["formats"]:
+                    meta["formats"] = meta["formats"] + [fmt]
+                self.store.write_meta(export_id, meta)
+                self._running.add(export_id)
+                self._jobs.submit(self._run, export_id, dataset_info, variable, date_str, meta)
+                return dict(meta, id=export_id)
+
+            meta = {
+                "dataset": dataset_info["id"],
+                "variable": variable,
+                "date": date_str,
+                "region": list(region),
+                "scale": scale,
+                "pixel_size": pixel,
+                "width": width,
+                "height": height,
+                "formats": ["npy"] + (["cog"] if fmt == "cog" else []),
+                "status": "running",
+                "chunk_size": self.chunk_size,
+                "chunks_done": 0,
+                "chunks_total": math.ceil(width / self.chunk_size) * math.ceil(height / self.chunk_size),
+                "chunks_completed": [],  # Blocs stockés ("ligne:colonne" du coin haut-gauche)
+                "created_at": time.time()
+            }
+            self.store.write_meta(export_id, meta)
+            self._running.add(export_id)
+
+        self._jobs.submit(self._run, export_id, dataset_info, variable, date_str, meta)
+        return dict(meta, id=export_id)
+
+    def _download(self, export_id, image, dataset_id, variable, west, north, pixel, width, height):
+        """Télécharge un bloc, avec nouvelles tentatives sur les erreurs transitoires."""
+        delay = self.retry_delay
+        for attempt in range(self.retries + 1):
+            try:
+                return download_chunk(image, dataset_id, variable, west, north, pixel, width, height)
+            except RETRYABLE_CHUNK_ERRORS as e:
+                if attempt == self.retries:
+                    raise
+                wait_for = random.uniform(0, delay)
+                logger.info(f"Export {export_id}: erreur transitoire sur un bloc ({str(e)}), "
+                            f"nouvelle tentative dans {wait_for:.1f} s")
+                time.sleep(wait_for)
+                delay *= 2
+
+    def _run(self, export_id, dataset_info, variable, date_str, meta):
+        started = time.time()
+        try:
+            completed = set(meta["chunks_completed"])
+            if completed:
+                array = self.store.open_array(export_id, writable=True)
+                logger.info(f"Export {export_id}: reprise, {len(completed)}/{meta['chunks_total']} blocs déjà stockés")
+            else:
+                array = self.store.create_array(export_id, meta["height"], meta["width"])
+            image, _ = build_image(dataset_info, variable, date_str)
+            west, _, _, north = meta["region"]
+            pixel = meta["pixel_size"]
+
+            def fetch(row, col):
+                width = min(self.chunk_size, meta["width"] - col)
+                height = min(self.chunk_size, meta["height"] - row)
+                block = self._download(export_id, image, dataset_info["id"], variable, west + col * pixel,
+                                       north - row * pixel, pixel, width, height)
+                array[row:row + height, col:col + width] = block[:height, :width]
+                with self._lock:
+                    meta["chunks_completed"].append(f"{row}:{col}")
+                    meta["chunks_done"] = len(meta["chunks_completed"])
+                    self.store.write_meta(export_id, meta)
+
+            # Les blocs sont disjoints : écriture concurrente sans verrou dans le fichier mappé
+            futures = [self._chunks.submit(fetch, row, col)
+                       for row in range(0, meta["height"], self.chunk_size)
+                       for col in range(0, meta["width"], self.chunk_size)
+                       if f"{row}:{col}" not in completed]
+            try:
+                for future in futures:
+                    future.result()
+            finally:
+                # Sur échec, attendre les blocs en cours (conservés pour la reprise) sans lancer les suivants
+                for future in futures:
+                    future.cancel()
+                wait(futures)
+                array.flush()
+                del array
+
+            if "cog" in meta["formats"]:
+                write_cog(self.store.path(export_id, "cog"), self.store.open_array(export_id), meta)
+
+            meta.update(status="complete", duration=time.time() - started)
+            logger.info(f"Export {export_id} terminé: {meta['width']}x{meta['height']} pixels "
+                        f"en {meta['duration']:.1f} s")
+        except Exception as e:
+            logger.error(f"Erreur lors de l'export {export_id}: {str(e)}")
+            import traceback
+            logger.error(traceback.format_exc())
+            meta.update(status="failed", error=str(e))
+        finally:
+            self.store.write_meta(export_id, meta)
+            with self._lock:
+                self._running.discard(export_id)
+
+    def shutdown(self):
+        self._jobs.shutdown(wait=False, cancel_futures=True)
+        self._chunks.shutdown(wait=False, cancel_futures=True)
+
+
+def write_cog(path, array, meta):
+    """Écrit le tableau en GeoTIFF optimisé pour le cloud (tuilé, compressé, avec aperçus)."""
+    profile = {
+        "driver": "COG",
+        "dtype": "float32",
+        "count": 1,
+        "width": meta["width"],
+        "height": meta["height"],
+        "crs": "EPSG:4326",
+        "transform": from_origin(meta["region"][0], meta["region"][3], meta["pixel_size"], meta["pixel_size"]),
+        "nodata": float("nan"),
+        "compress": "deflate",
+        "blocksize": 512
+    }
+    tmp_path = path + ".tmp"
+    with rasterio.open(tmp_path, 'w', **profile) as dst:
+        dst.write(np.asarray(array), 1)
+    os.replace(tmp_path, path)
+
+
+def window_for_bounds(meta, bounds):
+    """Fenêtre (ligne début, ligne fin, colonne début, colonne fin) de l'export couvrant l'emprise."""
+    west, south, east, north = bounds
+    r_west, _, _, r_north = meta["region"]
+    pixel = meta["pixel_size"]
+    col0 = max(0, int(math.floor((west - r_west) / pixel)))
+    col1 = min(meta["width"], max(col0 + 1, int(math.ceil((east - r_west) / pixel))))
+    row0 = max(0, int(math.floor((r_north - north) / pixel)))
+    row1 = min(meta["height"], max(row0 + 1, int(math.ceil((r_north - south) / pixel))))
+    return row0, row1, col0, col1
+
+
+def polygon_mask(rings, lons, lats):
+    """Masque booléen des centres de pixels (lons x lats) contenus dans le polygone (règle pair-impair)."""
+    lon_grid, lat_grid = np.meshgrid(lons, lats)
+    inside = np.zeros(lon_grid.shape, dtype=bool)
+    for ring in rings:
+        ring = np.asarray(ring, dtype=float)
+        x0, y0 = ring[:-1, 0], ring[:-1, 1]
+        x1, y1 = ring[1:, 0], ring[1:, 1]
+        for xa, ya, xb, yb in zip(x0, y0, x1, y1):
+            if ya == yb:
+                continue
+            crosses = (ya > lat_grid) != (yb > lat_grid)
+            x_cross = xa + (lat_grid - ya) * (xb - xa) / (yb - ya)
+            inside ^= crosses & (lon_grid < x_cross)
+    return inside
+
+
+def read_region_values(store, export_id, geometry):
+    """Valeurs (1D, NaN compris) des pixels de l'export couverts par la géométrie GeoJSON."""
+    meta = store.get(export_id)
+    array = store.open_array(export_id)
+    pixel = meta["pixel_size"]
+    r_west, _, _, r_north = meta["region"]
+
+    if geometry["type"] == "Point":
+        lon, lat = geometry["coordinates"]
+        row = min(meta["height"] - 1, int((r_north - lat) / pixel))
+        col = min(meta["width"] - 1, int((lon - r_west) / pixel))
+        return np.array([array[row, col]], dtype=float)
+
+    polygons = [geometry["coordinates"]] if geometry["type"] == "Polygon" else geometry["coordinates"]
+    row0, row1, col0, col1 = window_for_bounds(meta, geometry_bounds(geometry))
+    window = array[row0:row1, col0:col1]
+
+    lons = r_west + (np.arange(col0, col1) + 0.5) * pixel
+    lats = r_north - (np.arange(row0, row1) + 0.5) * pixel
+    mask = np.zeros(window.shape, dtype=bool)
+    for polygon in polygons:
+        mask |= polygon_mask(polygon, lons, lats)
+    if not mask.any():
+        # Polygone plus petit qu'un pixel : retenir le pixel de son centre
+        mask[mask.shape[0] // 2, mask.shape[1] // 2] = True
+    return np.asarray(window[mask], dtype=float)
+
+
+def compute_local_stats(dataset_info, variable, geometry, store, export_id):
+    """Statistiques d'une donnée statique (MNT) lues dans un export local, sans appel Earth Engine."""
+    values = read_region_values(store, export_id, geometry)
+    return {
+        "variable_name": get_variable_name(dataset_info, variable),
+        "geometry": geometry,
+        "scale": store.get(export_id)["scale"],
+        "summary": summarize(values),
+        "source": f"export:{export_id}"
+    }
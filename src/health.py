@@ -0,0 +1,99 @@
+# health.py - Sonde périodique de Earth Engine : état, latence et historique servis depuis la mémoire
+import collections
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class HealthMonitor:
+    """Exécute une sonde Earth Engine à intervalle régulier, dans un thread dédié.
+
+    L'état courant est un dictionnaire recalculé après chaque sonde : le lire
+    ne coûte qu'un accès mémoire, quel que soit le nombre de pages ouvertes.
+    Les history_size dernières sondes sont conservées.
+    """
+
+    def __init__(self, probe, interval=60, history_size=60, clock=time.time):
+        self._probe = probe  # Fonction de sonde : lève une exception en cas d'échec
+        self.interval = interval
+        self._clock = clock
+        self._history = collections.deque(maxlen=history_size)
+        self._lock = threading.Lock()
+        self._first_probe = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._status = {"status": "pending", "message": "Vérification de la connexion à Earth Engine en cours"}
+        self.probes = 0
+        self.failures = 0
+
+    def start(self):
+        """Démarre les sondes périodiques (sans effet si elles sont déjà lancées)."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="health", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.probe_now()
+            self._stop.wait(self.interval)
+
+    def probe_now(self):
+        """Exécute une sonde et met à jour l'état ; renvoie le résultat de la sonde."""
+        started = self._clock()
+        timer = time.perf_counter()
+        try:
+            self._probe()
+            ok, error = True, None
+        except Exception as e:
+            ok, error = False, str(e)
+            logger.error(f"Échec de la sonde Earth Engine: {error}")
+        latency_ms = (time.perf_counter() - timer) * 1000.0
+
+        result = {"time": started, "ok": ok, "latency_ms": latency_ms, "error": error}
+        with self._lock:
+            self._history.append(result)
+            self.probes += 1
+            if not ok:
+                self.failures += 1
+            last_success = next((p["time"] for p in reversed(self._history) if p["ok"]), None)
+            self._status = {
+                "status": "success" if ok else "error",
+                "message": "Connexion à Earth Engine réussie!" if ok else f"Échec de la connexion à Earth Engine: {error}",
+                "checked_at": started,
+                "latency_ms": latency_ms,
+                "last_error": error if error else self._status.get("last_error"),
+                "last_success_at": last_success
+            }
+        self._first_probe.set()
+        return result
+
+    def wait_first(self, timeout=None):
+        """Attend le résultat de la première sonde ; renvoie False si le délai expire avant."""
+        return self._first_probe.wait(timeout)
+
+    def status(self):
+        """État courant (dernière sonde), avec son âge en secondes."""
+        status = self._status
+        if "checked_at" in status:
+            status = dict(status, age=self._clock() - status["checked_at"])
+        return status
+
+    def history(self):
+        with self._lock:
+            return list(self._history)
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(p["latency_ms"] for p in self._history)
+        return {
+            "interval": self.interval,
+            "probes": self.probes,
+            "failures": self.failures,
+            "latency_ms_median": latencies[len(latencies) // 2] if latencies else None
+        }
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,184 @@
+# metrics.py - Métriques du processus (compteurs, histogrammes) au format texte Prometheus
+import contextlib
+import threading
+import time
+
+# Bornes des histogrammes de durée (secondes) : de la lecture de cache à l'appel Earth Engine lent
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Métrique étiquetée ; les valeurs sont indexées par le tuple des valeurs d'étiquettes."""
+
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        lines.extend(self._render_samples(items))
+        return lines
+
+    def _render_samples(self, items):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """Jauge ; si collect est fourni, ses valeurs sont lues au moment de l'export."""
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), collect=None):
+        super().__init__(name, documentation, labelnames)
+        self._collect = collect  # Fonction -> {tuple des valeurs d'étiquettes: valeur}
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def render(self):
+        if self._collect is not None:
+            values = self._collect()
+            with self._lock:
+                self._values = dict(values)
+        return super().render()
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]  # [compteurs par borne, somme, total]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """Mesure la durée du bloc (y compris en cas d'exception)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_samples(self, items):
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(float(bound))))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', '+Inf'))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    """Ensemble des métriques d'un processus (chaque worker expose les siennes)."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), collect=None):
+        return self.register(Gauge(name, documentation, labelnames, collect))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """Exporte toutes les métriques au format texte Prometheus (version 0.0.4)."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Étapes du pipeline (analyse de date, filtrage, appels Earth Engine, cache...)
+STAGE_SECONDS = REGISTRY.histogram(
+    "terrasight_stage_seconds", "Durée de chaque étape du pipeline d'image", ("stage", "dataset", "variable"))
+EE_CALLS = REGISTRY.counter(
+    "terrasight_ee_calls_total", "Appels Earth Engine (allers-retours)", ("method", "dataset"))
+EE_ERRORS = REGISTRY.counter(
+    "terrasight_ee_errors_total", "Appels Earth Engine en erreur", ("method", "dataset"))
+EE_RETRIES = REGISTRY.counter(
+    "terrasight_ee_retries_total", "Nouvelles tentatives après une erreur transitoire", ("method", "dataset"))
+EE_REJECTED = REGISTRY.counter(
+    "terrasight_ee_rejected_total", "Appels refusés (limite de débit, disjoncteur ouvert)", ("method", "dataset"))
+EE_CALL_SECONDS = REGISTRY.histogram(
+    "terrasight_ee_call_seconds", "Durée des appels Earth Engine", ("method", "dataset"))
+CACHE_LOOKUPS = REGISTRY.counter(
+    "terrasight_cache_lookups_total", "Consultations du cache de résultats par type de clé", ("kind", "result"))
+PIPELINE_ERRORS = REGISTRY.counter(
+    "terrasight_pipeline_errors_total", "Calculs en échec par dataset et code HTTP", ("dataset", "status"))
+WARMUP_TASKS = REGISTRY.counter(
+    "terrasight_warmup_tasks_total", "Tâches de préchauffage exécutées", ("kind", "result"))
+HTTP_REQUESTS = REGISTRY.counter(
+    "terrasight_http_requests_total", "Requêtes HTTP par route et code de réponse", ("route", "method", "status"))
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "terrasight_http_request_seconds", "Durée des requêtes HTTP par route", ("route",))
+
+
+@contextlib.contextmanager
+def stage(name, dataset="", variable=""):
+    """Mesure une étape du pipeline, étiquetée par dataset et variable."""
+    with STAGE_SECONDS.time(stage=name, dataset=dataset, variable=variable):
+        yield
+
@@ -0,0 +1,374 @@
+# processor.py - Moteur de traitement déclaratif des datasets Earth Engine
+import datetime
+import logging
+
+import ee
+
+from ee_gateway import ee_call
+from metrics import stage
+
+logger = logging.getLogger(__name__)
+
+# Paramètres de miniature par défaut (surchargeables par dataset via "thumbnail")
+DEFAULT_THUMBNAIL = {
+    "dimensions": "1200x800",
+    "format": "png"
+}
+
+# Paramètres d'animation par défaut (surchargeables par dataset via "animation")
+DEFAULT_ANIMATION = {
+    "dimensions": 600,
+    "frames_per_second": 4,
+    "format": "gif"
+}
+MAX_ANIMATION_FRAMES = 92  # Nombre maximal de jours (images) par animation
+MIN_ANIMATION_DIMENSIONS = 64  # Taille minimale (pixels) d'une animation réduite faute de place
+# Animation refusée par Earth Engine car trop volumineuse (messages en minuscules)
+TOO_LARGE_MESSAGES = ("must be less than or equal to", "too large", "payload size exceeds")
+
+# Stratégies de composition d'une collection filtrée en une seule image
+COMPOSITES = {
+    "first": lambda collection: collection.first(),
+    "mosaic": lambda collection: collection.mosaic(),
+    "mean": lambda collection: collection.mean(),
+    "median": lambda collection: collection.median(),
+    "max": lambda collection: collection.max(),
+    "min": lambda collection: collection.min(),
+    "sum": lambda collection: collection.sum()
+}
+
+# Fenêtres temporelles de composition (alignées sur le calendrier)
+WINDOWS = ("day", "week", "month")
+
+
+class DatasetError(Exception):
+    """Erreur de traitement d'un dataset, renvoyée au client avec un code HTTP."""
+
+    def __init__(self, message, status=500):
+        super().__init__(message)
+        self.status = status
+
+
+class NoDataError(DatasetError):
+    """Aucune image disponible pour la date demandée."""
+
+    def __init__(self, message):
+        # L'interface traite ce cas comme un message, pas comme une erreur serveur
+        super().__init__(message, status=200)
+
+
+# Catalogue compilé de l'application (noms de variables indexés), installé au démarrage par set_catalog
+catalog = None
+
+
+def set_catalog(new_catalog):
+    global catalog
+    catalog = new_catalog
+    return new_catalog
+
+
+def get_variable_name(dataset_info, variable):
+    """Renvoie le nom lisible d'une variable du dataset."""
+    return catalog.variable_name(dataset_info["id"], variable)
+
+
+def variable_label(dataset_info, variable):
+    """Étiquette de métrique d'une variable : son identifiant si elle est au catalogue du dataset, sinon "other".
+
+    Les variables viennent de la requête : non validées, elles donneraient
+    autant de séries de métriques que de valeurs envoyées.
+    """
+    return variable if catalog.has_variable(dataset_info["id"], variable) else "other"
+
+
+def get_date_window(date_str, window="day"):
+    """Renvoie l'intervalle [début, fin) de la fenêtre contenant la date, pour filterDate.
+
+    Les fenêtres sont alignées (semaine du lundi au dimanche, mois calendaire) :
+    toutes les dates d'une même fenêtre donnent le même intervalle, donc le
+    même résultat en cache.
+    """
+    try:
+        date_obj = datetime.datetime.strptime(date_str, '%Y-%m-%d')
+    except ValueError:
+        raise DatasetError(f"Date invalide (format attendu AAAA-MM-JJ): {date_str}", status=400)
+
+    if window == "day":
+        start = date_obj
+        end = date_obj + datetime.timedelta(days=1)
+    elif window == "week":
+        start = date_obj - datetime.timedelta(days=date_obj.weekday())
+        end = start + datetime.timedelta(days=7)
+    elif window == "month":
+        start = date_obj.replace(day=1)
+        end = (start + datetime.timedelta(days=32)).replace(day=1)
+    else:
+        raise DatasetError(f"Fenêtre temporelle inconnue: {window} (valeurs possibles: {', '.join(WINDOWS)})",
+                           status=400)
+    return start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')
+
+
+def get_composite_name(dataset_info, reducer=None):
+    """Renvoie la stratégie de composition à appliquer (celle demandée ou celle du dataset)."""
+    composite_name = reducer or dataset_info.get("composite", "first")
+    if composite_name not in COMPOSITES:
+        raise DatasetError(f"Réducteur inconnu: {composite_name} (valeurs possibles: {', '.join(COMPOSITES)})",
+                           status=400)
+    return composite_name
+
+
+def series_collection(dataset_info, variable=None):
+    """Collection (de la variable, si fournie) restreinte aux images d'une série temporelle.
+
+    "series_filter" du dataset ({propriété: valeur}) écarte les images qui
+    partagent la date d'une autre (ex. GFS : échéances d'un même cycle, seule
+    l'analyse forecast_hours=0 est gardée) ; sans lui, chaque image est une
+    observation.
+    """
+    collection = ee.ImageCollection(dataset_info["id"])
+    for name, value in dataset_info.get("series_filter", {}).items():
+        collection = collection.filter(ee.Filter.eq(name, value))
+    return collection.select(variable) if variable else collection
+
+
+def build_image(dataset_info, variable, date_str, reducer=None, window="day"):
+    """Construit l'image Earth Engine (non évaluée) d'un dataset pour une variable et une date.
+
+    Pour les collections, les images de la fenêtre (jour, semaine ou mois)
+    contenant la date sont réduites par `reducer` (par défaut, la stratégie
+    de composition du dataset), après le filtre de série du dataset (GFS :
+    analyses seules, pas la moyenne de toutes les échéances).
+
+    Renvoie (image, collection) ; collection vaut None pour les données statiques.
+    Aucun appel à Earth Engine n'est effectué ici.
+    """
+    dataset_id = dataset_info["id"]
+    label = dataset_info.get("short_name", dataset_id)
+
+    # Données statiques (MNT) : une seule image, pas de date
+    if dataset_info["asset_type"] == "Image":
+        return ee.Image(dataset_id).select(variable), None
+
+    if not date_str:
+        raise DatasetError(f"Date requise pour le dataset {label}", status=400)
+
+    composite = COMPOSITES[get_composite_name(dataset_info, reducer)]
+    with stage("date_parse", dataset_id, variable_label(dataset_info, variable)):
+        start_date, end_date = get_date_window(date_str, window)
+    with stage("collection_filter", dataset_id, variable_label(dataset_info, variable)):
+        collection = series_collection(dataset_info, variable).filterDate(start_date, end_date)
+        image = composite(collection)
+
+    return image, collection
+
+
+def get_thumbnail_defaults(dataset_info):
+    """Renvoie les paramètres de miniature du dataset complétés par les valeurs par défaut."""
+    return dict(DEFAULT_THUMBNAIL, **dataset_info.get("thumbnail", {}))
+
+
+def get_thumb_params(dataset_info, vis_params, region=None, dimensions=None):
+    """Construit les paramètres de getThumbURL à partir des valeurs par défaut du dataset."""
+    thumbnail = get_thumbnail_defaults(dataset_info)
+    region = region or dataset_info["default_region"]
+
+    thumb_params = {
+        'dimensions': dimensions or thumbnail["dimensions"],
+        'format': thumbnail["format"],
+        'min': vis_params['min'],
+        'max': vis_params['max'],
+        'palette': vis_params['palette'],
+        'region': ee.Geometry.Rectangle(region).toGeoJSON()
+    }
+
+    # gamma n'est accepté par Earth Engine qu'en l'absence de palette
+    if 'gamma' in vis_params and 'palette' not in vis_params:
+        thumb_params['gamma'] = vis_params['gamma']
+
+    return thumb_params
+
+
+def get_map_vis_params(vis_params):
+    """Paramètres de visualisation acceptés par getMapId."""
+    map_params = {
+        'min': vis_params['min'],
+        'max': vis_params['max'],
+        'palette': vis_params['palette']
+    }
+    if 'gamma' in vis_params and 'palette' not in vis_params:
+        map_params['gamma'] = vis_params['gamma']
+    return map_params
+
+
+def _request_image(dataset_info, variable, collection, date_str, method, request):
+    """Exécute une requête Earth Engine (method) sur l'image en un seul aller-retour.
+
+    Une collection vide donne une image nulle que Earth Engine rejette ; la
+    taille n'est vérifiée que sur ce chemin d'erreur.
+    """
+    dataset_id = dataset_info["id"]
+    try:
+        with stage(method, dataset_id, variable_label(dataset_info, variable)):
+            return ee_call(method, dataset_id, request)
+    except ee.EEException:
+        if collection is None:
+            raise
+        with stage("size_check", dataset_id, variable_label(dataset_info, variable)):
+            size = ee_call("size", dataset_id, collection.size().getInfo)
+        if size == 0:
+            label = dataset_info.get("short_name", dataset_info["id"])
+            logger.info(f"Aucune image {label} trouvée pour la date {date_str}")
+            raise NoDataError(f"Aucune donnée {label} disponible pour cette date: {date_str}.")
+        raise
+
+
+def _describe_composite(dataset_info, date_str, reducer, window):
+    """Décrit la composition appliquée (réducteur et fenêtre), pour les réponses de l'API."""
+    if dataset_info["asset_type"] != "ImageCollection" or (reducer is None and window == "day"):
+        return None
+    start_date, end_date = get_date_window(date_str, window)
+    return {
+        "reducer": get_composite_name(dataset_info, reducer),
+        "window": window,
+        "start": start_date,
+        "end": end_date
+    }
+
+
+def process_dataset(dataset_info, variable, date_str, vis_params, region=None, dimensions=None,
+                    reducer=None, window="day"):
+    """Génère l'URL de miniature d'un dataset ; lève DatasetError en cas d'échec."""
+    if "asset_type" not in dataset_info:
+        raise DatasetError(f"Traitement non implémenté pour le dataset {dataset_info['id']}", status=501)
+
+    image, collection = build_image(dataset_info, variable, date_str, reducer, window)
+    thumb_params = get_thumb_params(dataset_info, vis_params, region, dimensions)
+    image_url = _request_image(dataset_info, variable, collection, date_str, "getThumbURL",
+                               lambda: image.getThumbURL(thumb_params))
+
+    result = {
+        "image_url": image_url,
+        "vis_params": vis_params,
+        "variable_name": get_variable_name(dataset_info, variable)
+    }
+    composite = _describe_composite(dataset_info, date_str, reducer, window)
+    if composite:
+        result["composite"] = composite
+    return result
+
+
+def process_tiles(dataset_info, variable, date_str, vis_params, reducer=None, window="day"):
+    """Crée un identifiant de carte Earth Engine et renvoie le gabarit d'URL de tuiles XYZ."""
+    if "asset_type" not in dataset_info:
+        raise DatasetError(f"Traitement non implémenté pour le dataset {dataset_info['id']}", status=501)
+
+    image, collection = build_image(dataset_info, variable, date_str, reducer, window)
+    map_params = get_map_vis_params(vis_params)
+    map_id = _request_image(dataset_info, variable, collection, date_str, "getMapId",
+                            lambda: image.getMapId(map_params))
+
+    result = {
+        "tile_url": map_id["tile_fetcher"].url_format,
+        "vis_params": vis_params,
+        "variable_name": get_variable_name(dataset_info, variable)
+    }
+    composite = _describe_composite(dataset_info, date_str, reducer, window)
+    if composite:
+        result["composite"] = composite
+    return result
+
+
+def get_animation_defaults(dataset_info):
+    """Renvoie les paramètres d'animation du dataset complétés par les valeurs par défaut."""
+    return dict(DEFAULT_ANIMATION, **dataset_info.get("animation", {}))
+
+
+def build_daily_frames(dataset_info, collection, start_date, n_days):
+    """Compose une image par jour à partir d'une collection infra-quotidienne (GFS, GOES-16).
+
+    La collection doit déjà être restreinte par series_collection (une image
+    par date). Les jours sans image sont écartés côté serveur. Pour la
+    stratégie "first", une mosaïque triée par date décroissante donne la
+    première image du jour sans échouer sur un jour vide.
+    """
+    composite_name = dataset_info.get("composite", "first")
+    start = ee.Date(start_date)
+
+    def frame(offset):
+        day_start = start.advance(offset, 'day')
+        day = collection.filterDate(day_start, day_start.advance(1, 'day'))
+        if composite_name == "first":
+            image = day.sort('system:time_start', False).mosaic()
+        else:
+            image = COMPOSITES[composite_name](day)
+        return image.set('system:time_start', day_start.millis()).set('frame_size', day.size())
+
+    frames = ee.ImageCollection.fromImages(ee.List.sequence(0, n_days - 1).map(frame))
+    return frames.filter(ee.Filter.gt('frame_size', 0))
+
+
+def process_animation(dataset_info, variable, start_date, end_date, vis_params,
+                      region=None, dimensions=None, frames_per_second=None):
+    """Génère une animation (GIF) d'une image par jour sur [start_date, end_date], en un seul appel Earth Engine."""
+    label = dataset_info.get("short_name", dataset_info["id"])
+    if dataset_info.get("asset_type") != "ImageCollection":
+        raise DatasetError(f"Animation impossible pour le dataset statique {label}", status=400)
+
+    start, _ = get_date_window(start_date)
+    _, end_exclusive = get_date_window(end_date)
+    n_days = (datetime.datetime.strptime(end_exclusive, '%Y-%m-%d')
+              - datetime.datetime.strptime(start, '%Y-%m-%d')).days
+    if n_days < 1:
+        raise DatasetError("La date de fin doit être postérieure à la date de début", status=400)
+    if n_days > MAX_ANIMATION_FRAMES:
+        raise DatasetError(f"Intervalle trop long (maximum {MAX_ANIMATION_FRAMES} jours)", status=400)
+
+    # Filtre de série avant la composition : sinon l'image "first" d'un jour GFS serait une échéance
+    # quelconque du cycle (toutes partagent la date du cycle)
+    collection = series_collection(dataset_info, variable).filterDate(start, end_exclusive)
+    # Les datasets quotidiens ont déjà une image par jour
+    if dataset_info.get("temporal_resolution") != "daily":
+        collection = build_daily_frames(dataset_info, collection, start, n_days)
+
+    map_params = get_map_vis_params(vis_params)
+    frames = collection.map(lambda image: image.visualize(**map_params))
+
+    animation = get_animation_defaults(dataset_info)
+    video_params = {
+        'dimensions': dimensions or animation["dimensions"],
+        'region': ee.Geometry.Rectangle(region or dataset_info["default_region"]).toGeoJSON(),
+        'framesPerSecond': frames_per_second or animation["frames_per_second"],
+        'format': animation["format"]
+    }
+
+    while True:
+        try:
+            with stage("getVideoThumbURL", dataset_info["id"], variable_label(dataset_info, variable)):
+                animation_url = ee_call("getVideoThumbURL", dataset_info["id"],
+                                        lambda: frames.getVideoThumbURL(video_params))
+            break
+        except ee.EEException as e:
+            # Animation trop volumineuse : nouvel essai à dimensions réduites de moitié
+            too_large = any(pattern in str(e).lower() for pattern in TOO_LARGE_MESSAGES)
+            if too_large and video_params['dimensions'] > MIN_ANIMATION_DIMENSIONS:
+                reduced = max(MIN_ANIMATION_DIMENSIONS, video_params['dimensions'] // 2)
+                logger.info(f"Animation {label} trop volumineuse en {video_params['dimensions']} pixels, "
+                            f"nouvel essai en {reduced} pixels")
+                video_params['dimensions'] = reduced
+                continue
+            # Collection vide : vérifiée uniquement sur ce chemin d'erreur
+            with stage("size_check", dataset_info["id"], variable_label(dataset_info, variable)):
+                size = ee_call("size", dataset_info["id"], frames.size().getInfo)
+            if size == 0:
+                raise NoDataError(f"Aucune donnée {label} disponible entre le {start_date} et le {end_date}.")
+            raise
+
+    return {
+        "animation_url": animation_url,
+        "vis_params": vis_params,
+        "variable_name": get_variable_name(dataset_info, variable),
+        "start": start_date,
+        "end": end_date,
+        "days": n_days,
+        "dimensions": video_params['dimensions']
+    }
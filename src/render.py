@@ -0,0 +1,132 @@
+# render.py - Rendu local des rasters : normalisation NumPy, table de couleurs et encodage PNG
+import functools
+import struct
+import zlib
+
+try:
+    import numpy as np
+except ImportError:  # Dépendance optionnelle, requise uniquement pour le rendu local
+    np = None
+
+from processor import DatasetError
+
+LUT_SIZE = 255  # Couleurs de la palette interpolée ; l'indice 255 est réservé aux pixels sans donnée
+NODATA_INDEX = 255
+PNG_COMPRESSION_LEVEL = 6
+
+# Couleurs nommées CSS acceptées par Earth Engine dans les palettes
+NAMED_COLORS = {
+    "black": "000000", "white": "ffffff", "red": "ff0000", "lime": "00ff00", "blue": "0000ff",
+    "yellow": "ffff00", "cyan": "00ffff", "aqua": "00ffff", "magenta": "ff00ff", "fuchsia": "ff00ff",
+    "silver": "c0c0c0", "gray": "808080", "grey": "808080", "maroon": "800000", "olive": "808000",
+    "green": "008000", "purple": "800080", "teal": "008080", "navy": "000080", "orange": "ffa500",
+    "brown": "a52a2a", "pink": "ffc0cb", "gold": "ffd700", "violet": "ee82ee", "indigo": "4b0082",
+    "darkblue": "00008b", "darkgreen": "006400", "darkred": "8b0000", "lightblue": "add8e6",
+    "lightgreen": "90ee90", "lightgray": "d3d3d3", "lightgrey": "d3d3d3", "darkgray": "a9a9a9",
+    "darkgrey": "a9a9a9", "beige": "f5f5dc", "tan": "d2b48c", "khaki": "f0e68c", "coral": "ff7f50",
+    "salmon": "fa8072", "turquoise": "40e0d0", "skyblue": "87ceeb", "steelblue": "4682b4",
+    "royalblue": "4169e1", "forestgreen": "228b22", "seagreen": "2e8b57", "crimson": "dc143c",
+    "orangered": "ff4500", "darkorange": "ff8c00", "chocolate": "d2691e", "sienna": "a0522d"
+}
+
+
+def parse_color(color):
+    """Convertit une couleur de palette (nom CSS, RRGGBB, RGB, avec ou sans #) en (r, g, b)."""
+    value = str(color).strip().lower().lstrip('#')
+    value = NAMED_COLORS.get(value, value)
+    if len(value) == 3:
+        value = "".join(c * 2 for c in value)
+    try:
+        if len(value) != 6:
+            raise ValueError()
+        return tuple(int(value[i:i + 2], 16) for i in (0, 2, 4))
+    except ValueError:
+        raise DatasetError(f"Couleur de palette invalide: {color}", status=400)
+
+
+@functools.lru_cache(maxsize=256)
+def build_lut(palette):
+    """Table de LUT_SIZE couleurs RGB (uint8) interpolées linéairement entre les couleurs de la palette."""
+    stops = np.array([parse_color(c) for c in palette], dtype=float)
+    if len(stops) == 1:
+        return np.repeat(stops.astype(np.uint8), LUT_SIZE, axis=0)
+    positions = np.linspace(0, len(stops) - 1, LUT_SIZE)
+    lut = np.empty((LUT_SIZE, 3))
+    for channel in range(3):
+        lut[:, channel] = np.interp(positions, np.arange(len(stops)), stops[:, channel])
+    lut = np.round(lut).astype(np.uint8)
+    lut.flags.writeable = False  # Partagée entre les appels (lru_cache)
+    return lut
+
+
+def colormap_indices(values, vmin, vmax):
+    """Indices de couleur (uint8) des valeurs normalisées entre vmin et vmax ; NODATA_INDEX pour NaN."""
+    values = np.asarray(values, dtype=np.float32)
+    span = (vmax - vmin) or 1.0
+    with np.errstate(invalid='ignore'):
+        normalized = (values - vmin) * ((LUT_SIZE - 1) / span)
+        np.clip(normalized, 0, LUT_SIZE - 1, out=normalized)
+    indices = np.rint(normalized).astype(np.uint8)
+    indices[np.isnan(values)] = NODATA_INDEX
+    return indices
+
+
+def encode_png(indices, lut):
+    """Encode une image indexée (uint8, hauteur x largeur) en PNG à palette, les pixels sans donnée transparents.
+
+    Une image à palette occupe un octet par pixel : l'encodage (zlib) est
+    environ quatre fois plus rapide et le fichier plus léger qu'en RGBA.
+    """
+    height, width = indices.shape
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff)
+
+    palette = np.zeros((NODATA_INDEX + 1, 3), dtype=np.uint8)
+    palette[:len(lut)] = lut
+    transparency = bytes([255] * NODATA_INDEX + [0])
+
+    # Chaque ligne est précédée de son type de filtre (0 : aucun)
+    raw = np.empty((height, width + 1), dtype=np.uint8)
+    raw[:, 0] = 0
+    raw[:, 1:] = indices
+
+    return b"".join([
+        b"\x89PNG\r\n\x1a\n",
+        chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 3, 0, 0, 0)),
+        chunk(b"PLTE", palette.tobytes()),
+        chunk(b"tRNS", transparency),
+        chunk(b"IDAT", zlib.compress(raw.tobytes(), PNG_COMPRESSION_LEVEL)),
+        chunk(b"IEND", b"")
+    ])
+
+
+def fit_dimensions(dimensions, width, height):
+    """Taille de sortie respectant les proportions, dans la limite de dimensions ("LxH" ou côté maximal)."""
+    dimensions = str(dimensions)
+    if "x" in dimensions:
+        max_width, max_height = (int(v) for v in dimensions.split("x"))
+    else:
+        max_width = max_height = int(dimensions)
+    ratio = min(max_width / width, max_height / height)
+    return max(1, int(round(width * ratio))), max(1, int(round(height * ratio)))
+
+
+def resample(array, out_width, out_height):
+    """Rééchantillonnage au plus proche voisin (lecture des seuls pixels utiles d'un memmap)."""
+    height, width = array.shape
+    rows = ((np.arange(out_height) + 0.5) * height / out_height).astype(np.intp)
+    cols = ((np.arange(out_width) + 0.5) * width / out_width).astype(np.intp)
+    return np.asarray(array[rows[:, None], cols[None, :]])
+
+
+def render_png(array, vis_params, dimensions=None):
+    """Rend un raster (2D, NaN = sans donnée) en PNG selon vis_params (min, max, palette)."""
+    if np is None:
+        raise DatasetError("Le paquet 'numpy' est requis pour le rendu local", status=501)
+    if dimensions:
+        out_width, out_height = fit_dimensions(dimensions, array.shape[1], array.shape[0])
+        array = resample(array, out_width, out_height)
+    lut = build_lut(tuple(vis_params.get('palette') or ('000000', 'ffffff')))
+    indices = colormap_indices(array, float(vis_params.get('min', 0)), float(vis_params.get('max', 1)))
+    return encode_png(indices, lut)
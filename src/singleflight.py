@@ -0,0 +1,99 @@
+# singleflight.py - Regroupement des calculs identiques simultanés (single-flight)
+import asyncio
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Une seule exécution à la fois par clé : les appels concurrents identiques partagent son résultat.
+
+    Le premier appelant (le « meneur ») exécute la fonction ; les suivants
+    attendent la fin de ce calcul et reçoivent le même résultat, ou la même
+    exception. Rien n'est mémorisé une fois le calcul terminé : c'est le rôle
+    du cache.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.shared = 0
+
+    def do(self, key, fn):
+        """Exécute fn() pour la clé, ou attend le calcul déjà en cours pour cette clé."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self.leaders += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def in_flight(self):
+        return len(self._calls)
+
+    def stats(self):
+        return {"in_flight": self.in_flight(), "leaders": self.leaders, "shared": self.shared}
+
+
+class AsyncSingleFlight:
+    """Équivalent asyncio de SingleFlight : les suivants attendent sans occuper de thread.
+
+    Le calcul partagé n'est annulé que lorsque tous ses demandeurs ont été
+    annulés (par exemple quand tous les clients se sont déconnectés).
+    """
+
+    def __init__(self):
+        self._flights = {}  # clé -> [future, nombre de demandeurs]
+        self.leaders = 0
+        self.shared = 0
+
+    async def do(self, key, coroutine_fn):
+        """Exécute await coroutine_fn() pour la clé, ou attend le calcul déjà en cours."""
+        flight = self._flights.get(key)
+        if flight is None:
+            self.leaders += 1
+            future = asyncio.ensure_future(coroutine_fn())
+            flight = [future, 0]
+            self._flights[key] = flight
+            future.add_done_callback(lambda _: self._flights.pop(key, None))
+        else:
+            self.shared += 1
+
+        future = flight[0]
+        flight[1] += 1
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            flight[1] -= 1
+            if flight[1] == 0 and not future.done():
+                future.cancel()
+            raise
+
+    def stats(self):
+        return {"in_flight": len(self._flights), "leaders": self.leaders, "shared": self.shared}
@@ -0,0 +1,297 @@
+# stats.py - Statistiques ponctuelles et zonales : un appel Earth Engine, post-traitement NumPy local
+import datetime
+import json
+import logging
+import math
+
+import ee
+
+try:
+    import numpy as np
+except ImportError:  # Dépendance optionnelle, requise uniquement pour /api/stats
+    np = None
+
+from ee_gateway import ee_call
+from metrics import stage
+from processor import DatasetError, NoDataError, get_variable_name, series_collection, variable_label
+
+logger = logging.getLogger(__name__)
+
+# Limite de getRegion : pixels x bandes x images par requête
+MAX_REGION_VALUES = 1048576
+MAX_STATS_DAYS = 3660  # Intervalle maximal d'une série (environ 10 ans)
+PERCENTILES = (5, 25, 50, 75, 95)
+METERS_PER_DEGREE = 111320.0
+
+
+def parse_geometry(args):
+    """Lit la géométrie demandée : point=lon,lat, bbox=ouest,sud,est,nord ou geometry=<GeoJSON>.
+
+    Renvoie un dictionnaire GeoJSON (Point ou Polygon/MultiPolygon) ; lève DatasetError (400).
+    """
+    try:
+        if args.get('point'):
+            lon, lat = (float(v) for v in args.get('point').split(','))
+            geometry = {"type": "Point", "coordinates": [lon, lat]}
+        elif args.get('bbox'):
+            west, south, east, north = (float(v) for v in args.get('bbox').split(','))
+            if west >= east or south >= north:
+                raise ValueError("bbox vide")
+            geometry = {"type": "Polygon", "coordinates": [[
+                [west, south], [east, south], [east, north], [west, north], [west, south]
+            ]]}
+        elif args.get('geometry'):
+            geometry = json.loads(args.get('geometry'))
+            if geometry.get("type") == "Feature":
+                geometry = geometry["geometry"]
+            if geometry.get("type") not in ("Point", "Polygon", "MultiPolygon"):
+                raise ValueError(f"type de géométrie non pris en charge: {geometry.get('type')}")
+        else:
+            raise DatasetError("Paramètre point, bbox ou geometry requis", status=400)
+        lons, lats = _coordinates(geometry)
+        if not all(-180 <= lon <= 180 for lon in lons) or not all(-90 <= lat <= 90 for lat in lats):
+            raise ValueError("coordonnées hors limites")
+    except (ValueError, TypeError, KeyError, AttributeError) as e:
+        raise DatasetError(f"Géométrie invalide: {str(e)}", status=400)
+    return geometry
+
+
+def _coordinates(geometry):
+    """Renvoie (longitudes, latitudes) de tous les sommets d'une géométrie GeoJSON.
+
+    Lève ValueError si la structure ne correspond pas au type (position à moins de
+    deux nombres, anneau à moins de quatre positions, géométrie sans sommet).
+    """
+    coords = geometry["coordinates"]
+    if geometry["type"] == "Point":
+        points = [coords]
+    elif geometry["type"] == "Polygon":
+        points = _polygon_points(coords)
+    else:
+        if not isinstance(coords, list) or not coords:
+            raise ValueError("MultiPolygon sans polygone")
+        points = [p for polygon in coords for p in _polygon_points(polygon)]
+    for p in points:
+        if not isinstance(p, list) or len(p) < 2:
+            raise ValueError(f"position invalide: {p}")
+    return [float(p[0]) for p in points], [float(p[1]) for p in points]
+
+
+def _polygon_points(rings):
+    """Sommets d'un polygone GeoJSON (liste d'anneaux d'au moins quatre positions)."""
+    if not isinstance(rings, list) or not rings:
+        raise ValueError("polygone sans anneau")
+    for ring in rings:
+        if not isinstance(ring, list) or len(ring) < 4:
+            raise ValueError("anneau à moins de quatre positions")
+    return [p for ring in rings for p in ring]
+
+
+def geometry_bounds(geometry):
+    """Emprise (ouest, sud, est, nord) d'une géométrie GeoJSON."""
+    lons, lats = _coordinates(geometry)
+    return min(lons), min(lats), max(lons), max(lats)
+
+
+def geometry_area_m2(geometry):
+    """Surface approchée (m²) de l'emprise de la géométrie ; 0 pour un point."""
+    if geometry["type"] == "Point":
+        return 0.0
+    west, south, east, north = geometry_bounds(geometry)
+    mean_lat = math.radians((south + north) / 2)
+    width = (east - west) * METERS_PER_DEGREE * math.cos(mean_lat)
+    height = (north - south) * METERS_PER_DEGREE
+    return abs(width * height)
+
+
+def to_ee_geometry(geometry):
+    return ee.Geometry(geometry)
+
+
+def count_days(start_date, end_date):
+    """Nombre de jours de l'intervalle [start_date, end_date] ; lève DatasetError (400)."""
+    try:
+        start = datetime.datetime.strptime(start_date, '%Y-%m-%d')
+        end = datetime.datetime.strptime(end_date, '%Y-%m-%d')
+    except ValueError:
+        raise DatasetError("Dates invalides (format attendu AAAA-MM-JJ)", status=400)
+    days = (end - start).days + 1
+    if days < 1:
+        raise DatasetError("La date de fin doit suivre la date de début", status=400)
+    if days > MAX_STATS_DAYS:
+        raise DatasetError(f"Intervalle trop long: {days} jours (maximum {MAX_STATS_DAYS})", status=400)
+    return days
+
+
+def choose_scale(dataset_info, geometry, images, scale=None):
+    """Choisit l'échelle (m) de l'échantillonnage pour rester sous la limite de getRegion.
+
+    Un point n'échantillonne qu'un pixel par image ; pour une surface, l'échelle
+    est relevée jusqu'à ce que pixels x images tienne dans MAX_REGION_VALUES.
+    """
+    scale = float(scale or dataset_info.get("scale", 1000))
+    if images > MAX_REGION_VALUES:
+        raise DatasetError(f"Trop d'images dans l'intervalle ({images}) : réduisez la période", status=400)
+
+    area = geometry_area_m2(geometry)
+    if area > 0:
+        max_pixels = MAX_REGION_VALUES // images
+        scale = max(scale, math.sqrt(area / max_pixels))
+    return scale
+
+
+def region_table_to_arrays(table, variable):
+    """Transforme la table de getRegion en séries NumPy : (temps en ms, moyenne spatiale, pixels valides).
+
+    La table a une ligne d'en-tête (id, longitude, latitude, time, <bandes>) puis
+    une ligne par pixel et par image ; les pixels masqués valent None.
+    """
+    header = table[0]
+    rows = table[1:]
+    time_col = header.index("time")
+    value_col = header.index(variable)
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty(0), np.empty(0, dtype=np.int64)
+
+    times = np.array([row[time_col] or 0 for row in rows], dtype=np.int64)
+    values = np.array([row[value_col] for row in rows], dtype=float)  # None -> nan
+
+    # Regrouper les pixels par image (date d'acquisition) puis moyenner les pixels valides
+    unique_times, index = np.unique(times, return_inverse=True)
+    valid = ~np.isnan(values)
+    counts = np.bincount(index, weights=valid, minlength=len(unique_times)).astype(np.int64)
+    sums = np.bincount(index, weights=np.where(valid, values, 0.0), minlength=len(unique_times))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+    return unique_times, means, counts
+
+
+def summarize(values):
+    """Statistiques descriptives d'un tableau (les valeurs manquantes sont ignorées)."""
+    valid = values[~np.isnan(values)]
+    if valid.size == 0:
+        return {"count": 0}
+    percentiles = np.percentile(valid, PERCENTILES)
+    return {
+        "count": int(valid.size),
+        "mean": float(valid.mean()),
+        "std": float(valid.std()),
+        "min": float(valid.min()),
+        "max": float(valid.max()),
+        "percentiles": {f"p{p}": float(v) for p, v in zip(PERCENTILES, percentiles)}
+    }
+
+
+def _to_list(values):
+    """Convertit un tableau NumPy en liste JSON (nan -> None)."""
+    return [None if math.isnan(v) else float(v) for v in values.tolist()]
+
+
+def parse_climatology(value):
+    """Lit la période de référence de la climatologie (AAAA-AAAA) ; renvoie (début, fin) ou None."""
+    if not value:
+        return None
+    try:
+        first, last = (int(v) for v in value.split('-'))
+    except ValueError:
+        raise DatasetError(f"Période de climatologie invalide (format attendu AAAA-AAAA): {value}", status=400)
+    if first > last:
+        raise DatasetError(f"Période de climatologie invalide: {value}", status=400)
+    return first, last
+
+
+def fetch_climatology(dataset_info, variable, region, scale, start_date, end_date, years):
+    """Moyenne climatologique sur la même période de l'année, pour les années de référence (un appel)."""
+    start_doy = datetime.datetime.strptime(start_date, '%Y-%m-%d').timetuple().tm_yday
+    end_doy = datetime.datetime.strptime(end_date, '%Y-%m-%d').timetuple().tm_yday
+    first_year, last_year = years
+
+    # calendarRange accepte une fin inférieure au début (période à cheval sur deux années)
+    reference = series_collection(dataset_info, variable) \
+                  .filter(ee.Filter.calendarRange(first_year, last_year, 'year')) \
+                  .filter(ee.Filter.calendarRange(start_doy, end_doy, 'day_of_year'))
+    result = ee_call("reduceRegion", dataset_info["id"], reference.mean().reduceRegion(
+        reducer=ee.Reducer.mean(), geometry=region, scale=scale, bestEffort=True
+    ).getInfo)
+    return result.get(variable)
+
+
+def compute_stats(dataset_info, variable, geometry, start_date, end_date, scale=None, climatology=None):
+    """Série temporelle et statistiques d'une variable sur un point ou une surface.
+
+    Le nombre d'images de l'intervalle est lu sur la collection (échelle
+    adaptée à la limite de getRegion), puis les pixels de toutes les images
+    sont récupérés en un seul appel getRegion et regroupés localement
+    (moyenne spatiale par image).
+    Les anomalies sont calculées par rapport à la climatologie si une période de
+    référence est fournie, sinon par rapport à la moyenne de la série.
+    """
+    if np is None:
+        raise DatasetError("Le paquet 'numpy' est requis pour les statistiques", status=501)
+    if "asset_type" not in dataset_info:
+        raise DatasetError(f"Traitement non implémenté pour le dataset {dataset_info['id']}", status=501)
+
+    region = to_ee_geometry(geometry)
+    result = {
+        "variable_name": get_variable_name(dataset_info, variable),
+        "geometry": geometry
+    }
+
+    # Données statiques (MNT) : distribution des valeurs des pixels de la zone
+    if dataset_info["asset_type"] == "Image":
+        scale = choose_scale(dataset_info, geometry, 1, scale)
+        with stage("getRegion", dataset_info["id"], variable_label(dataset_info, variable)):
+            table = ee_call("getRegion", dataset_info["id"],
+                            ee.Image(dataset_info["id"]).select(variable).getRegion(region, scale).getInfo)
+        header = table[0]
+        pixels = np.array([row[header.index(variable)] for row in table[1:]], dtype=float)
+        result.update(scale=scale, summary=summarize(pixels))
+        return result
+
+    count_days(start_date, end_date)
+    label = dataset_info.get("short_name", dataset_info["id"])
+    end_exclusive = (datetime.datetime.strptime(end_date, '%Y-%m-%d') + datetime.timedelta(days=1)).strftime('%Y-%m-%d')
+    collection = series_collection(dataset_info, variable).filterDate(start_date, end_exclusive)
+    with stage("size_check", dataset_info["id"], variable_label(dataset_info, variable)):
+        images = ee_call("size", dataset_info["id"], collection.size().getInfo)
+    if images == 0:
+        raise NoDataError(f"Aucune donnée {label} disponible entre le {start_date} et le {end_date}.")
+    scale = choose_scale(dataset_info, geometry, images, scale)
+
+    with stage("getRegion", dataset_info["id"], variable_label(dataset_info, variable)):
+        table = ee_call("getRegion", dataset_info["id"], collection.getRegion(region, scale).getInfo)
+
+    with stage("local_reduce", dataset_info["id"], variable_label(dataset_info, variable)):
+        times, means, counts = region_table_to_arrays(table, variable)
+    if times.size == 0:
+        raise NoDataError(f"Aucune donnée {label} disponible entre le {start_date} et le {end_date}.")
+
+    summary = summarize(means)
+    if climatology:
+        baseline = fetch_climatology(dataset_info, variable, region, scale, start_date, end_date, climatology)
+        baseline_source = f"climatology {climatology[0]}-{climatology[1]}"
+    else:
+        baseline = summary.get("mean")
+        baseline_source = "series_mean"
+
+    anomalies = means - baseline if baseline is not None else np.full_like(means, np.nan)
+    std = summary.get("std")
+    with np.errstate(invalid='ignore', divide='ignore'):
+        zscores = anomalies / std if std else np.full_like(means, np.nan)
+
+    result.update({
+        "start": start_date,
+        "end": end_date,
+        "scale": scale,
+        "series": {
+            "time": [t + "Z" for t in np.datetime_as_string(times.astype('datetime64[ms]'), unit='s').tolist()],
+            "value": _to_list(means),
+            "pixels": counts.tolist(),
+            "anomaly": _to_list(anomalies),
+            "zscore": _to_list(zscores)
+        },
+        "summary": summary,
+        "baseline": {"source": baseline_source, "value": baseline}
+    })
+    return result
+
@@ -0,0 +1,157 @@
+# tile_cache.py - Cache disque des tuiles XYZ (répertoires fragmentés, taille bornée)
+import hashlib
+import http.client
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+logger = logging.getLogger(__name__)
+
+EVICTION_TARGET_RATIO = 0.9  # Après éviction, le cache redescend à 90 % de sa taille maximale
+
+
+class TileCache:
+    """Cache de tuiles sur disque, fragmenté sur deux niveaux de répertoires (ab/cd/abcd....png).
+
+    La date de modification d'un fichier est sa date de création (fraîcheur),
+    sa date d'accès sert à l'éviction LRU quand la taille totale dépasse max_bytes.
+    """
+
+    def __init__(self, root, max_bytes=512 * 1024 * 1024, clock=time.time):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()  # Compteurs mis à jour par les threads de requête
+        self._size = None  # Taille totale, calculée au premier besoin
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _path(self, key):
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.root, digest[:2], digest[2:4], digest + ".png")
+
+    def _scan(self):
+        """Liste les fichiers du cache : [(date d'accès, taille, chemin)]."""
+        entries = []
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if not name.endswith(".png"):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_atime, st.st_size, path))
+        return entries
+
+    def _current_size(self):
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._scan())
+        return self._size
+
+    def get(self, key, max_age=None):
+        """Renvoie (contenu, âge en secondes) de la tuile, ou None si absente ou trop ancienne."""
+        path = self._path(key)
+        try:
+            st = os.stat(path)
+            age = self._clock() - st.st_mtime
+            if max_age is not None and age > max_age:
+                self._count("misses")
+                return None
+            with open(path, 'rb') as f:
+                data = f.read()
+            # Mettre à jour la date d'accès (LRU) sans toucher à la date de création
+            os.utime(path, (self._clock(), st.st_mtime))
+        except FileNotFoundError:
+            self._count("misses")
+            return None
+        self._count("hits")
+        return data, age
+
+    def _count(self, counter):
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def put(self, key, data):
+        """Enregistre une tuile (écriture atomique) puis évince si la taille maximale est dépassée."""
+        path = self._path(key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+
+        with self._lock:
+            size = self._current_size()
+            try:
+                size -= os.path.getsize(path)
+            except FileNotFoundError:
+                pass
+            os.replace(tmp_path, path)
+            self._size = size + len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Supprime les tuiles les moins récemment utilisées (verrou déjà pris)."""
+        target = self.max_bytes * EVICTION_TARGET_RATIO
+        entries = sorted(self._scan())
+        size = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, path in entries:
+            if size <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            size -= entry_size
+            self.evictions += 1
+        self._size = size
+        logger.info(f"Éviction du cache de tuiles: {self.evictions} tuiles supprimées au total")
+
+    def stats(self):
+        with self._lock:
+            size = self._current_size()
+        with self._stats_lock:
+            return {
+                "root": self.root,
+                "bytes": size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+
+class TileFetchError(Exception):
+    """Serveur de tuiles injoignable : HTTP 504 si le délai a expiré, 502 sinon."""
+
+    def __init__(self, message, status=502):
+        super().__init__(message)
+        self.status = status
+
+
+def fetch_tile(url, timeout=15):
+    """Télécharge une tuile ; renvoie (code HTTP, contenu).
+
+    Lève TileFetchError si le serveur ne répond pas (délai, connexion refusée ou interrompue).
+    """
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, b""
+    except (urllib.error.URLError, OSError, http.client.HTTPException) as e:
+        reason = getattr(e, "reason", e)
+        if isinstance(reason, (socket.timeout, TimeoutError)):
+            raise TileFetchError(f"Délai dépassé ({timeout} s) pour le serveur de tuiles", status=504) from e
+        raise TileFetchError(f"Serveur de tuiles injoignable: {reason}") from e
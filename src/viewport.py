@@ -0,0 +1,96 @@
+# viewport.py - Emprise et résolution des miniatures adaptées à la fenêtre du client, quantifiées pour le cache
+import math
+
+from processor import DatasetError, get_thumbnail_defaults
+from stats import METERS_PER_DEGREE
+
+GRID_PIXELS = 256  # Côté (pixels) d'une cellule de la grille d'alignement des emprises
+MAX_ZOOM = 24
+MAX_VIEWPORT_PIXELS = 4096  # Taille maximale (par côté) demandée par le client
+MAX_THUMB_PIXELS = 4096  # Taille maximale (par côté) d'une miniature produite
+GLOBAL_COVERAGE = [-180, -90, 180, 90]  # Couverture des datasets sans "coverage" (monde entier)
+
+
+def level_resolution(zoom):
+    """Résolution (degrés par pixel) du niveau zoom : le monde (360°) en GRID_PIXELS * 2^zoom pixels."""
+    return 360.0 / (GRID_PIXELS * 2 ** zoom)
+
+
+def resolution_level(resolution):
+    """Niveau dont la résolution est la plus proche (en échelle logarithmique) de resolution (degrés par pixel)."""
+    return min(MAX_ZOOM, max(0, int(round(math.log2(360.0 / (GRID_PIXELS * resolution))))))
+
+
+def parse_viewport(args, dataset_info):
+    """Lit la fenêtre du client : bbox=ouest,sud,est,nord et sa taille en pixels (width, height).
+
+    Renvoie (emprise, largeur, hauteur), ou None si aucun de ces paramètres
+    n'est fourni (miniature de la région par défaut). Lève DatasetError (400).
+    """
+    if not any(args.get(name) for name in ('bbox', 'width', 'height')):
+        return None
+    try:
+        if args.get('bbox'):
+            west, south, east, north = (float(v) for v in args.get('bbox').split(','))
+        else:
+            west, south, east, north = dataset_info["default_region"]
+        default_width, default_height = (int(v) for v in get_thumbnail_defaults(dataset_info)["dimensions"].split('x'))
+        width = int(args.get('width') or default_width)
+        height = int(args.get('height') or default_height)
+    except (TypeError, ValueError) as e:
+        raise DatasetError(f"Fenêtre invalide (bbox: ouest,sud,est,nord ; width, height: pixels): {str(e)}",
+                           status=400)
+    if west >= east or south >= north:
+        raise DatasetError("Fenêtre invalide: bbox vide", status=400)
+    if west < -180 or east > 180 or south < -90 or north > 90:
+        raise DatasetError("Fenêtre invalide: coordonnées hors limites", status=400)
+    if not (0 < width <= MAX_VIEWPORT_PIXELS and 0 < height <= MAX_VIEWPORT_PIXELS):
+        raise DatasetError(f"Fenêtre invalide: largeur et hauteur entre 1 et {MAX_VIEWPORT_PIXELS} pixels",
+                           status=400)
+    return [west, south, east, north], width, height
+
+
+def quantize_viewport(dataset_info, bbox, width, height):
+    """Choisit l'emprise et les dimensions de la miniature pour une fenêtre du client.
+
+    La résolution est ramenée au niveau de zoom le plus proche (puissances de
+    deux), sans descendre sous la résolution native du dataset ; l'emprise est
+    élargie aux cellules de GRID_PIXELS pixels de ce niveau puis limitée à la
+    couverture du dataset ("coverage", le monde entier par défaut ; pas sa
+    région d'affichage par défaut). Des fenêtres voisines (déplacement de
+    quelques pixels, zoom proche) produisent ainsi la même emprise, les mêmes
+    dimensions et donc la même clé de cache.
+    """
+    west, south, east, north = bbox
+    r_west, r_south, r_east, r_north = dataset_info.get("coverage", GLOBAL_COVERAGE)
+
+    requested = max((east - west) / width, (north - south) / height)
+    zoom = resolution_level(requested)
+    native = dataset_info.get("scale")
+    if native:
+        # Au-delà de la résolution native, Earth Engine ne ferait qu'agrandir les pixels
+        zoom = min(zoom, int(math.ceil(math.log2(360.0 * METERS_PER_DEGREE / (GRID_PIXELS * native)))))
+
+    while True:
+        resolution = level_resolution(zoom)
+        cell = GRID_PIXELS * resolution
+        region = [
+            max(r_west, math.floor(west / cell) * cell),
+            max(r_south, math.floor(south / cell) * cell),
+            min(r_east, math.ceil(east / cell) * cell),
+            min(r_north, math.ceil(north / cell) * cell)
+        ]
+        if region[0] >= region[2] or region[1] >= region[3]:
+            raise DatasetError("Fenêtre hors de la couverture du dataset", status=400)
+        out_width = max(1, int(round((region[2] - region[0]) / resolution)))
+        out_height = max(1, int(round((region[3] - region[1]) / resolution)))
+        if max(out_width, out_height) <= MAX_THUMB_PIXELS or zoom == 0:
+            break
+        zoom -= 1
+
+    return {
+        "region": [round(v, 10) for v in region],
+        "dimensions": f"{out_width}x{out_height}",
+        "zoom": zoom,
+        "scale": round(resolution * METERS_PER_DEGREE, 3)  # Mètres par pixel à l'équateur
+    }
@@ -0,0 +1,276 @@
+# warmup.py - Pré-calcul en arrière-plan des résultats prévisibles (valeurs par défaut, cycles GFS, jeu chaud)
+import datetime
+import heapq
+import itertools
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+
+from metrics import WARMUP_TASKS
+
+logger = logging.getLogger(__name__)
+
+# Priorités (la plus petite d'abord)
+PRIORITY_PINNED = 0  # Valeurs par défaut des datasets et nouvelles prévisions
+PRIORITY_WARM = 1  # Jeu chaud, d'après les accès récents
+
+
+def next_run_at(now, hours, delay=0):
+    """Prochain instant (timestamp) correspondant à l'une des heures UTC données, décalée de delay secondes.
+
+    Ex. cycles GFS : hours=(0, 6, 12, 18), delay=4.5 * 3600 (publication environ 4 h 30 après le cycle).
+    """
+    today = datetime.datetime.fromtimestamp(now, datetime.timezone.utc).replace(hour=0, minute=0, second=0,
+                                                                                microsecond=0)
+    for day in (today - datetime.timedelta(days=1), today, today + datetime.timedelta(days=1)):
+        for hour in sorted(hours):
+            at = (day + datetime.timedelta(hours=hour, seconds=delay)).timestamp()
+            if at > now:
+                return at
+    return now + 24 * 3600
+
+
+def every(interval):
+    """Planification à intervalle fixe (secondes)."""
+    return lambda now: now + interval
+
+
+class AccessStats:
+    """Fréquence récente des requêtes préchauffables, avec décroissance exponentielle.
+
+    Chaque accès ajoute 1 au score de la tâche ; les scores sont divisés par
+    deux toutes les half_life secondes. Au-delà de max_tracked tâches suivies,
+    les moins fréquentes sont oubliées.
+    """
+
+    def __init__(self, half_life=24 * 3600, max_tracked=1000, clock=time.time):
+        self.half_life = half_life
+        self.max_tracked = max_tracked
+        self._clock = clock
+        self._scores = {}  # tâche -> (score, instant du dernier accès)
+        self._lock = threading.Lock()
+
+    def _decayed(self, score, last, now):
+        return score * 0.5 ** ((now - last) / self.half_life)
+
+    def record(self, task):
+        now = self._clock()
+        with self._lock:
+            score, last = self._scores.get(task, (0.0, now))
+            self._scores[task] = (self._decayed(score, last, now) + 1.0, now)
+            if len(self._scores) > self.max_tracked:
+                coldest = min(self._scores, key=lambda t: self._decayed(*self._scores[t], now))
+                del self._scores[coldest]
+
+    def top(self, n):
+        """Les n tâches les plus demandées récemment, avec leur score."""
+        now = self._clock()
+        with self._lock:
+            scored = [(self._decayed(score, last, now), task) for task, (score, last) in self._scores.items()]
+        scored.sort(key=lambda item: -item[0])
+        return [(task, score) for score, task in scored[:n]]
+
+
+class WarmupLease:
+    """Bail à durée limitée dans le cache partagé : un seul worker de la machine (ou du déploiement) préchauffe.
+
+    acquire() prend le bail s'il est libre ou expiré, ou le prolonge si ce
+    worker le détient déjà ; il doit être rappelé avant ttl secondes. Si le
+    détenteur s'arrête, un autre worker le reprend à l'expiration. Avec le
+    cache en mémoire (propre au processus), chaque worker est son propre élu
+    et préchauffe son propre cache.
+    """
+
+    def __init__(self, cache, key="warmup:leader", ttl=180):
+        self.cache = cache
+        self.key = key
+        self.ttl = ttl
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def acquire(self):
+        """Prend ou prolonge le bail ; renvoie True si ce worker est l'élu."""
+        if self.cache.add(self.key, self.owner, ttl=self.ttl):
+            logger.info(f"Préchauffage : bail obtenu par {self.owner}")
+            return True
+        if self.cache.get(self.key, record_stats=False) == self.owner:
+            self.cache.set(self.key, self.owner, ttl=self.ttl)
+            return True
+        return False
+
+
+class WarmupScheduler:
+    """File de priorité de tâches de préchauffage, exécutées par un nombre borné de threads.
+
+    Une tâche est un tuple (type, dataset, variable, date) passé à run(tâche),
+    qui renvoie True si le résultat a été calculé (ou était déjà en cache).
+    Une tâche déjà en file ou en cours n'est pas ajoutée une seconde fois.
+    Au plus per_dataset tâches d'un même dataset s'exécutent en même temps :
+    le préchauffage d'une collection ne monopolise pas le quota Earth Engine.
+    Les planifications (add_schedule) ajoutent leurs tâches à chaque échéance.
+    leader() (ex. WarmupLease.acquire) est consulté à chaque tour de
+    planification : les échéances d'un worker non élu passent sans tâche.
+    """
+
+    def __init__(self, run, workers=2, per_dataset=1, leader=None, clock=time.time):
+        self._run = run
+        self.workers = workers
+        self.per_dataset = per_dataset
+        self._leader = leader
+        self.leading = leader is None
+        self._clock = clock
+        self._heap = []  # (priorité, ordre d'arrivée, tâche)
+        self._order = itertools.count()
+        self._pending = set()  # Tâches en file ou en cours
+        self._running = {}  # dataset -> tâches en cours
+        self._schedules = []
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._threads = []
+        self.completed = 0
+        self.failed = 0
+        self.skipped = 0
+        self.last_run = {}  # tâche -> (instant, succès)
+
+    # --- File ------------------------------------------------------------
+
+    def submit(self, tasks, priority=PRIORITY_WARM):
+        """Ajoute des tâches à la file ; renvoie le nombre de tâches effectivement ajoutées."""
+        added = 0
+        with self._cond:
+            for task in tasks:
+                if task in self._pending:
+                    self.skipped += 1
+                    continue
+                self._pending.add(task)
+                heapq.heappush(self._heap, (priority, next(self._order), task))
+                added += 1
+            self._cond.notify_all()
+        return added
+
+    def _next_task(self):
+        """Retire la tâche la plus prioritaire dont le dataset n'a pas atteint sa limite (appelé sous verrou)."""
+        for entry in sorted(self._heap):
+            task = entry[2]
+            if self._running.get(task[1], 0) < self.per_dataset:
+                self._heap.remove(entry)
+                heapq.heapify(self._heap)
+                return task
+        return None
+
+    def _worker(self):
+        while not self._stop.is_set():
+            with self._cond:
+                task = self._next_task()
+                while task is None and not self._stop.is_set():
+                    self._cond.wait(1.0)
+                    task = self._next_task()
+                if task is None:
+                    return
+                self._running[task[1]] = self._running.get(task[1], 0) + 1
+
+            try:
+                ok = bool(self._run(task))
+            except Exception as e:
+                ok = False
+                logger.error(f"Erreur lors du préchauffage {task}: {str(e)}")
+
+            WARMUP_TASKS.inc(kind=task[0], result="ok" if ok else "error")
+            with self._cond:
+                self._running[task[1]] -= 1
+                self._pending.discard(task)
+                self.last_run[task] = (self._clock(), ok)
+                if ok:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                self._cond.notify_all()
+
+    # --- Planifications --------------------------------------------------
+
+    def add_schedule(self, name, next_run, tasks, priority=PRIORITY_WARM):
+        """Ajoute une planification : next_run(maintenant) donne la prochaine échéance, tasks() les tâches."""
+        with self._cond:
+            self._schedules.append({
+                "name": name, "next_run": next_run, "tasks": tasks, "priority": priority,
+                "next_at": next_run(self._clock()), "runs": 0
+            })
+            self._cond.notify_all()
+
+    def is_leader(self):
+        """Consulte (et prolonge) l'élection ; une erreur du cache partagé vaut une élection perdue."""
+        if self._leader is None:
+            return True
+        try:
+            self.leading = bool(self._leader())
+        except Exception as e:
+            logger.error(f"Erreur lors de l'élection du worker de préchauffage: {str(e)}")
+            self.leading = False
+        return self.leading
+
+    def _dispatch(self):
+        while not self._stop.is_set():
+            leading = self.is_leader()
+            now = self._clock()
+            for schedule in list(self._schedules):
+                if schedule["next_at"] > now:
+                    continue
+                schedule["next_at"] = schedule["next_run"](now)
+                if not leading:
+                    continue
+                schedule["runs"] += 1
+                try:
+                    added = self.submit(schedule["tasks"](), schedule["priority"])
+                    logger.info(f"Préchauffage '{schedule['name']}': {added} tâche(s) ajoutée(s)")
+                except Exception as e:
+                    logger.error(f"Erreur lors de la planification '{schedule['name']}': {str(e)}")
+            next_at = min((s["next_at"] for s in list(self._schedules)), default=now + 60)
+            self._stop.wait(min(60.0, max(0.1, next_at - self._clock())))
+
+    # --- Cycle de vie ----------------------------------------------------
+
+    def start(self):
+        """Démarre les threads d'exécution et de planification (sans effet s'ils sont déjà lancés)."""
+        if self._threads:
+            return
+        self._threads = [threading.Thread(target=self._worker, name=f"warmup-{i}", daemon=True)
+                         for i in range(self.workers)]
+        self._threads.append(threading.Thread(target=self._dispatch, name="warmup-scheduler", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+
+    def wait_idle(self, timeout=None):
+        """Attend que la file soit vide et qu'aucune tâche ne soit en cours ; renvoie False si le délai expire."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def status(self):
+        now = self._clock()
+        with self._cond:
+            return {
+                "queued": len(self._heap),
+                "running": sum(self._running.values()),
+                "completed": self.completed,
+                "failed": self.failed,
+                "skipped": self.skipped,
+                "workers": self.workers,
+                "per_dataset": self.per_dataset,
+                "leader": self.leading,
+                "schedules": [
+                    {"name": s["name"], "runs": s["runs"], "next_in": max(0.0, s["next_at"] - now)}
+                    for s in self._schedules
+                ]
+            }